@@ -0,0 +1,92 @@
+import json
+import random
+from typing import Dict, List
+
+WORDS = """
+code function variable class module test error exception name value return import style format
+consistent readable simple explicit document comment review commit branch merge release logging
+config constant default performance memory cache thread async lock query index type annotation
+""".split()
+
+
+def _sentence(rng: random.Random, length: int = 12) -> str:
+    words = [rng.choice(WORDS) for _ in range(length)]
+    return ' '.join(words).capitalize() + '.'
+
+
+def make_markdown(rng: random.Random, target_bytes: int) -> str:
+    """
+    Markdown with nested headings, bullet lists, paragraphs and code fences of about `target_bytes`.
+    """
+    parts = []
+    size = 0
+    section = 0
+    while size < target_bytes:
+        section += 1
+        block = [f"# Chapter {section}", _sentence(rng, 20)]
+        for sub in range(rng.randint(1, 4)):
+            block.append(f"## Topic {section}.{sub}")
+            block.extend(f"- Always {_sentence(rng, 8).lower()}" for _ in range(rng.randint(2, 6)))
+            block.append(' '.join(_sentence(rng) for _ in range(rng.randint(2, 8))))
+            if rng.random() < 0.3:
+                block.append("```python\n" + '\n'.join(f"{rng.choice(WORDS)}_{i} = {i}" for i in range(rng.randint(3, 30))) + "\n```")
+        text = '\n\n'.join(block) + '\n\n'
+        parts.append(text)
+        size += len(text)
+    return ''.join(parts)
+
+
+def make_rules(rng: random.Random, count: int) -> List[Dict[str, str]]:
+    return [{"id": str(i), "description": _sentence(rng, rng.randint(6, 16))} for i in range(1, count + 1)]
+
+
+def make_rules_response(rng: random.Random, count: int) -> str:
+    """
+    Rule extraction answer wrapped in chatter, as models often return it.
+    """
+    return "Here are the rules:\n```json\n" + json.dumps({"rules": make_rules(rng, count)}, indent=2) + "\n```\n"
+
+
+def make_review_response(rng: random.Random, issues: int) -> str:
+    blocks = []
+    for _ in range(issues):
+        blocks.append(
+            f"Rule Violated: {_sentence(rng, 8)}\n"
+            f"Line Number(s): {rng.randint(1, 5000)}\n"
+            f"Issue Description: {_sentence(rng, 20)}\n"
+            f"Suggestion: {_sentence(rng, 12)}"
+        )
+    return '\n\n'.join(blocks)
+
+
+def make_diff(rng: random.Random, files: int, hunks_per_file: int, lines_per_hunk: int) -> str:
+    parts = []
+    for f in range(files):
+        path = f"src/module_{f}.py"
+        parts.append(f"diff --git a/{path} b/{path}\nindex 1111111..2222222 100644\n--- a/{path}\n+++ b/{path}")
+        line = 1
+        for _ in range(hunks_per_file):
+            line += rng.randint(5, 50)
+            parts.append(f"@@ -{line},{lines_per_hunk} +{line},{lines_per_hunk} @@ def f():")
+            for i in range(lines_per_hunk):
+                prefix = rng.choice(' +-') if i % 3 else ' '
+                parts.append(f"{prefix}    {rng.choice(WORDS)}_{i} = {rng.choice(WORDS)}({i})")
+            line += lines_per_hunk
+    return '\n'.join(parts)
+
+
+def make_rules_list(rng: random.Random, sections: int, rules_per_section: int) -> List[List[Dict[str, str]]]:
+    """
+    Per-section extraction results with repeated and reworded rules, as fed to aggregate_rules.
+    """
+    pool = make_rules(rng, max(rules_per_section, sections * rules_per_section // 2))
+    result = []
+    for _ in range(sections):
+        section = []
+        for rule in rng.sample(pool, rules_per_section):
+            description = rule["description"]
+            if rng.random() < 0.3:
+                description = description.replace('.', ' in all code.')
+            section.append({"id": "1", "description": description})
+        result.append(section)
+    return result
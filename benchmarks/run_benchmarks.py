@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from benchmarks import generators
+from source.create_rules_utils import split_markdown_into_sections, format_rules, aggregate_rules
+from source.diff_compaction import compact_diff
+from source.diff_utils import parse_diff, pack_diff_shards
+from source.io import load_rules_from_json
+from source.review_utils import format_response
+from source.rules_bundle import compile_rules, load_rules
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _benchmarks(scale: float, rng: random.Random, tmp_dir: str) -> List[Tuple[str, Callable[[], object]]]:
+    """
+    Build the inputs once and return (name, callable) pairs. `scale` 1.0 is the full size:
+    4 MB of Markdown, 10k rules, 5k-issue responses and a 60k-line diff.
+    """
+    def scaled(value: int) -> int:
+        return max(1, int(value * scale))
+
+    markdown = generators.make_markdown(rng, scaled(4 * 1024 * 1024))
+    rules_response = generators.make_rules_response(rng, scaled(10000))
+    review_response = generators.make_review_response(rng, scaled(5000))
+    rules_list = generators.make_rules_list(rng, scaled(200), 50)
+    diff_text = generators.make_diff(rng, scaled(200), 10, 30)
+
+    rules_path = os.path.join(tmp_dir, 'rules.json')
+    with open(rules_path, 'w', encoding='utf-8') as f:
+        json.dump({"rules": generators.make_rules(rng, scaled(10000))}, f)
+    bundle_path = os.path.join(tmp_dir, 'rules.bundle')
+    compile_rules(rules_path, bundle_path, with_index=False)
+
+    return [
+        ("split_markdown_into_sections", lambda: split_markdown_into_sections(markdown)),
+        ("format_rules", lambda: format_rules(rules_response)),
+        ("format_response", lambda: format_response(review_response)),
+        ("aggregate_rules", lambda: aggregate_rules(rules_list)),
+        ("load_rules_from_json", lambda: load_rules_from_json(rules_path)),
+        ("load_rules_bundle", lambda: load_rules(bundle_path).text),
+        ("parse_diff", lambda: parse_diff(diff_text)),
+        ("pack_diff_shards", lambda: pack_diff_shards(diff_text)),
+        ("compact_diff", lambda: compact_diff(diff_text)),
+    ]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Best wall time over `repeat` runs, and peak traced memory of one extra run.
+    Timing runs happen without tracemalloc, which would slow them down.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "peak_bytes": peak}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """
+    Descriptions of every benchmark that got slower or bigger than the baseline allows.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["seconds"] > reference["seconds"] * time_tolerance:
+            regressions.append(f"{name}: {result['seconds']:.4f}s vs baseline {reference['seconds']:.4f}s")
+        if result["peak_bytes"] > reference["peak_bytes"] * memory_tolerance:
+            regressions.append(f"{name}: peak {result['peak_bytes'] / 1e6:.1f} MB vs baseline {reference['peak_bytes'] / 1e6:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pure-Python hot paths on synthetic inputs.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Input size relative to the full benchmark (default: 1.0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark; the best is kept (default: 3)')
+    parser.add_argument('--only', action='append', default=[], help='Run only the named benchmark (repeatable)')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline JSON file to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline instead of comparing')
+    parser.add_argument('--time-tolerance', type=float, default=1.5, help='Allowed slowdown factor before failing (default: 1.5)')
+    parser.add_argument('--memory-tolerance', type=float, default=1.25, help='Allowed peak memory growth factor before failing (default: 1.25)')
+    parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, fn in _benchmarks(args.scale, random.Random(0), tmp_dir):
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(fn, args.repeat)
+            print(f"{name:<30} {results[name]['seconds']:>10.4f}s {results[name]['peak_bytes'] / 1e6:>10.1f} MB")
+
+    report = {"python": platform.python_version(), "scale": args.scale, "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != args.scale:
+        print(f"Error: baseline was recorded at scale {baseline.get('scale')}, not {args.scale}.")
+        sys.exit(1)
+
+    regressions = compare(results, baseline["results"], args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
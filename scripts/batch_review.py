@@ -0,0 +1,92 @@
+import argparse
+import sys
+from source.batch import read_refs_file, run_batch
+from source.rules_bundle import load_rules
+from source.git_helpers import DEFAULT_MAX_FILE_BYTES
+from source.diff_compaction import DEFAULT_CONTEXT_RADIUS
+from source.cache import configure_cache, DEFAULT_CACHE_DIR
+from source.llm import configure_llm, get_backend, get_model
+from source.rate_limit import get_scheduler
+from source.profiling import enable_profiling, report_profile, span
+from source.result_store import DEFAULT_RESULT_STORE_PATH, open_result_store, settings_key
+
+def main():
+    parser = argparse.ArgumentParser(description='Review many branches, commits or ranges against coding guidelines in one process.')
+    parser.add_argument('refs', nargs='*', help='Branches, commits or ranges (a..b) to review')
+    parser.add_argument('--refs-file', type=str, help='File with one ref or range per line')
+    parser.add_argument('--base', type=str, default='origin/main', help='Branch that single refs are compared against (default: origin/main)')
+    parser.add_argument('--rules', type=str, default='data/example_rules.json', help='Path to the JSON file containing coding guidelines')
+    parser.add_argument('--output', type=str, default='batch_results.jsonl', help='JSONL file to append one result per ref to; refs already in it are skipped (default: batch_results.jsonl)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of refs reviewed at the same time (default: 8)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB', help='Glob of files to leave out of the review (repeatable)')
+    parser.add_argument('--max-file-bytes', type=int, default=DEFAULT_MAX_FILE_BYTES, help=f'Truncate the diff of any single file above this size (default: {DEFAULT_MAX_FILE_BYTES})')
+    parser.add_argument('--max-shard-tokens', type=int, default=6000, help='Maximum estimated tokens of diff per review request (default: 6000)')
+    parser.add_argument('--context-lines', type=int, default=DEFAULT_CONTEXT_RADIUS, help=f'Unchanged lines kept around each change in the diff sent to the LLM (default: {DEFAULT_CONTEXT_RADIUS})')
+    parser.add_argument('--no-compact', action='store_true', help='Send the diff as git produced it, without trimming context or collapsing whitespace-only changes, moves and deletions')
+    parser.add_argument('--top-k-rules', type=int, default=0, help='Only send the K rules most relevant to each part of the diff (default: 0, send all rules)')
+    parser.add_argument('--results-db', type=str, default=DEFAULT_RESULT_STORE_PATH, help=f'SQLite database that review results are recorded in and reused from for commits reviewed before with the same settings; query it with scripts/query_results.py (default: {DEFAULT_RESULT_STORE_PATH})')
+    parser.add_argument('--no-results', action='store_true', help='Neither record results in nor reuse them from the results database')
+    parser.add_argument('--backend', type=str, choices=['openai', 'fake'], default=None, help='LLM backend; "fake" answers deterministically offline (default: $PR_HELPER_BACKEND or openai)')
+    parser.add_argument('--model', type=str, default=None, help='Model for every request (default: $PR_HELPER_MODEL or the built-in model per request kind)')
+    parser.add_argument('--profile', action='store_true', help='Print time, tokens and estimated cost per stage at the end of the run')
+    parser.add_argument('--profile-output', type=str, help='Write the profile as a JSON trace to this file (implies --profile)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk completion cache and review refs again even if the results database has them')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the completion cache (default: {DEFAULT_CACHE_DIR})')
+    args = parser.parse_args()
+
+    if args.profile or args.profile_output:
+        enable_profiling()
+    try:
+        refs = list(args.refs)
+        if args.refs_file:
+            refs += read_refs_file(args.refs_file)
+        if not refs:
+            print("Error: no refs given. Pass refs as arguments or with --refs-file.")
+            sys.exit(1)
+
+        configure_llm(backend=args.backend, model=args.model)
+        cache = configure_cache(enabled=not args.no_cache, cache_dir=args.cache_dir)
+
+        # Rules and the rule index are loaded once and shared by every review
+        try:
+            with span("load_rules"):
+                bundle = load_rules(args.rules, use_mmap=True)
+                rules = bundle.text
+                rule_index = bundle.rule_index() if args.top_k_rules > 0 else None
+                rule_scope = bundle.rule_scope()
+        except (OSError, ValueError) as e:
+            print(f"Error loading rules: {e}")
+            sys.exit(1)
+
+        context_radius = None if args.no_compact else args.context_lines
+        # Stored results are reused only for the same rules, backend, model and options that shape the diff or review
+        result_store = open_result_store(None if args.no_results else args.results_db)
+        settings = settings_key(rules=bundle.digest, backend=get_backend().name, model=get_model("review"),
+                                top_k=args.top_k_rules, context_radius=context_radius, max_shard_tokens=args.max_shard_tokens,
+                                excludes=sorted(args.exclude), max_file_bytes=args.max_file_bytes)
+
+        counts = run_batch(refs, rules, args.output, concurrency=args.concurrency, base=args.base,
+                           excludes=args.exclude, max_file_bytes=args.max_file_bytes,
+                           max_shard_tokens=args.max_shard_tokens, rule_index=rule_index, top_k=args.top_k_rules,
+                           local_rules=bundle.local_rules, context_radius=context_radius, rule_scope=rule_scope,
+                           result_store=result_store, settings=settings, reuse_results=not args.no_cache)
+        print(', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or "Nothing to do.")
+
+        if result_store is not None:
+            print(result_store.stats())
+            result_store.close()
+
+        if cache is not None:
+            print(cache.stats())
+
+        scheduler = get_scheduler()
+        if scheduler.retries:
+            print(scheduler.stats())
+
+        if counts.get('error'):
+            sys.exit(1)
+    finally:
+        report_profile(args.profile_output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import argparse
+import os
+import sys
+from source.rules_bundle import compile_rules
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile a rules JSON file into a bundle that review.py, batch_review.py and the review daemon load without re-parsing.')
+    parser.add_argument('--rules', type=str, required=True, help='Path to the rules JSON file')
+    parser.add_argument('--output', type=str, help='Path of the bundle (default: the rules path with a .bundle extension)')
+    parser.add_argument('--no-index', action='store_true', help='Leave out the precomputed relevance index (the bundle then does not need numpy to build)')
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(args.rules)[0]}.bundle"
+    try:
+        bundle = compile_rules(args.rules, output, with_index=not args.no_index)
+    except OSError as e:
+        print(f"Error writing rules bundle: {e}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error in rules file: {e}")
+        sys.exit(1)
+    print(f"Compiled {len(bundle.records)} rules into {output} (sha256 {bundle.digest[:12]})")
+
+if __name__ == "__main__":
+    main()
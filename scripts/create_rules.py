@@ -1,31 +1,73 @@
 import argparse
-import json
-import sys
-import openai
 import os
-import re
-from source.io import load_markdown, save_rules_to_json
-from source.create_rules_utils import generate_rules
+import sys
+from source.io import find_markdown_files, save_rules_to_json, DEFAULT_READ_WORKERS
+from source.create_rules_utils import generate_rules_from_documents, manifest_path_for, DEFAULT_RULE_COUNT
+from source.cache import configure_cache, DEFAULT_CACHE_DIR
+from source.llm import LLMError, configure_llm
+from source.rate_limit import get_scheduler
+from source.profiling import enable_profiling, report_profile, span
 
 def main():
-    parser = argparse.ArgumentParser(description='Generate rules.json from a README Markdown file using GPT-4.')
-    parser.add_argument('--input', type=str, required=True, help='Path to the input Markdown file (e.g., README.md)')
+    parser = argparse.ArgumentParser(description='Generate rules.json from README, CONTRIBUTING and other Markdown documentation using GPT-4.')
+    parser.add_argument('--input', type=str, action='append', required=True, help='Markdown file, directory searched recursively, or glob to read guidelines from (repeatable), e.g. --input README.md --input docs/')
+    parser.add_argument('--read-workers', type=int, default=DEFAULT_READ_WORKERS, help=f'Number of documents read ahead in parallel (default: {DEFAULT_READ_WORKERS})')
     parser.add_argument('--output', type=str, default='rules.json', help='Path to the output JSON file (default: rules.json)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of sections sent to the model at the same time (default: 4)')
+    parser.add_argument('--max-rules', type=int, default=DEFAULT_RULE_COUNT, help=f'Number of rules kept after reviewing the extracted rules in parallel batches (default: {DEFAULT_RULE_COUNT})')
+    parser.add_argument('--full', action='store_true', help='Re-extract every section instead of only the sections changed since the last run')
+    parser.add_argument('--backend', type=str, choices=['openai', 'fake'], default=None, help='LLM backend; "fake" answers deterministically offline (default: $PR_HELPER_BACKEND or openai)')
+    parser.add_argument('--model', type=str, default=None, help='Model for every request (default: $PR_HELPER_MODEL or the built-in model per request kind)')
+    parser.add_argument('--profile', action='store_true', help='Print time, tokens and estimated cost per stage at the end of the run')
+    parser.add_argument('--profile-output', type=str, help='Write the profile as a JSON trace to this file (implies --profile)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk completion cache')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the completion cache (default: {DEFAULT_CACHE_DIR})')
     args = parser.parse_args()
 
-    # Check OpenAI API key
-    if not os.getenv("OPENAI_API_KEY"):
-        print("Error: The OPENAI_API_KEY environment variable is not set.")
-        sys.exit(1)
+    if args.profile or args.profile_output:
+        enable_profiling()
+    try:
+        if args.concurrency < 1:
+            print("Error: --concurrency must be at least 1.")
+            sys.exit(1)
+
+        backend = configure_llm(backend=args.backend, model=args.model)
+
+        # Check OpenAI API key
+        if backend.name == "openai" and not os.getenv("OPENAI_API_KEY"):
+            print("Error: The OPENAI_API_KEY environment variable is not set.")
+            sys.exit(1)
+
+        cache = configure_cache(enabled=not args.no_cache, cache_dir=args.cache_dir)
+
+        # Find the Markdown documents; they are read while sections are being extracted
+        with span("find_documents"):
+            paths = find_markdown_files(args.input)
+        if not paths:
+            print("Error: no Markdown files found in the given inputs.")
+            sys.exit(1)
+        print(f"Reading guidelines from {len(paths)} document(s)")
+
+        # Generate rules using GPT-4
+        try:
+            rules = generate_rules_from_documents(paths, concurrency=args.concurrency, read_workers=args.read_workers,
+                                                  max_rules=args.max_rules,
+                                                  manifest_path=manifest_path_for(args.output), refresh=args.full)
+        except LLMError as e:
+            print(f"Error: {e}. {args.output} was not written; rerun to retry the failed sections.")
+            sys.exit(1)
 
-    # Load Markdown content
-    markdown_content = load_markdown(args.input)
+        # Save rules to JSON file
+        save_rules_to_json(rules, args.output)
 
-    # Generate rules using GPT-4
-    rules = generate_rules(markdown_content)
+        if cache is not None:
+            print(cache.stats())
 
-    # Save rules to JSON file
-    save_rules_to_json(rules, args.output)
+        scheduler = get_scheduler()
+        if scheduler.retries:
+            print(scheduler.stats())
+    finally:
+        report_profile(args.profile_output)
 
 if __name__ == "__main__":
     main()
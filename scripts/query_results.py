@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from source.result_store import DEFAULT_RESULT_STORE_PATH, ReviewResultStore
+
+COMMANDS = {"rules": "rule", "files": "path", "authors": "author", "commits": "commit"}
+
+def parse_since(value):
+    """
+    A timestamp from an ISO date such as 2024-05-01 or a number of days such as 30d.
+    """
+    if value.endswith('d') and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * 86400
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date such as 2024-05-01 or a number of days such as 30d, got {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the review results recorded by review.py and batch_review.py.')
+    parser.add_argument('command', choices=sorted(COMMANDS) + ['issues'], help='Count issues per rule, file, author or commit, or list the issues themselves')
+    parser.add_argument('--db', type=str, default=DEFAULT_RESULT_STORE_PATH, help=f'Results database (default: {DEFAULT_RESULT_STORE_PATH})')
+    parser.add_argument('--rule', type=str, help='Only issues of this rule id, e.g. R2')
+    parser.add_argument('--path', type=str, help='Only issues in files matching this glob, e.g. "frontend/*"')
+    parser.add_argument('--author', type=str, help='Only reviews of commits by an author whose name or email contains this text')
+    parser.add_argument('--commit', type=str, help='Only reviews of commits whose id starts with this prefix')
+    parser.add_argument('--ref', type=str, help='Only reviews of this ref; reviews of staged changes have the ref "staged"')
+    parser.add_argument('--since', type=parse_since, help='Only reviews since a date (2024-05-01) or a number of days ago (30d)')
+    parser.add_argument('--limit', type=int, help='Show at most this many rows')
+    parser.add_argument('--json', action='store_true', help='Print the rows as JSON lines')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Error: no results database at {args.db}. Results are recorded by review.py and batch_review.py.")
+        sys.exit(1)
+    store = ReviewResultStore(args.db)
+    filters = {"rule": args.rule, "path": args.path, "author": args.author, "commit": args.commit,
+               "ref": args.ref, "since": args.since, "limit": args.limit}
+    if args.command == 'issues':
+        rows = store.query_issues(**filters)
+    else:
+        rows = store.query_counts(COMMANDS[args.command], **filters)
+    store.close()
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    elif not rows:
+        print("No issues found.")
+    elif args.command == 'issues':
+        for row in rows:
+            issue = row["issue"]
+            where = f"{row['path'] or '?'}:{issue.get('Line Number(s)', '?')}"
+            commit = (row["commit_sha"] or row["ref"])[:12]
+            print(f"{commit} {where} {row['rule_id'] or issue.get('Rule Violated', '')}: {issue.get('Issue Description', '')}")
+    else:
+        for row in rows:
+            print(f"{row['issues']:6d} issues in {row['reviews']:4d} reviews  {row['value'] or '(unknown)'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,223 @@
 import argparse
+import os
+import subprocess
 import sys
-from source.review_utils import load_rules_from_json, check_diff_with_gpt, display_issues
-from source.git_helpers import git_diff_branch
+from source.git_helpers import iter_git_diff, DEFAULT_MAX_FILE_BYTES
+from source.cache import DEFAULT_CACHE_DIR, DEFAULT_RESULT_STORE_PATH
+from source.profiling import enable_profiling, report_profile, span
+from source.hunk_store import HUNK_STORE_DIR, default_hunk_store_path
+from source.diff_compaction import DEFAULT_CONTEXT_RADIUS
+from source.daemon_client import DaemonUnavailable, default_socket_path, send_request
+# The review and LLM modules are imported in the functions that use them, so that runs without
+# staged changes or with a daemon do not pay for loading them
 
 def main():
     parser = argparse.ArgumentParser(description='Pre-check git diffs against coding guidelines.')
     parser.add_argument('--branch', type=str, default='origin/main', help='Branch to compare against (default: main)')
-    parser.add_argument('--rules', type=str, default='data/example_rules.json', help='Path to the JSON file containing coding guidelines')
+    parser.add_argument('--rules', type=str, default='data/example_rules.json', help='Path to the JSON file containing coding guidelines, or a bundle compiled from it with scripts/compile_rules.py')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB', help='Glob of files to leave out of the review (repeatable), e.g. "*.lock"')
+    parser.add_argument('--max-file-bytes', type=int, default=DEFAULT_MAX_FILE_BYTES, help=f'Truncate the diff of any single file above this size (default: {DEFAULT_MAX_FILE_BYTES})')
+    parser.add_argument('--max-shard-tokens', type=int, default=6000, help='Maximum estimated tokens of diff per review request (default: 6000)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of shards reviewed at the same time (default: 4)')
+    parser.add_argument('--context-lines', type=int, default=DEFAULT_CONTEXT_RADIUS, help=f'Unchanged lines kept around each change in the diff sent to the LLM (default: {DEFAULT_CONTEXT_RADIUS})')
+    parser.add_argument('--no-compact', action='store_true', help='Send the diff as git produced it, without trimming context or collapsing whitespace-only changes, moves and deletions')
+    parser.add_argument('--top-k-rules', type=int, default=0, help='Only send the K rules most relevant to each part of the diff, plus rules marked "always" (default: 0, send all rules)')
+    parser.add_argument('--stream', action='store_true', help='Stream the review and print each issue as soon as it is reported')
+    parser.add_argument('--fail-fast', action='store_true', help='With --stream, stop at the first reported issue')
+    parser.add_argument('--incremental', action='store_true', help='Review only the hunks changed since the last run and reuse stored results for the others')
+    parser.add_argument('--hunk-store', type=str, default=None, help=f'File with stored hunk reviews (default: a file per repository in {HUNK_STORE_DIR})')
+    parser.add_argument('--results-db', type=str, default=DEFAULT_RESULT_STORE_PATH, help=f'SQLite database that review results are recorded in, and reused from when the same changes were reviewed before with the same settings; query it with scripts/query_results.py (default: {DEFAULT_RESULT_STORE_PATH})')
+    parser.add_argument('--no-results', action='store_true', help='Neither record results in nor reuse them from the results database')
+    parser.add_argument('--daemon', action='store_true', help="Send the diff to the running review daemon (scripts/review_daemon.py) and fall back to reviewing in this process if none is running; the daemon's backend, model and cache settings apply")
+    parser.add_argument('--socket', type=str, default=default_socket_path(), help='Unix socket of the review daemon (default: $PR_HELPER_SOCKET or a per-user socket)')
+    parser.add_argument('--backend', type=str, choices=['openai', 'fake'], default=None, help='LLM backend; "fake" answers deterministically offline (default: $PR_HELPER_BACKEND or openai)')
+    parser.add_argument('--model', type=str, default=None, help='Model for every request (default: $PR_HELPER_MODEL or the built-in model per request kind)')
+    parser.add_argument('--profile', action='store_true', help='Print time, tokens and estimated cost per stage at the end of the run')
+    parser.add_argument('--profile-output', type=str, help='Write the profile as a JSON trace to this file (implies --profile)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk completion cache, and review the changes again even if the results database has them')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the completion cache (default: {DEFAULT_CACHE_DIR})')
     args = parser.parse_args()
 
-    # Load rules from JSON file
-    rules = load_rules_from_json(args.rules)
+    if args.profile or args.profile_output:
+        enable_profiling()
+    try:
+        file_diffs = []
+        try:
+            with span("git_diff"):
+                for file_diff in iter_git_diff(branch=args.branch, excludes=args.exclude, max_file_bytes=args.max_file_bytes):
+                    if file_diff.truncated:
+                        print(f"Warning: diff of {file_diff.path} exceeds {args.max_file_bytes} bytes and was truncated.")
+                    file_diffs.append(file_diff)
+        except subprocess.CalledProcessError as e:
+            print(f"Error running git diff: {e}")
+            sys.exit(1)
+        diff_text = '\n'.join(file_diff.text() for file_diff in file_diffs)
+        if not diff_text.strip():
+            print("No staged changes to check.")
+            sys.exit(0)
 
-    diff_text = git_diff_branch(branch=args.branch)
-    if not diff_text.strip():
-        print("No staged changes to check.")
-        sys.exit(0)
+        print(f"Checking code against guidelines using branch '{args.branch}'...\n")
 
-    print(f"Checking code against guidelines using branch '{args.branch}'...\n")
+        issues = review_with_daemon(args, diff_text) if args.daemon else None
+        if issues is None:
+            issues = review_in_process(args, diff_text)
 
-    issues = check_diff_with_gpt(diff_text, rules)
-    display_issues(issues)
+        if "Message" not in issues[0] or issues[0]["Message"] != "No issues found.":
+            sys.exit(1)
+    finally:
+        report_profile(args.profile_output)
 
-    if "Message" not in issues[0] or issues[0]["Message"] != "No issues found.":
+def review_in_process(args, diff_text):
+    """
+    Review the diff in this process and display the issues.
+    """
+    from source.cache import configure_cache
+    from source.hunk_store import HunkReviewStore
+    from source.llm import LLMError, configure_llm, get_backend, get_model
+    from source.rate_limit import get_scheduler
+    from source.rules_bundle import load_rules
+    from source.git_helpers import git_show_file
+    from source.result_store import diff_hash, open_result_store
+    from source.review_utils import check_diff_sharded, check_diff_incremental, check_diff_streaming, display_issue, display_issues
+
+    configure_llm(backend=args.backend, model=args.model)
+    cache = configure_cache(enabled=not args.no_cache, cache_dir=args.cache_dir)
+
+    # Load rules from a JSON file or a compiled bundle
+    try:
+        with span("load_rules"):
+            bundle = load_rules(args.rules)
+            rules = bundle.text
+            # numpy is only needed for relevance filtering
+            rule_index = bundle.rule_index() if args.top_k_rules > 0 else None
+            rule_scope = bundle.rule_scope()
+    except (OSError, ValueError) as e:
+        print(f"Error loading rules: {e}")
         sys.exit(1)
+    # Rules marked with a "check" are enforced on the staged files without the LLM; the LLM
+    # sees the diff compacted to --context-lines of context, with only the rules whose
+    # "paths" and "languages" match its files
+    options = {"local_rules": bundle.local_rules, "read_source": git_show_file,
+               "context_radius": None if args.no_compact else args.context_lines,
+               "rule_scope": rule_scope}
+
+    # Changes reviewed before with the same settings are not sent to the LLM again, unless the
+    # review must not come from a cache
+    results = open_result_store(None if args.no_results else args.results_db)
+    settings = review_settings(args, bundle.digest, get_backend().name, get_model("review"))
+    if results is not None and not args.no_cache:
+        stored = results.find(settings, diff=diff_hash(diff_text))
+        if stored is not None:
+            print("These changes were reviewed before with the same rules and settings; showing the stored results.")
+            results.close()
+            issues = stored["issues"] or [{"Message": "No issues found."}]
+            display_issues(issues)
+            return issues
+
+    store = None
+    try:
+        if args.stream:
+            issues = check_diff_streaming(diff_text, rules, on_issue=display_issue, fail_fast=args.fail_fast,
+                                          max_shard_tokens=args.max_shard_tokens, rule_index=rule_index, top_k=args.top_k_rules,
+                                          **options)
+            if "Message" in issues[0]:
+                # Issues were already printed as they arrived
+                display_issues(issues)
+        elif args.incremental:
+            store = HunkReviewStore(args.hunk_store)
+            issues = check_diff_incremental(diff_text, rules, store, concurrency=args.concurrency,
+                                            max_shard_tokens=args.max_shard_tokens, rule_index=rule_index,
+                                            top_k=args.top_k_rules, **options)
+            display_issues(issues)
+        else:
+            issues = check_diff_sharded(diff_text, rules, max_shard_tokens=args.max_shard_tokens, concurrency=args.concurrency,
+                                        rule_index=rule_index, top_k=args.top_k_rules, **options)
+            display_issues(issues)
+    except LLMError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if store is not None:
+        print(store.stats())
+
+    record_review(results, settings, diff_text, issues)
+
+    if cache is not None:
+        print(cache.stats())
+
+    scheduler = get_scheduler()
+    if scheduler.retries:
+        print(scheduler.stats())
+    return issues
+
+def review_settings(args, rules_digest, backend, model):
+    """
+    Key of the rules, backend, model and options that decide the result of a review, see
+    source.result_store.settings_key.
+    """
+    from source.result_store import settings_key
+    return settings_key(rules=rules_digest, backend=backend, model=model, top_k=args.top_k_rules,
+                        context_radius=None if args.no_compact else args.context_lines,
+                        max_shard_tokens=args.max_shard_tokens, fail_fast=args.stream and args.fail_fast)
+
+def record_review(results, settings, diff_text, issues):
+    """
+    Write the result of reviewing the staged changes to the result store, if one is open.
+    """
+    if results is None:
+        return
+    from source.diff_utils import diff_paths
+    from source.git_helpers import git_author
+    from source.result_store import diff_hash, record_from_issues
+    results.add(record_from_issues("staged", diff_paths(diff_text), issues), settings,
+                diff=diff_hash(diff_text), author=git_author())
+    results.close()
+
+def review_with_daemon(args, diff_text):
+    """
+    Send the diff to the review daemon and display the issues as they come back.
+    Returns None if no daemon is running, so the caller can review in-process instead.
+    """
+    from source.review_utils import display_issue, display_issues
+
+    request = {
+        "command": "review",
+        "diff": diff_text,
+        "rules": os.path.abspath(args.rules),
+        "root": os.getcwd(),
+        "stream": args.stream,
+        "fail_fast": args.fail_fast,
+        "incremental": args.incremental,
+        "hunk_store": os.path.abspath(args.hunk_store or default_hunk_store_path()),
+        "max_shard_tokens": args.max_shard_tokens,
+        "concurrency": args.concurrency,
+        "top_k_rules": args.top_k_rules,
+        "context_radius": None if args.no_compact else args.context_lines,
+    }
+    try:
+        with span("daemon_review"):
+            for event in send_request(request, args.socket):
+                if event["event"] == "issue":
+                    display_issue(event["issue"])
+                elif event["event"] == "error":
+                    print(f"Error: {event['message']}")
+                    sys.exit(1)
+                elif event["event"] == "done":
+                    issues = event["issues"]
+                    if not args.stream or "Message" in issues[0]:
+                        display_issues(issues)
+                    # The daemon reports the rules, backend and model it used, which may differ from this process's
+                    if not args.no_results and event.get("model") and event.get("backend"):
+                        from source.result_store import open_result_store
+                        record_review(open_result_store(args.results_db),
+                                      review_settings(args, event["rules_digest"], event["backend"], event["model"]),
+                                      diff_text, issues)
+                    return issues
+    except DaemonUnavailable as e:
+        print(f"{e}; reviewing in this process.")
+        return None
+    print("Error: the review daemon closed the connection before the review finished.")
+    sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+import argparse
+import sys
+from source.daemon_client import DaemonUnavailable, default_socket_path, send_request
+from source.cache import configure_cache, DEFAULT_CACHE_DIR
+from source.llm import configure_llm
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep rules, indexes, caches and LLM connections warm for fast reviews with review.py --daemon.')
+    parser.add_argument('--socket', type=str, default=default_socket_path(), help=f'Unix socket to listen on (default: {default_socket_path()})')
+    parser.add_argument('--stop', action='store_true', help='Stop the daemon listening on the socket and exit')
+    parser.add_argument('--stats', action='store_true', help='Print the request counters of the running daemon and exit')
+    parser.add_argument('--backend', type=str, choices=['openai', 'fake'], default=None, help='LLM backend; "fake" answers deterministically offline (default: $PR_HELPER_BACKEND or openai)')
+    parser.add_argument('--model', type=str, default=None, help='Model for every request (default: $PR_HELPER_MODEL or the built-in model per request kind)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk completion cache')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the completion cache (default: {DEFAULT_CACHE_DIR})')
+    args = parser.parse_args()
+
+    if args.stop or args.stats:
+        try:
+            for event in send_request({"command": "shutdown" if args.stop else "stats"}, args.socket, timeout=5):
+                if event["event"] == "stats":
+                    print(f"{event['reviews']} reviews, {event['coalesced']} coalesced, {event['in_flight']} in flight")
+        except DaemonUnavailable as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+
+    # Imported here so --stop and --stats stay fast
+    from source.daemon import ReviewDaemon
+
+    configure_llm(backend=args.backend, model=args.model)
+    configure_cache(enabled=not args.no_cache, cache_dir=args.cache_dir)
+
+    try:
+        server = ReviewDaemon(args.socket)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Review daemon listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
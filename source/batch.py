@@ -0,0 +1,144 @@
+import json
+import os
+import subprocess
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Set
+from source.git_helpers import iter_git_diff_ref, git_author, git_diff_revisions, git_show_file, DEFAULT_MAX_FILE_BYTES
+from source.diff_compaction import DEFAULT_CONTEXT_RADIUS
+from source.review_utils import check_diff_sharded
+from source.profiling import span
+from source.result_store import record_from_issues
+
+# Reviews written to the result store per transaction
+DEFAULT_SAVE_EVERY = 50
+
+
+def read_refs_file(path: str) -> List[str]:
+    """
+    Read refs from a file with one ref or range per line. Blank lines and `#` comments are skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+
+def load_completed_refs(output_path: str) -> Set[str]:
+    """
+    Refs that already have a successful record in a JSONL results file, so an interrupted
+    batch can be resumed. Refs whose review failed are retried.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A partial last line from an interrupted run
+            if record.get('status') != 'error':
+                completed.add(record.get('ref'))
+    return completed
+
+
+def _ends_mid_line(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+def _new_revision(ref: str) -> str:
+    """
+    The revision on the new side of the diff of a ref: the end of a range, or the ref itself.
+    """
+    if '..' in ref:
+        return ref.rsplit('..', 1)[1].lstrip('.') or 'HEAD'
+    return ref
+
+
+def review_ref(ref: str, rules: str, base: str = 'main', excludes: Iterable[str] = (),
+               max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, max_shard_tokens: int = 6000,
+               rule_index=None, top_k: int = 0, local_rules: List[Dict] = (),
+               context_radius: Optional[int] = DEFAULT_CONTEXT_RADIUS, rule_scope=None,
+               result_store=None, settings: str = '', reuse_results: bool = True) -> Dict:
+    """
+    Review the diff of one ref and return its result record. Local checks read the changed
+    files as of the ref.
+
+    With a result store, a ref whose commits were reviewed before under the same `settings`
+    (see source.result_store.settings_key) gets the stored record, marked as "stored", and
+    new records are queued in the store. With `reuse_results` False every ref is reviewed again
+    and its record still stored.
+    """
+    revisions = git_diff_revisions(ref, base) if result_store is not None else None
+    if revisions is not None and reuse_results:
+        stored = result_store.find(settings, commit=revisions[1], base=revisions[0])
+        if stored is not None:
+            return dict(stored, ref=ref, stored=True)
+    record = _review_ref(ref, rules, base=base, excludes=excludes, max_file_bytes=max_file_bytes,
+                         max_shard_tokens=max_shard_tokens, rule_index=rule_index, top_k=top_k,
+                         local_rules=local_rules, context_radius=context_radius, rule_scope=rule_scope)
+    if revisions is not None and record["status"] != "error":
+        result_store.add(record, settings, commit=revisions[1], base=revisions[0], author=git_author(revisions[1]))
+    return record
+
+
+def _review_ref(ref: str, rules: str, base: str, excludes: Iterable[str], max_file_bytes: int, max_shard_tokens: int,
+                rule_index, top_k: int, local_rules: List[Dict], context_radius: Optional[int], rule_scope) -> Dict:
+    try:
+        with span("git_diff", ref=ref):
+            file_diffs = list(iter_git_diff_ref(ref, base=base, excludes=excludes, max_file_bytes=max_file_bytes))
+        diff_text = '\n'.join(file_diff.text() for file_diff in file_diffs)
+        if not diff_text.strip():
+            return {"ref": ref, "status": "empty", "issues": []}
+        # Parallelism comes from the batch pool, so shards of one ref are reviewed in sequence
+        issues = check_diff_sharded(diff_text, rules, max_shard_tokens=max_shard_tokens, concurrency=1,
+                                    rule_index=rule_index, top_k=top_k, local_rules=local_rules,
+                                    read_source=partial(git_show_file, rev=_new_revision(ref)),
+                                    context_radius=context_radius, rule_scope=rule_scope)
+    except subprocess.CalledProcessError as e:
+        return {"ref": ref, "status": "error", "error": f"git diff failed with exit code {e.returncode}"}
+    except Exception as e:
+        # A failed request or unusable response must not stop the batch
+        return {"ref": ref, "status": "error", "error": str(e) or type(e).__name__}
+
+    return record_from_issues(ref, [file_diff.path for file_diff in file_diffs], issues,
+                              [file_diff.path for file_diff in file_diffs if file_diff.truncated])
+
+
+def run_batch(refs: List[str], rules: str, output_path: str, concurrency: int = 8, result_store=None,
+              save_every: int = DEFAULT_SAVE_EVERY, **review_options) -> Dict[str, int]:
+    """
+    Review many refs with one shared worker pool and append one JSON record per ref to
+    `output_path` as soon as it is done. Refs already recorded there are skipped.
+    Returns the number of refs per status.
+
+    With a result store, new reviews are written to it `save_every` at a time.
+    """
+    completed = load_completed_refs(output_path)
+    pending = list(dict.fromkeys(ref for ref in refs if ref not in completed))
+    print(f"Reviewing {len(pending)} refs ({len(refs) - len(pending)} already done)...")
+
+    counts = {}
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        if _ends_mid_line(output_path):
+            out.write('\n')  # Do not glue the first new record onto a partial line
+        futures = [executor.submit(review_ref, ref, rules, result_store=result_store, **review_options)
+                   for ref in pending]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                counts[record['status']] = counts.get(record['status'], 0) + 1
+                print(f"{record['ref']}: {record['status']}" + (" (stored)" if record.get('stored') else ""))
+                if result_store is not None and len(result_store.pending) >= save_every:
+                    result_store.save()
+        finally:
+            if result_store is not None:
+                result_store.save()
+    return counts
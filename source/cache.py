@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+CACHE_ROOT = os.path.join(os.path.expanduser('~'), '.cache', 'pr-helper')
+DEFAULT_CACHE_DIR = os.path.join(CACHE_ROOT, 'completions')
+# Defined here rather than in source.result_store so that scripts can show it without loading sqlite3
+DEFAULT_RESULT_STORE_PATH = os.path.join(CACHE_ROOT, 'review_results.sqlite')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class CompletionCache:
+    """
+    On-disk cache for chat completions, keyed by a hash of the model, messages and parameters.
+
+    Every entry is a small JSON file. The file modification time is refreshed on every hit,
+    so eviction by oldest modification time is least-recently-used eviction. The size of the
+    cache is scanned once and then kept up to date on every write, so the directory is only
+    walked again when the cache has grown past `max_bytes`; entries written by other processes
+    are counted at that point.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None  # Bytes on disk, None until the first scan
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], params: Optional[Dict] = None) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "params": params or {}},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the cached completion for `key`, or None on a miss or an expired entry.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['created_at'] > self.ttl_seconds:
+                os.remove(path)
+                raise KeyError(key)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry['content']
+
+    def set(self, key: str, content: str) -> None:
+        """
+        Store a completion and evict least-recently-used entries if the cache grew too large.
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so concurrent readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"created_at": time.time(), "content": content}, f)
+            size = os.path.getsize(tmp_path)
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write to completion cache: {e}")
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            full = self._size is None or self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        with self._lock:
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._size = total
+
+    def stats(self) -> str:
+        return f"Completion cache: {self.hits} hits, {self.misses} misses"
+
+
+_cache: Optional[CompletionCache] = None
+
+
+def configure_cache(enabled: bool = True, cache_dir: str = DEFAULT_CACHE_DIR,
+                    max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: float = DEFAULT_TTL_SECONDS) -> Optional[CompletionCache]:
+    """
+    Enable or disable the process-wide completion cache. The cache is disabled until this is called.
+    """
+    global _cache
+    _cache = CompletionCache(cache_dir, max_bytes, ttl_seconds) if enabled else None
+    return _cache
+
+
+def get_cache() -> Optional[CompletionCache]:
+    return _cache
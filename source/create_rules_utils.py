@@ -1,43 +1,241 @@
 import json
-import sys
-import openai
-import json
-import sys
-import openai
 import re
-from typing import List, Dict
-from source.io import load_markdown, save_rules_to_json
-
-def split_markdown_into_sections(markdown_content: str, max_length: int = 3000) -> List[str]:
-    """
-    Split the Markdown content into sections based on headings to preserve context.
-    Each section should be within the max_length to prevent exceeding token limits.
-    """
-    # Split by headings (assuming headings start with #)
-    sections = re.split(r'(?:\n\s*)#{1,6}\s+', markdown_content)
-    headings = re.findall(r'(?:\n\s*)#{1,6}\s+([^\n]+)', markdown_content)
-
-    if not headings:
-        # If no headings found, split by character count
-        return [markdown_content[i:i+max_length] for i in range(0, len(markdown_content), max_length)]
-
-    combined_sections = []
-    current_section = ""
-    for heading, content in zip(headings, sections[1:]):  # sections[0] is content before first heading
-        section = f"# {heading}\n{content}"
-        if len(current_section) + len(section) > max_length:
-            if current_section:
-                combined_sections.append(current_section)
-                current_section = section
-            else:
-                # If single section is larger than max_length, split it further
-                split_subsections = [section[i:i+max_length] for i in range(0, len(section), max_length)]
-                combined_sections.extend(split_subsections)
-        else:
-            current_section += f"\n{section}"
-    if current_section:
-        combined_sections.append(current_section)
-    return combined_sections
+import os
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from source.io import load_markdown, save_rules_to_json, load_manifest, save_manifest, iter_markdown_documents, DEFAULT_READ_WORKERS
+from source.llm import LLMError, get_model
+from source.profiling import span
+from source.structured_output import RULES_SCHEMA, SECTION_RULES_SCHEMA, complete_structured, parse_rules, parse_section_rules
+from source.token_utils import estimate_tokens
+from source.dedup import cluster_near_duplicates, DEFAULT_SIMILARITY_THRESHOLD
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+\S')
+FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})')
+
+# Estimated tokens of README content per extraction request
+DEFAULT_SECTION_TOKENS = 1000
+# Estimated tokens of the line that numbers each section in an extraction request
+SECTION_MARKER_TOKENS = 6
+# Fields recording where a rule was extracted from
+RULE_TAGS = ("source", "heading")
+# Rules kept by the final review
+DEFAULT_RULE_COUNT = 24
+# Estimated tokens of rules per review request
+DEFAULT_CURATE_BATCH_TOKENS = 3000
+
+
+def iter_markdown_blocks(markdown_content: str) -> Iterator[Tuple[Tuple[str, ...], str]]:
+    """
+    Walk the Markdown content once and yield (heading path, block) pairs.
+
+    A block is a paragraph or a complete fenced code block. Headings inside code fences are
+    ignored. A heading without any content of its own is yielded with an empty block so that
+    it is not lost.
+    """
+    headings = []  # (level, heading line)
+    block = []
+    heading_has_content = True
+    fence = None
+
+    def current_path() -> Tuple[str, ...]:
+        return tuple(line for _, line in headings)
+
+    for line in markdown_content.splitlines():
+        if fence is not None:
+            block.append(line)
+            if line.strip().startswith(fence):
+                yield current_path(), '\n'.join(block)
+                block, fence = [], None
+            continue
+
+        fence_match = FENCE_RE.match(line)
+        heading_match = HEADING_RE.match(line)
+        if block and (fence_match or heading_match or not line.strip()):
+            yield current_path(), '\n'.join(block)
+            block = []
+            heading_has_content = True
+
+        if fence_match:
+            fence = fence_match.group(1)
+            block.append(line)
+        elif heading_match:
+            level = len(heading_match.group(1))
+            if not heading_has_content and headings[-1][0] >= level:
+                yield current_path(), ''
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, line.strip()))
+            heading_has_content = False
+        elif line.strip():
+            block.append(line)
+
+    if block:
+        yield current_path(), '\n'.join(block)
+    elif not heading_has_content:
+        yield current_path(), ''
+
+
+def _split_line(line: str, max_tokens: int) -> List[str]:
+    """
+    Split a single overlong line at word boundaries.
+    """
+    pieces = []
+    words = []
+    tokens = 0
+    for word in line.split(' '):
+        word_tokens = estimate_tokens(word) + 1
+        if words and tokens + word_tokens > max_tokens:
+            pieces.append(' '.join(words))
+            words, tokens = [], 0
+        words.append(word)
+        tokens += word_tokens
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
+
+
+def _split_block(block: str, max_tokens: int) -> List[str]:
+    """
+    Split a block that does not fit in `max_tokens` at line boundaries. Fenced code blocks are
+    closed and reopened around every piece so each piece stays valid Markdown.
+    """
+    if estimate_tokens(block) <= max_tokens:
+        return [block]
+
+    lines = block.split('\n')
+    opening = closing = None
+    fence_match = FENCE_RE.match(lines[0])
+    if fence_match:
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and lines[-1].strip().startswith(fence_match.group(1)) else fence_match.group(1)
+        lines = lines[1:-1] if closing == lines[-1] else lines[1:]
+        max_tokens = max(1, max_tokens - estimate_tokens(opening) - estimate_tokens(closing) - 2)
+
+    pieces = []
+    current = []
+    tokens = 0
+    for line in lines:
+        for part in ([line] if estimate_tokens(line) <= max_tokens else _split_line(line, max_tokens)):
+            part_tokens = estimate_tokens(part) + 1
+            if current and tokens + part_tokens > max_tokens:
+                pieces.append(current)
+                current, tokens = [], 0
+            current.append(part)
+            tokens += part_tokens
+    if current:
+        pieces.append(current)
+
+    if opening is not None:
+        return ['\n'.join([opening] + piece + [closing]) for piece in pieces]
+    return ['\n'.join(piece) for piece in pieces]
+
+
+def iter_markdown_sections(markdown_content: str, max_tokens: int = DEFAULT_SECTION_TOKENS) -> Iterator[Tuple[Tuple[str, ...], str]]:
+    """
+    Yield every heading section of the Markdown content with its heading path, as soon as it
+    is complete.
+
+    A section holds the paragraphs and code blocks under one heading, in document order, after
+    the headings it is nested under, so it can be read on its own. Sections larger than
+    `max_tokens` estimated tokens are split into several, and blocks larger than the budget at
+    line and then word boundaries. A heading without content of its own becomes a section of
+    only its headings.
+    """
+    parts = []
+    tokens = 0
+    chunk_path = None
+    for path, block in iter_markdown_blocks(markdown_content):
+        if path != chunk_path:
+            if parts:
+                yield chunk_path, '\n\n'.join(parts)
+            parts, chunk_path = [], path
+        path_tokens = sum(estimate_tokens(heading) + 1 for heading in path)
+        block_budget = max(max_tokens - path_tokens, max_tokens // 2)
+        for piece in _split_block(block, block_budget) if block else ['']:
+            cost = estimate_tokens(piece) + 1
+            if parts and tokens + cost > max_tokens:
+                yield chunk_path, '\n\n'.join(parts)
+                parts = []
+            if not parts:
+                parts, tokens = list(path), path_tokens
+            if piece:
+                parts.append(piece)
+            tokens += cost
+    if parts:
+        yield chunk_path, '\n\n'.join(parts)
+
+
+@dataclass
+class MarkdownSection:
+    """
+    A heading section of Markdown to extract rules from, with where it came from.
+    """
+    text: str
+    heading: str = ''
+    source: Optional[str] = None
+    has_content: bool = True  # False for a heading without any text of its own
+
+    def tags(self) -> Dict[str, str]:
+        """
+        The fields added to every rule extracted from the section, also when it was sent in one
+        request with other sections.
+        """
+        tags = {}
+        if self.source is not None:
+            tags["source"] = self.source
+        if self.heading:
+            tags["heading"] = self.heading
+        return tags
+
+
+def _heading_text(path: Tuple[str, ...]) -> str:
+    return ' > '.join(heading.lstrip('#').strip() for heading in path)
+
+
+def _markdown_section(path: Tuple[str, ...], text: str, source: Optional[str] = None) -> MarkdownSection:
+    return MarkdownSection(text, _heading_text(path), source, has_content=len(text) > len('\n\n'.join(path)))
+
+
+def pack_sections(sections: Iterable[MarkdownSection], max_tokens: int = DEFAULT_SECTION_TOKENS) -> Iterator[List[MarkdownSection]]:
+    """
+    Pack consecutive sections into groups of at most `max_tokens` estimated tokens, one group
+    per extraction request. A heading without content joins the group before it rather than
+    being sent on its own.
+    """
+    group = []
+    tokens = 0
+    for section in sections:
+        cost = estimate_tokens(section.text) + SECTION_MARKER_TOKENS
+        if group and section.has_content and tokens + cost > max_tokens:
+            yield group
+            group, tokens = [], 0
+        group.append(section)
+        tokens += cost
+    if group:
+        yield group
+
+
+def split_markdown_into_sections(markdown_content: str, max_tokens: int = DEFAULT_SECTION_TOKENS) -> List[str]:
+    """
+    The Markdown content as sent for rule extraction: its heading sections (see
+    `iter_markdown_sections`) packed into chunks of at most `max_tokens` estimated tokens.
+    """
+    sections = (_markdown_section(path, text) for path, text in iter_markdown_sections(markdown_content, max_tokens))
+    return ['\n\n'.join(section.text for section in group) for group in pack_sections(sections, max_tokens)]
+
+
+def iter_document_sections(paths: Iterable[str], max_tokens: int = DEFAULT_SECTION_TOKENS,
+                           read_workers: int = DEFAULT_READ_WORKERS) -> Iterator[MarkdownSection]:
+    """
+    Read Markdown documents in parallel and yield their sections lazily, in document order.
+    """
+    for path, content in iter_markdown_documents(paths, workers=read_workers):
+        for heading_path, text in iter_markdown_sections(content, max_tokens):
+            yield _markdown_section(heading_path, text, path)
 
 def format_rules(raw_response: str) -> List[Dict[str, str]]:
     """
@@ -63,25 +261,35 @@ def format_rules(raw_response: str) -> List[Dict[str, str]]:
         print(raw_response)
         print("Continuing parsing next section...")
 
-def generate_rules_from_chunk(chunk: str) -> List[Dict[str, str]]:
+def generate_rules_from_chunk(sections: List[str]) -> List[List[Dict[str, str]]]:
     """
-    Use OpenAI GPT-4 to generate coding rules from a chunk of Markdown content.
+    Use OpenAI GPT-4 to generate coding rules from a chunk of Markdown content made of one or
+    more sections, and return the rules of each section.
+
+    The sections are numbered in the prompt and the model names the section of every rule;
+    a rule with a section number out of range is counted for the first section.
+
+    Raises StructuredOutputError if the response cannot be parsed even after a repair request.
     """
+    chunk = '\n\n'.join(f"=== Section {number} ===\n{text}" for number, text in enumerate(sections, start=1))
     prompt = f"""
 You are an assistant that extracts coding guidelines from a project's README file.
 
 Given the following Markdown content, identify and extract the coding guidelines or rules. 
+The content is split into numbered sections; give the number of the section each rule comes from.
 Format the extracted rules into a JSON structure with the following format:
 
 {{
     "rules": [
         {{
             "id": "1",
-            "description": "First coding rule description."
+            "description": "First coding rule description.",
+            "section": 1
         }},
         {{
             "id": "2",
-            "description": "Second coding rule description."
+            "description": "Second coding rule description.",
+            "section": 2
         }}
         // Add more rules as needed
     ]
@@ -92,90 +300,281 @@ Only include the "rules" key with an array of rule objects. Do not include any a
 Markdown Content:
 {chunk}
 """
-    client = openai.OpenAI()
-
-    response = client.chat.completions.create(
-        model="gpt-4o",  
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant specialized in extracting coding guidelines."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    # check if there was an error
-    if response.choices[0].message.content is None:
-        print("Error: No response from GPT-4")
-        sys.exit(1)
-    return format_rules(response.choices[0].message.content)
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant specialized in extracting coding guidelines."},
+        {"role": "user", "content": prompt}
+    ]
+    rules = complete_structured(get_model("extract"), messages, "coding_rules", SECTION_RULES_SCHEMA, parse_section_rules)
+    section_rules = [[] for _ in sections]
+    for rule in rules:
+        number = rule.pop("section")
+        section_rules[number - 1 if 1 <= number <= len(sections) else 0].append(rule)
+    return section_rules
     
 
-def aggregate_rules(rules_list: List[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+def aggregate_rules(rules_list: List[List[Dict[str, str]]], previous_ids: Optional[Dict[str, str]] = None,
+                    similarity_threshold: Optional[float] = DEFAULT_SIMILARITY_THRESHOLD) -> List[Dict[str, str]]:
     """
     Aggregate rules from multiple chunks, remove duplicates, and assign unique IDs.
+    Rules keep the "source" and "heading" tags of their first occurrence.
+
+    Paraphrased rules whose wording overlaps by at least `similarity_threshold` are merged into
+    one, preferring a description that already has an ID. Pass None to only drop exact duplicates.
+    Descriptions found in `previous_ids` keep their earlier ID; new descriptions are numbered
+    after the highest numeric ID already in use.
     """
+    previous_ids = previous_ids or {}
     unique_rules = {}
     for rules in rules_list:
         for rule in rules:
             description = rule.get('description', '').strip()
             if description and description not in unique_rules:
-                unique_rules[description] = rule.get('suggestion', '')
-    
+                unique_rules[description] = {key: rule[key] for key in RULE_TAGS if key in rule}
+
+    if similarity_threshold is not None:
+        descriptions = list(unique_rules)
+        representatives = []
+        for cluster in cluster_near_duplicates(descriptions, similarity_threshold):
+            known = [index for index in cluster if descriptions[index] in previous_ids]
+            representatives.append(descriptions[(known or cluster)[0]])
+        unique_rules = {description: unique_rules[description] for description in representatives}
+
+    used_ids = {previous_ids[description] for description in unique_rules if description in previous_ids}
+    next_id = max((int(rule_id) for rule_id in previous_ids.values() if rule_id.isdigit()), default=0) + 1
+
     aggregated_rules = []
-    for idx, (description, suggestion) in enumerate(unique_rules.items(), start=1):
+    for description in unique_rules:
+        rule_id = previous_ids.get(description)
+        if rule_id is None:
+            while str(next_id) in used_ids:
+                next_id += 1
+            rule_id = str(next_id)
+            used_ids.add(rule_id)
+            next_id += 1
         aggregated_rules.append({
-            "id": str(idx),
-            "description": description
+            "id": rule_id,
+            "description": description,
+            **unique_rules[description],
         })
     
     return aggregated_rules
 
-def review_rules(rules: List[Dict[str, str]]) -> List[Dict[str, str]]:
+def review_rules(rules: List[Dict[str, str]], keep: int = DEFAULT_RULE_COUNT) -> List[Dict[str, str]]:
     """
-    Review the rules and make sure they are good.
+    Ask the model to drop rules that are not about code and rank the rest, keeping at most
+    `keep`. Returns the kept rules from `rules`, most important first, with all their fields;
+    ids the model made up are ignored.
     """
     prompt = f"""
 You are an assistant that reviews coding guidelines extracted from a project's README file.
 
 Remove any rules that are not explicitly about written code that belongs in a codebase.
 
-Only keep the 24 most important rules.
+Only keep the {keep} most important rules, most important first. Keep the id of every rule you keep.
+
+Respond with a JSON object with a "rules" key holding an array of {{"id": ..., "description": ...}} objects.
 
 Coding Guidelines:
-{rules}
+{[{"id": rule["id"], "description": rule["description"]} for rule in rules]}
 """
-    client = openai.OpenAI()
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant specialized in reviewing coding guidelines."},
+        {"role": "user", "content": prompt}
+    ]
+    reviewed = complete_structured(get_model("curate"), messages, "coding_rules", RULES_SCHEMA, parse_rules)
+    by_id = {rule["id"]: rule for rule in rules}
+    kept_ids = list(dict.fromkeys(rule.get("id") for rule in reviewed if rule.get("id") in by_id))
+    return [by_id[rule_id] for rule_id in kept_ids[:keep]]
+
+
+def _rule_batches(rules: List[Dict[str, str]], max_tokens: int) -> List[List[Dict[str, str]]]:
+    """
+    Split rules into consecutive batches of at most `max_tokens` estimated prompt tokens.
+    """
+    batches = []
+    current = []
+    tokens = 0
+    for rule in rules:
+        rule_tokens = estimate_tokens(rule["description"]) + 10  # The id and JSON punctuation
+        if current and tokens + rule_tokens > max_tokens:
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(rule)
+        tokens += rule_tokens
+    if current:
+        batches.append(current)
+    return batches
+
 
-    response = client.chat.completions.create(
-        model="gpt-4",  
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant specialized in reviewing coding guidelines."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    # check if there was an error
-    if response.choices[0].message.content is None:
-        print("Error: No response from GPT-4")
-        sys.exit(1)
-    return format_rules(response.choices[0].message.content)
+def curate_rules(rules: List[Dict[str, str]], target: int = DEFAULT_RULE_COUNT,
+                 batch_tokens: int = DEFAULT_CURATE_BATCH_TOKENS, concurrency: int = 1) -> List[Dict[str, str]]:
+    """
+    Reduce a rule set of any size to the `target` most important rules with a tree of reviews.
+
+    While the rules do not fit in one prompt of `batch_tokens`, they are split into batches that
+    are reviewed in parallel, each keeping at most `target` rules, so the overall best rules
+    survive every round. If batches are too small for that to shrink the set, each keeps at
+    most half of its rules instead. The survivors of the last round get one final review.
+    """
+    round_number = 0
+    while True:
+        batches = _rule_batches(rules, batch_tokens)
+        if len(batches) <= 1:
+            return review_rules(rules, keep=target) if rules else []
+        keeps = [min(target, len(batch)) for batch in batches]
+        if sum(keeps) >= len(rules):
+            keeps = [min(target, (len(batch) + 1) // 2) for batch in batches]
+            if sum(keeps) >= len(rules):
+                # Every rule fills a batch on its own; the budget is too small to split at all
+                return review_rules(rules, keep=target)
+        round_number += 1
+        print(f"Reviewing {len(rules)} rules in {len(batches)} batches (round {round_number})...")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            survivors = list(executor.map(review_rules, batches, keeps))
+        rules = [rule for batch in survivors for rule in batch]
 
 
-def generate_rules(markdown_content: str) -> Dict[str, List[Dict[str, str]]]:
+def section_hash(section: str) -> str:
     """
-    Generate rules by processing the Markdown content in chunks.
+    Content hash used to recognise unchanged sections between runs.
     """
-    # Define maximum characters per chunk (adjust as needed)
-    max_chunk_length = 3000
-    chunks = split_markdown_into_sections(markdown_content, max_length=max_chunk_length)
-    print(f"Total sections to process: {len(chunks)}")
+    return hashlib.sha256(section.encode('utf-8')).hexdigest()
 
+
+def manifest_path_for(output_path: str) -> str:
+    """
+    Path of the section manifest stored next to a rules output file.
+    """
+    return f"{os.path.splitext(output_path)[0]}.manifest.json"
+
+
+def generate_rules(markdown_content: str, concurrency: int = 1, manifest_path: Optional[str] = None,
+                   refresh: bool = False) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Generate rules by processing the Markdown content in chunks, see `generate_rules_from_sections`.
+    """
+    sections = (_markdown_section(path, text) for path, text in iter_markdown_sections(markdown_content))
+    return generate_rules_from_sections(sections, concurrency=concurrency, manifest_path=manifest_path, refresh=refresh)
+
+
+def generate_rules_from_documents(paths: Iterable[str], concurrency: int = 1, manifest_path: Optional[str] = None,
+                                  refresh: bool = False, read_workers: int = DEFAULT_READ_WORKERS,
+                                  max_rules: int = DEFAULT_RULE_COUNT) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Generate rules from many Markdown documents. Documents are read in parallel and their
+    sections streamed into the extraction requests; every rule is tagged with the document and
+    heading it was extracted from.
+    """
+    return generate_rules_from_sections(iter_document_sections(paths, read_workers=read_workers),
+                                        concurrency=concurrency, manifest_path=manifest_path, refresh=refresh,
+                                        max_rules=max_rules)
+
+
+def generate_rules_from_sections(sections: Iterable[MarkdownSection], concurrency: int = 1,
+                                 manifest_path: Optional[str] = None, refresh: bool = False,
+                                 max_rules: int = DEFAULT_RULE_COUNT,
+                                 max_tokens: int = DEFAULT_SECTION_TOKENS) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Extract rules from a stream of sections, aggregate them and curate them down to the
+    `max_rules` most important ones with `curate_rules`.
+
+    Consecutive sections are packed into requests of at most `max_tokens` estimated tokens (see
+    `pack_sections`), and every rule is tagged with the section it was extracted from. Sections
+    are consumed lazily: up to `concurrency` requests are sent to the model at the same time and
+    only a bounded number wait to be sent, so the whole input is never held in memory. Results
+    are collected in section order, so the aggregated rules do not depend on which request
+    finishes first.
+
+    If `manifest_path` is given, the rules extracted per section are stored there keyed by the
+    section content hash, and only added or changed sections are packed and sent to the model on
+    later runs. `refresh` re-extracts every section but still keeps the rule IDs recorded in the
+    manifest.
+
+    Raises LLMError if any section fails, even after retries and repair, rather than returning
+    rules with that section missing.
+    """
+    manifest = load_manifest(manifest_path) if manifest_path else {"version": 1, "sections": {}, "rule_ids": {}}
+    if refresh:
+        manifest["sections"] = {}
+
+    def process_chunk(numbers: List[int], group: List[MarkdownSection]) -> Optional[List[List[Dict[str, str]]]]:
+        sources = list(dict.fromkeys(section.source for section in group if section.source))
+        where = f" ({', '.join(sources)})" if sources else ""
+        span_text = f"{numbers[0]}-{numbers[-1]}" if len(numbers) > 1 else str(numbers[0])
+        print(f"Processing section {span_text}{where}...")
+        try:
+            return generate_rules_from_chunk([section.text for section in group])
+        except LLMError as e:
+            print(f"Error: section {span_text}{where}: {e}")
+            return None
+
+    # [tags, content hash, rules or (pending extraction, position in its request)] per section,
+    # in section order
+    entries = []
+    pending = {}  # id of a section to extract -> (section number, entry)
+
+    def changed_sections():
+        for idx, section in enumerate(sections, start=1):
+            digest = section_hash(section.text)
+            if digest in manifest["sections"]:
+                entries.append([section.tags(), digest, manifest["sections"][digest]])
+                continue
+            entry = [section.tags(), digest, None]
+            entries.append(entry)
+            pending[id(section)] = (idx, entry)
+            yield section
+
+    requests = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        in_flight = deque()
+        for group in pack_sections(changed_sections(), max_tokens):
+            numbers, group_entries = zip(*(pending.pop(id(section)) for section in group))
+            future = executor.submit(process_chunk, list(numbers), group)
+            for position, entry in enumerate(group_entries):
+                entry[2] = (future, position)
+            requests += 1
+            in_flight.append(future)
+            # Let the reader run ahead of the requests by one more batch at most
+            while len(in_flight) > 2 * max(1, concurrency):
+                in_flight.popleft().result()
+    extracted = sum(isinstance(result, tuple) for _, _, result in entries)
+    print(f"Total sections processed: {len(entries)} ({requests} extraction requests)")
+    if manifest_path:
+        print(f"Sections unchanged since last run: {len(entries) - extracted}")
+
+    section_rules = {}
     all_rules = []
-    for idx, chunk in enumerate(chunks, start=1):
-        print(f"Processing section {idx}/{len(chunks)}...")
-        rules = generate_rules_from_chunk(chunk)
-        all_rules.append(rules)
-    
-    aggregated_rules = aggregate_rules(all_rules)
-    corrected_rules = review_rules(aggregated_rules)
+    failed = []
+    for idx, (tags, digest, result) in enumerate(entries, start=1):
+        if isinstance(result, tuple):
+            future, position = result
+            group_rules = future.result()
+            rules = group_rules[position] if group_rules is not None else None
+        else:
+            rules = result
+        if rules is None:
+            failed.append(idx)
+            continue
+        section_rules[digest] = rules
+        all_rules.append([{**rule, **tags} for rule in rules])
+
+    if failed:
+        # Keep the sections that did parse so that a rerun only extracts the failed ones
+        if manifest_path:
+            save_manifest({"version": 1, "sections": section_rules, "rule_ids": manifest["rule_ids"]}, manifest_path)
+        raise LLMError(f"Could not extract rules from section(s) {', '.join(map(str, failed))}")
 
-    return {"rules": aggregated_rules}
+    with span("aggregate_rules"):
+        aggregated_rules = aggregate_rules(all_rules, previous_ids=manifest["rule_ids"])
 
+    # Saved before the review, so a failed review does not cost the extraction on the next run
+    if manifest_path:
+        save_manifest({
+            "version": 1,
+            "sections": section_rules,
+            "rule_ids": {rule["description"]: rule["id"] for rule in aggregated_rules},
+        }, manifest_path)
 
+    with span("review_rules"):
+        curated_rules = curate_rules(aggregated_rules, target=max_rules, concurrency=concurrency)
+    return {"rules": curated_rules}
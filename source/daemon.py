@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import socketserver
+import threading
+from functools import partial
+from typing import Dict, Iterator, Optional, Tuple
+from source.daemon_client import is_running
+from source.diff_compaction import DEFAULT_CONTEXT_RADIUS
+from source.git_helpers import git_show_file
+from source.hunk_store import HunkReviewStore, default_hunk_store_path
+from source.llm import get_backend, get_model
+from source.review_utils import check_diff_sharded, check_diff_incremental, check_diff_streaming
+from source.rules_bundle import RulesBundle, load_rules
+
+
+class _Job:
+    """
+    One review in flight. Its events are kept so that every client asking for the same review,
+    including ones that join late, receives all of them.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self._condition = threading.Condition()
+
+    def emit(self, event: Dict, final: bool = False) -> None:
+        with self._condition:
+            self.events.append(event)
+            self.done = self.done or final
+            self._condition.notify_all()
+
+    def follow(self) -> Iterator[Dict]:
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self.events) and not self.done:
+                    self._condition.wait()
+                new_events = self.events[index:]
+                index = len(self.events)
+                finished = self.done
+            yield from new_events
+            if finished:
+                return
+
+
+class ReviewService:
+    """
+    State the daemon keeps warm between reviews: parsed rules and rule indexes per rules file,
+    and hunk review stores. Identical concurrent reviews are coalesced into one run.
+    """
+
+    def __init__(self):
+        self.reviews = 0
+        self.coalesced = 0
+        self._rules: Dict[str, Tuple[float, RulesBundle]] = {}
+        self._stores: Dict[str, Tuple[HunkReviewStore, threading.Lock]] = {}
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    def load_rules(self, path: str, top_k: int = 0) -> Tuple[str, object]:
+        """
+        Rules text and, when `top_k` is set, the rule index of a rules file or bundle.
+        """
+        bundle = self._bundle(path)
+        return bundle.text, bundle.rule_index() if top_k > 0 else None
+
+    def _bundle(self, path: str) -> RulesBundle:
+        """
+        The rules of a rules file or bundle, reloaded only when the file has been modified.
+        Bundles are memory-mapped.
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._rules.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_rules(path, use_mmap=True))
+            with self._lock:
+                self._rules[path] = cached
+        return cached[1]
+
+    def _store(self, path: str) -> Tuple[HunkReviewStore, threading.Lock]:
+        with self._lock:
+            if path not in self._stores:
+                self._stores[path] = (HunkReviewStore(path), threading.Lock())
+            return self._stores[path]
+
+    def review(self, request: Dict) -> Iterator[Dict]:
+        """
+        Run a review request, or join the identical one already running, and yield its events:
+        "issue" events while streaming, then one "done" or "error" event.
+        """
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+        with self._lock:
+            self.reviews += 1
+            job = self._jobs.get(key)
+            if job is not None:
+                self.coalesced += 1
+            else:
+                job = self._jobs[key] = _Job()
+                threading.Thread(target=self._run, args=(key, request, job), daemon=True).start()
+        return job.follow()
+
+    def _run(self, key: str, request: Dict, job: _Job) -> None:
+        try:
+            top_k = request.get("top_k_rules", 0)
+            rules, rule_index = self.load_rules(request["rules"], top_k)
+            diff_text = request["diff"]
+            # Local checks read the staged files of the client's repository; the LLM sees the compacted diff
+            options = {"local_rules": self._bundle(request["rules"]).local_rules,
+                       "rule_scope": self._bundle(request["rules"]).rule_scope(),
+                       "read_source": partial(git_show_file, cwd=request["root"]) if request.get("root") else None,
+                       "context_radius": request.get("context_radius", DEFAULT_CONTEXT_RADIUS)}
+            if request.get("stream"):
+                issues = check_diff_streaming(
+                    diff_text, rules, on_issue=lambda issue: job.emit({"event": "issue", "issue": issue}),
+                    fail_fast=request.get("fail_fast", False), max_shard_tokens=request.get("max_shard_tokens", 6000),
+                    rule_index=rule_index, top_k=top_k, **options)
+            elif request.get("incremental"):
+                store, store_lock = self._store(request.get("hunk_store") or default_hunk_store_path(request.get("root")))
+                with store_lock:
+                    issues = check_diff_incremental(diff_text, rules, store, concurrency=request.get("concurrency", 4),
+                                                    max_shard_tokens=request.get("max_shard_tokens", 6000),
+                                                    rule_index=rule_index, top_k=top_k, **options)
+            else:
+                issues = check_diff_sharded(diff_text, rules, max_shard_tokens=request.get("max_shard_tokens", 6000),
+                                            concurrency=request.get("concurrency", 4), rule_index=rule_index, top_k=top_k,
+                                            **options)
+            final = {"event": "done", "issues": issues, "backend": get_backend().name, "model": get_model("review"),
+                     "rules_digest": self._bundle(request["rules"]).digest}
+        except (Exception, SystemExit) as e:
+            # load_rule_records exits on a bad rules file; the daemon must keep serving
+            final = {"event": "error", "message": str(e) or type(e).__name__}
+        with self._lock:
+            del self._jobs[key]
+        job.emit(final, final=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"reviews": self.reviews, "coalesced": self.coalesced, "in_flight": len(self._jobs)}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line.strip():
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self._send({"event": "error", "message": "Invalid request"})
+            return
+        command = message.get("command", "review")
+        try:
+            if command == "review":
+                for event in self.server.service.review(message):
+                    self._send(event)
+            elif command == "ping":
+                self._send({"event": "pong", "pid": os.getpid()})
+            elif command == "stats":
+                self._send({"event": "stats", **self.server.service.stats()})
+            elif command == "shutdown":
+                self._send({"event": "bye"})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                self._send({"event": "error", "message": f"Unknown command: {command}"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away; a running review still finishes for the others
+
+    def _send(self, event: Dict) -> None:
+        self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class ReviewDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server answering review requests from review.py with a shared ReviewService.
+    Each request is one JSON line; the answer is a stream of JSON lines.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: Optional[ReviewService] = None):
+        if os.path.exists(socket_path):
+            if is_running(socket_path):
+                raise OSError(f"A review daemon is already running at {socket_path}")
+            os.unlink(socket_path)  # Left over by a daemon that did not shut down cleanly
+        self.service = service or ReviewService()
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
@@ -0,0 +1,53 @@
+import json
+import os
+import socket
+import tempfile
+from typing import Dict, Iterator, Optional
+
+# Kept free of heavy imports: this module is all a review needs when a daemon is running
+
+
+class DaemonUnavailable(Exception):
+    """
+    No review daemon is listening on the socket.
+    """
+
+
+def default_socket_path() -> str:
+    """
+    Per-user socket path: $PR_HELPER_SOCKET, or a file in the runtime or temp directory.
+    """
+    if os.getenv("PR_HELPER_SOCKET"):
+        return os.environ["PR_HELPER_SOCKET"]
+    directory = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"pr-helper-{os.getuid()}.sock")
+
+
+def send_request(message: Dict, socket_path: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Send one JSON request to the daemon and yield the JSON events it streams back.
+    Raises DaemonUnavailable if nothing is listening on the socket.
+    """
+    socket_path = socket_path or default_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonUnavailable(f"No review daemon at {socket_path}") from e
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('r', encoding='utf-8') as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        sock.close()
+
+
+def is_running(socket_path: Optional[str] = None) -> bool:
+    try:
+        return any(event.get("event") == "pong" for event in send_request({"command": "ping"}, socket_path, timeout=2))
+    except (DaemonUnavailable, OSError):
+        return False
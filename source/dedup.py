@@ -0,0 +1,106 @@
+import random
+import re
+import zlib
+from collections import defaultdict
+from typing import FrozenSet, List
+
+# Jaccard similarity of the word sets above which two rules count as paraphrases
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+
+# 16 bands of 4 rows: pairs at the default threshold collide in some band with ~99% probability
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_BANDS * ROWS_PER_BAND)]
+
+STOPWORDS = frozenset("""
+a an and are as at be by can for from has have in is it its of on or should that the their them
+they this to when where which while with within you your all any must always
+""".split())
+
+# Words that turn a rule into its opposite; rules of opposite polarity are never merged
+NEGATIONS = frozenset("not no never avoid without nor none cannot neither".split())
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    """
+    Set of normalised content words of a rule description.
+    """
+    words = set()
+    for word in re.findall(r'\w+', text.lower().replace("n't", " not")):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def is_negative(text: str) -> bool:
+    """
+    Whether a rule forbids rather than requires, i.e. has an odd number of negations.
+    """
+    words = re.findall(r'\w+', text.lower().replace("n't", " not"))
+    return sum(word in NEGATIONS for word in words) % 2 == 1
+
+
+def minhash_signature(words: FrozenSet[str]) -> List[int]:
+    hashes = [zlib.crc32(word.encode('utf-8')) for word in words]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def cluster_near_duplicates(texts: List[str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD) -> List[List[int]]:
+    """
+    Group texts whose word sets have a Jaccard similarity of at least `threshold`.
+
+    Candidate pairs come from MinHash locality-sensitive hashing, so the cost grows roughly
+    linearly with the number of texts; candidates are then confirmed with the exact similarity.
+    Negation words count as content, and a rule is never grouped with its negation.
+    Returns clusters of indices, each in input order, ordered by their first member.
+    """
+    word_sets = [shingles(text) for text in texts]
+    negative = [is_negative(text) for text in texts]
+    parent = list(range(len(texts)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    buckets = defaultdict(list)
+    for index, words in enumerate(word_sets):
+        if not words:
+            continue
+        signature = minhash_signature(words)
+        for band in range(NUM_BANDS):
+            rows = tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            buckets[(band, rows)].append(index)
+
+    checked = set()
+    for members in buckets.values():
+        for position, first in enumerate(members):
+            for second in members[position + 1:]:
+                if (first, second) in checked:
+                    continue
+                checked.add((first, second))
+                if negative[first] != negative[second] or find(first) == find(second):
+                    continue
+                if jaccard(word_sets[first], word_sets[second]) >= threshold:
+                    # Keep the earliest index as the root so clusters are ordered by first member
+                    root_first, root_second = find(first), find(second)
+                    parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    clusters = defaultdict(list)
+    for index in range(len(texts)):
+        clusters[find(index)].append(index)
+    return [clusters[root] for root in sorted(clusters)]
@@ -0,0 +1,244 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from source.diff_utils import HUNK_HEADER_RE, FileDiff, Hunk, parse_diff
+
+# Unchanged lines kept around each change; git itself uses 3
+DEFAULT_CONTEXT_RADIUS = 2
+# Shortest run of lines recognised as moved rather than deleted and re-added
+MIN_MOVED_LINES = 3
+# Files where any whitespace change may change the meaning, so whitespace-only changes are kept
+INDENTATION_SENSITIVE_EXTENSIONS = ('.py', '.pyi', '.yml', '.yaml', '.mk', '.haml', '.pug', '.sass', '.coffee')
+INDENTATION_SENSITIVE_NAMES = ('Makefile', 'GNUmakefile')
+
+
+@dataclass
+class _Line:
+    prefix: str  # ' ', '+', '-' or '\\'
+    text: str
+    old: int  # Line numbers of the line in the old and new file
+    new: int
+    note: bool = False
+
+
+@dataclass
+class _Block:
+    """
+    A run of lines in a hunk: unchanged context, or one change of removed and added lines.
+    """
+    lines: List[_Line]
+    change: bool
+    note: Optional[str] = None  # Replaces the lines when the change is collapsed
+
+    @property
+    def removed(self) -> List[_Line]:
+        return [line for line in self.lines if line.prefix == '-']
+
+    @property
+    def added(self) -> List[_Line]:
+        return [line for line in self.lines if line.prefix == '+']
+
+
+def _normalize(text: str) -> str:
+    # Leading indentation is kept: re-indenting a line can move it in or out of a block
+    stripped = text.lstrip()
+    return text[:len(text) - len(stripped)] + ''.join(stripped.split())
+
+
+def _indentation_sensitive(path: str) -> bool:
+    name = os.path.basename(path)
+    return name in INDENTATION_SENSITIVE_NAMES or os.path.splitext(name)[1].lower() in INDENTATION_SENSITIVE_EXTENSIONS
+
+
+def _run_key(lines: List[_Line]) -> Tuple[str, ...]:
+    return tuple(_normalize(line.text) for line in lines)
+
+
+def _count(number: int) -> str:
+    return f"{number} line" if number == 1 else f"{number} lines"
+
+
+def _line_range(numbers: List[int]) -> str:
+    return f"{numbers[0]}-{numbers[-1]}" if numbers[-1] != numbers[0] else str(numbers[0])
+
+
+def _parse_blocks(hunk: Hunk) -> List[_Block]:
+    match = HUNK_HEADER_RE.match(hunk.header)
+    old, new = (int(match.group(1)), int(match.group(3))) if match else (0, 0)
+    # An empty range is numbered from the line before it
+    old += match is not None and match.group(2) == '0'
+    new += match is not None and match.group(4) == '0'
+    blocks: List[_Block] = []
+    for raw in hunk.lines:
+        prefix = raw[:1] if raw[:1] in ('+', '-', '\\') else ' '
+        line = _Line(prefix, raw[1:], old, new)
+        old += prefix in (' ', '-')
+        new += prefix in (' ', '+')
+        change = prefix in ('+', '-') or (prefix == '\\' and bool(blocks) and blocks[-1].change)
+        if blocks and blocks[-1].change == change:
+            blocks[-1].lines.append(line)
+        else:
+            blocks.append(_Block([line], change))
+    return blocks
+
+
+def _collapse_whitespace_changes(blocks: List[_Block]) -> bool:
+    """
+    Turn changes that only alter whitespace within or at the end of lines into context, in place.
+    Returns whether any was found.
+    """
+    found = False
+    merged: List[_Block] = []
+    for block in blocks:
+        removed, added = block.removed, block.added
+        if block.change and removed and len(removed) == len(added) and _run_key(removed) == _run_key(added):
+            block = _Block([_Line(' ', after.text, before.old, after.new) for before, after in zip(removed, added)], False)
+            found = True
+        if merged and not merged[-1].change and not block.change:
+            merged[-1].lines.extend(block.lines)
+        else:
+            merged.append(block)
+    blocks[:] = merged
+    return found
+
+
+def _find_moves(files: List[Tuple[FileDiff, List[List[_Block]]]]) -> None:
+    """
+    Collapse changes that only remove a run of lines and changes that only add the same run
+    elsewhere in the diff into notes pointing at each other.
+    """
+    removals: Dict[Tuple[str, ...], List[Tuple[str, _Block]]] = {}
+    for file_diff, hunks in files:
+        for blocks in hunks:
+            for block in blocks:
+                if block.change and not block.added and len(block.removed) >= MIN_MOVED_LINES:
+                    removals.setdefault(_run_key(block.removed), []).append((file_diff.path, block))
+    if not removals:
+        return
+    for file_diff, hunks in files:
+        for blocks in hunks:
+            for block in blocks:
+                if not block.change or block.removed or len(block.added) < MIN_MOVED_LINES:
+                    continue
+                candidates = removals.get(_run_key(block.added))
+                if not candidates:
+                    continue
+                source_path, source = candidates.pop(0)
+                old_lines = [line.old for line in source.removed]
+                new_lines = [line.new for line in block.added]
+                block.note = f"\\ {_count(len(new_lines))} moved here from {source_path} lines {_line_range(old_lines)} without changes"
+                source.note = f"\\ {_count(len(old_lines))} moved to {file_diff.path} lines {_line_range(new_lines)} without changes"
+
+
+def _header(lines: List[_Line], heading: str) -> str:
+    old_count = sum(line.prefix in (' ', '-') for line in lines)
+    new_count = sum(line.prefix in (' ', '+') for line in lines)
+    old_start = lines[0].old - (old_count == 0)
+    new_start = lines[0].new - (new_count == 0)
+    return f"@@ -{old_start},{old_count} +{new_start},{new_count} @@{heading}"
+
+
+def _compact_hunk(hunk: Hunk, blocks: List[_Block], whitespace_only: bool, context_radius: int) -> List[Hunk]:
+    notes = [block.note for block in blocks if block.note]
+    kept = [block for block in blocks if block.change and not block.note]
+    if not kept:
+        if whitespace_only:
+            notes.insert(0, "\\ Whitespace-only changes")
+        return [Hunk(header=hunk.header, lines=notes)]
+    if not any(block.added for block in kept):
+        removed = sum(len(block.removed) for block in kept)
+        return [Hunk(header=hunk.header, lines=[f"\\ {_count(removed)} removed"] + notes)]
+
+    # Mark the lines to keep: changes and the context within the radius of one
+    lines: List[_Line] = []
+    keep: List[bool] = []
+    for index, block in enumerate(blocks):
+        if block.note:
+            lines.append(_Line('\\', block.note[1:], 0, 0, note=True))
+            keep.append(True)
+        elif block.change:
+            lines.extend(block.lines)
+            keep.extend([True] * len(block.lines))
+        else:
+            after_change = index > 0 and blocks[index - 1].change and not blocks[index - 1].note
+            before_change = index + 1 < len(blocks) and blocks[index + 1].change and not blocks[index + 1].note
+            for position, line in enumerate(block.lines):
+                lines.append(line)
+                keep.append((after_change and position < context_radius)
+                            or (before_change and len(block.lines) - position <= context_radius))
+
+    # Every run of kept lines becomes a hunk with its own header, so that line numbers still
+    # count from the original new-file lines; notes stay with the hunk before them
+    match = HUNK_HEADER_RE.match(hunk.header)
+    heading = hunk.header[match.end():] if match else ''
+    compacted: List[Hunk] = []
+    run: List[_Line] = []
+    pending_notes: List[str] = []
+
+    def close_run():
+        if run:
+            compacted.append(Hunk(header=_header(run, heading if not compacted else ''),
+                                  lines=pending_notes + [line.prefix + line.text for line in run]))
+            pending_notes.clear()
+            run.clear()
+
+    for line, kept_line in zip(lines, keep):
+        if line.note:
+            close_run()
+            if compacted:
+                compacted[-1].lines.append(line.prefix + line.text)
+            else:
+                pending_notes.append(line.prefix + line.text)
+        elif kept_line:
+            run.append(line)
+        else:
+            close_run()
+    close_run()
+    return compacted
+
+
+def compact_file_diffs(file_diffs: List[FileDiff], context_radius: int = DEFAULT_CONTEXT_RADIUS) -> List[FileDiff]:
+    """
+    Compact parsed file diffs for review, see `compact_diff`.
+    """
+    parsed = []
+    for file_diff in file_diffs:
+        if any(line.startswith('deleted file mode') for line in file_diff.header_lines):
+            removed = sum(line.startswith('-') for hunk in file_diff.hunks for line in hunk.lines)
+            header_lines = [line for line in file_diff.header_lines if not line.startswith(('--- ', '+++ '))]
+            parsed.append((FileDiff(path=file_diff.path, header_lines=header_lines + [f"\\ File deleted ({_count(removed)})"],
+                                    binary=file_diff.binary, truncated=file_diff.truncated), []))
+            continue
+        parsed.append((file_diff, [_parse_blocks(hunk) for hunk in file_diff.hunks]))
+
+    whitespace_only = {id(blocks): _collapse_whitespace_changes(blocks) for file_diff, hunks in parsed
+                       if not _indentation_sensitive(file_diff.path) for blocks in hunks}
+    _find_moves(parsed)
+
+    compacted = []
+    for file_diff, hunks in parsed:
+        if not hunks:
+            compacted.append(file_diff)
+            continue
+        new_hunks = []
+        for hunk, blocks in zip(file_diff.hunks, hunks):
+            new_hunks.extend(_compact_hunk(hunk, blocks, whitespace_only.get(id(blocks), False), context_radius))
+        compacted.append(FileDiff(path=file_diff.path, header_lines=file_diff.header_lines, hunks=new_hunks,
+                                  binary=file_diff.binary, truncated=file_diff.truncated))
+    return compacted
+
+
+def compact_diff(diff_text: str, context_radius: int = DEFAULT_CONTEXT_RADIUS) -> str:
+    """
+    Drop the parts of a diff that cost tokens without helping the review.
+
+    Context is trimmed to `context_radius` lines around each change, changes that only alter
+    whitespace within or at the end of lines become context, runs of lines moved without changes
+    and hunks that only delete lines are replaced by a one-line note, and deleted files keep only
+    their header. Changes of leading indentation are never collapsed, and whitespace changes are
+    kept entirely in indentation-sensitive files such as Python and YAML.
+
+    Every remaining run of lines gets a hunk header with its original line numbers, so issues
+    reported against the compacted diff point at the same lines of the new file.
+    """
+    return '\n'.join(file_diff.text() for file_diff in compact_file_diffs(parse_diff(diff_text), context_radius))
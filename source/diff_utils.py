@@ -0,0 +1,139 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+from source.token_utils import estimate_tokens
+
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+@dataclass
+class Hunk:
+    header: str
+    lines: List[str] = field(default_factory=list)
+
+    def text(self) -> str:
+        return '\n'.join([self.header] + self.lines)
+
+    def new_start(self) -> int:
+        """
+        First line number of the hunk in the new file.
+        """
+        match = HUNK_HEADER_RE.match(self.header)
+        return int(match.group(3)) if match else 0
+
+
+@dataclass
+class FileDiff:
+    path: str
+    header_lines: List[str] = field(default_factory=list)
+    hunks: List[Hunk] = field(default_factory=list)
+    binary: bool = False
+    truncated: bool = False
+    size: int = 0
+
+    def header(self) -> str:
+        return '\n'.join(self.header_lines)
+
+    def text(self) -> str:
+        return '\n'.join([self.header()] + [hunk.text() for hunk in self.hunks])
+
+
+def _path_from_header(line: str) -> str:
+    """
+    Extract the file path from a `diff --git a/<path> b/<path>` line.
+    """
+    match = re.match(r'^diff --git a/(.*) b/(.*)$', line)
+    if match:
+        return match.group(2)
+    return line[len('diff --git '):]
+
+
+def iter_file_diffs(lines: Iterable[str], max_file_bytes: Optional[int] = None) -> Iterator[FileDiff]:
+    """
+    Parse unified `git diff` lines into files and hunks, yielding each file as soon as it is complete.
+
+    Binary files keep only their header. With `max_file_bytes`, hunk lines past the cap are dropped
+    and the file is marked as truncated.
+    """
+    current_file = None
+    current_hunk = None
+    for line in lines:
+        if line.startswith('diff --git '):
+            if current_file is not None:
+                yield current_file
+            current_file = FileDiff(path=_path_from_header(line), header_lines=[line], size=len(line) + 1)
+            current_hunk = None
+            continue
+        if current_file is None:
+            continue  # Skip anything before the first file header
+        if max_file_bytes is not None:
+            current_file.size += len(line.encode('utf-8')) + 1
+        if current_file.binary or current_file.truncated:
+            continue
+        if '\0' in line or (current_hunk is None and (line.startswith('Binary files ') or line == 'GIT binary patch')):
+            current_file.binary = True
+            current_file.hunks = []
+            if line.startswith('Binary files '):
+                current_file.header_lines.append(line)
+        elif max_file_bytes is not None and current_file.size > max_file_bytes:
+            current_file.truncated = True
+        elif line.startswith('@@'):
+            current_hunk = Hunk(header=line)
+            current_file.hunks.append(current_hunk)
+        elif current_hunk is not None:
+            current_hunk.lines.append(line)
+        else:
+            if line.startswith('+++ ') and line[4:] != '/dev/null':
+                current_file.path = line[4:][2:] if line[4:].startswith('b/') else line[4:]
+            current_file.header_lines.append(line)
+    if current_file is not None:
+        yield current_file
+
+
+def parse_diff(diff_text: str) -> List[FileDiff]:
+    """
+    Parse unified `git diff` output into files and hunks.
+    """
+    return list(iter_file_diffs(diff_text.splitlines()))
+
+
+def diff_paths(diff_text: str) -> List[str]:
+    """
+    Paths of the files in a diff, in order, without parsing the hunks.
+    """
+    return [_path_from_header(line) for line in diff_text.splitlines() if line.startswith('diff --git ')]
+
+
+def pack_diff_shards(diff_text: str, max_tokens: int = 6000) -> List[str]:
+    """
+    Pack the files and hunks of a diff into shards of at most `max_tokens` estimated tokens.
+
+    Hunks are never cut, so a single hunk larger than the budget becomes a shard of its own.
+    The file header is only repeated when a file continues in a new shard.
+    """
+    shards = []
+    current = []
+    current_tokens = 0
+    current_path = None
+    for file_diff in parse_diff(diff_text):
+        header = file_diff.header()
+        header_tokens = estimate_tokens(header)
+        parts = [hunk.text() for hunk in file_diff.hunks] or ['']
+        for part in parts:
+            part_tokens = estimate_tokens(part)
+            needs_header = current_path != file_diff.path
+            cost = part_tokens + (header_tokens if needs_header else 0)
+            if current and current_tokens + cost > max_tokens:
+                shards.append('\n'.join(current))
+                current, current_tokens, current_path = [], 0, None
+                needs_header = True
+                cost = part_tokens + header_tokens
+            if needs_header:
+                current.append(header)
+                current_path = file_diff.path
+            if part:
+                current.append(part)
+            current_tokens += cost
+    if current:
+        shards.append('\n'.join(current))
+    return shards
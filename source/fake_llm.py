@@ -0,0 +1,113 @@
+import ast
+import json
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from source.llm import LLMBackend
+from source.profiling import annotate
+from source.token_utils import estimate_tokens
+
+RULE_LINE_RE = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+(.+)$')
+SECTION_MARKER_RE = re.compile(r'^=== Section (\d+) ===$')
+RULE_WORDS_RE = re.compile(r'\b(should|must|always|never|avoid|use|prefer|do not|don\'t)\b', re.IGNORECASE)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic in-process backend for offline tests and benchmarks.
+
+    Answers are derived from the prompt alone: rule extraction returns the Markdown list items
+    that read like guidelines, rule curation returns the rules it was given, and diff review
+    reports added lines containing TODO or FIXME (as JSON when a `response_format` is requested).
+    `latency` adds a fixed delay per request to simulate network round trips.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, model: str, messages: List[Dict[str, str]], **params) -> Optional[str]:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        system = messages[0]["content"] if messages else ""
+        prompt = messages[-1]["content"] if messages else ""
+        if "extracting coding guidelines" in system:
+            content = self._extract(prompt)
+        elif "reviewing coding guidelines" in system:
+            content = self._curate(prompt)
+        else:
+            content = self._review(prompt, structured="response_format" in params or "JSON schema" in system)
+        annotate(prompt_tokens=sum(estimate_tokens(message["content"]) for message in messages),
+                 completion_tokens=estimate_tokens(content))
+        return content
+
+    def stream(self, model: str, messages: List[Dict[str, str]], **params) -> Iterator[str]:
+        """
+        Yield the deterministic answer a few characters at a time.
+        """
+        content = self.complete(model, messages, **params)
+        for start in range(0, len(content), 16):
+            yield content[start:start + 16]
+
+    @staticmethod
+    def _section(prompt: str, marker: str) -> str:
+        index = prompt.rfind(marker)
+        return prompt[index + len(marker):] if index != -1 else prompt
+
+    def _extract(self, prompt: str) -> str:
+        rules = []
+        section = 1
+        for line in self._section(prompt, "Markdown Content:").splitlines():
+            marker = SECTION_MARKER_RE.match(line)
+            if marker:
+                section = int(marker.group(1))
+                continue
+            match = RULE_LINE_RE.match(line)
+            if match and RULE_WORDS_RE.search(match.group(1)):
+                rules.append({"id": str(len(rules) + 1), "description": match.group(1).strip(), "section": section})
+        return json.dumps({"rules": rules})
+
+    def _curate(self, prompt: str) -> str:
+        try:
+            rules = ast.literal_eval(self._section(prompt, "Coding Guidelines:").strip())
+        except (ValueError, SyntaxError):
+            rules = []
+        keep = re.search(r'Only keep the (\d+) most important rules', prompt)
+        return json.dumps({"rules": rules[:int(keep.group(1)) if keep else 24]})
+
+    def _review(self, prompt: str, structured: bool = False) -> str:
+        issues = []
+        new_line = 0
+        for line in self._section(prompt, "Git diff:").splitlines():
+            header = re.match(r'^@@ -\d+(?:,\d+)? \+(\d+)', line)
+            if header:
+                new_line = int(header.group(1))
+                continue
+            if line.startswith('+++') or line.startswith('---'):
+                continue
+            if line.startswith('+'):
+                if 'TODO' in line or 'FIXME' in line:
+                    issues.append({
+                        "rule": "Remove unused code and leftover notes",
+                        "line_numbers": str(new_line),
+                        "description": f"Unresolved note left in code: {line[1:].strip()}",
+                        "suggestion": "Resolve the note or track it in an issue.",
+                    })
+                new_line += 1
+            elif line.startswith(' '):
+                new_line += 1
+        if structured:
+            return json.dumps({"issues": issues})
+        blocks = [
+            f"Rule Violated: {issue['rule']}\n"
+            f"Line Number(s): {issue['line_numbers']}\n"
+            f"Issue Description: {issue['description']}\n"
+            f"Suggestion: {issue['suggestion']}"
+            for issue in issues
+        ]
+        return "\n\n".join(blocks) if blocks else "No issues found."
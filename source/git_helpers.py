@@ -1,9 +1,112 @@
 import subprocess
+from typing import Iterable, Iterator, Optional, Tuple
+from source.diff_utils import FileDiff, iter_file_diffs
 
-def git_diff_branch(branch='main'):
+# Per-file cap on diff size; larger files (lockfiles, generated code) are truncated
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+
+def _iter_pipe_lines(stream) -> Iterator[str]:
+    """
+    Decode lines from a binary pipe one at a time.
+    """
+    for raw_line in stream:
+        yield raw_line.rstrip(b'\n').decode('utf-8', errors='replace')
+
+def _stream_diff(diff_args, excludes: Iterable[str], max_file_bytes: Optional[int]) -> Iterator[FileDiff]:
+    """
+    Run `git diff` with the given revision arguments and parse its output as it arrives.
+    Raises subprocess.CalledProcessError if git fails, e.g. for an unknown revision.
+    """
+    # Pathspecs are relative to the repository root, so running from a subdirectory still
+    # reviews the whole change
+    command = ['git', 'diff', '--no-ext-diff'] + list(diff_args) + ['--', ':(top)']
+    command += [f':(top,exclude){pattern}' for pattern in excludes]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        yield from iter_file_diffs(_iter_pipe_lines(process.stdout), max_file_bytes=max_file_bytes)
+    finally:
+        if process.poll() is None:
+            # The consumer stopped early; do not leave git blocked on a full pipe
+            process.kill()
+        process.stdout.close()
+        process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def iter_git_diff(branch: str = 'main', excludes: Iterable[str] = (),
+                  max_file_bytes: Optional[int] = DEFAULT_MAX_FILE_BYTES) -> Iterator[FileDiff]:
+    """
+    Stream the git diff of staged changes against a branch, yielding one parsed file at a time.
+
+    `excludes` are glob patterns passed to git as exclude pathspecs, so excluded files never reach
+    Python. Binary files are reduced to their header and files above `max_file_bytes` are truncated.
     """
-    Get the git diff of staged changes against a specified branch.
+    return _stream_diff(['--cached', branch], excludes, max_file_bytes)
+
+def iter_git_diff_ref(ref: str, base: str = 'main', excludes: Iterable[str] = (),
+                      max_file_bytes: Optional[int] = DEFAULT_MAX_FILE_BYTES) -> Iterator[FileDiff]:
+    """
+    Stream the diff of a committed ref. A range such as `a..b` or `a...b` is diffed as given;
+    a branch or commit is diffed against its merge base with `base`, like a pull request.
     """
-    result = subprocess.run(['git', 'diff', '--cached', branch], stdout=subprocess.PIPE)
-    return result.stdout.decode('utf-8')
+    diff_args = [ref] if '..' in ref else [f'{base}...{ref}']
+    return _stream_diff(diff_args, excludes, max_file_bytes)
 
+def git_show_file(path: str, rev: str = '', cwd: Optional[str] = None) -> Optional[str]:
+    """
+    Content of a file at a revision, or in the index when `rev` is empty, with `path` relative
+    to the repository root. Returns None if the file does not exist there or is not text.
+    """
+    result = subprocess.run(['git', 'show', f'{rev}:{path}'], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        return None
+    try:
+        return result.stdout.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+def _git_output(args, cwd: Optional[str] = None) -> Optional[str]:
+    result = subprocess.run(['git'] + list(args), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode('utf-8', errors='replace').strip()
+
+def git_diff_revisions(ref: str, base: str = 'main', cwd: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """
+    Commit ids of the old and new side of the diff that `iter_git_diff_ref` produces for a ref,
+    or None if they cannot be resolved.
+    """
+    if '...' in ref:
+        old, new = ref.split('...', 1)
+        merge_base = True
+    elif '..' in ref:
+        old, new = ref.split('..', 1)
+        merge_base = False
+    else:
+        old, new = base, ref
+        merge_base = True
+    old, new = old or 'HEAD', new or 'HEAD'
+    new_id = _git_output(['rev-parse', '--verify', '-q', f'{new}^{{commit}}'], cwd)
+    if merge_base:
+        old_id = _git_output(['merge-base', old, new], cwd)
+    else:
+        old_id = _git_output(['rev-parse', '--verify', '-q', f'{old}^{{commit}}'], cwd)
+    if not old_id or not new_id:
+        return None
+    return old_id, new_id
+
+def git_toplevel(cwd: Optional[str] = None) -> Optional[str]:
+    """
+    Absolute path of the working tree root of the repository, or None outside a repository.
+    """
+    return _git_output(['rev-parse', '--show-toplevel'], cwd) or None
+
+def git_author(rev: str = '', cwd: Optional[str] = None) -> Optional[str]:
+    """
+    "Name <email>" of the author of a commit, or of the next commit when `rev` is empty.
+    """
+    if rev:
+        return _git_output(['log', '-1', '--format=%an <%ae>', rev], cwd) or None
+    ident = _git_output(['var', 'GIT_AUTHOR_IDENT'], cwd)
+    # The ident ends with a timestamp and time zone
+    return ident.rsplit(' ', 2)[0] if ident else None
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List, Optional
+from source.cache import CACHE_ROOT
+from source.diff_utils import FileDiff, Hunk
+from source.git_helpers import git_toplevel
+
+# One store per repository, so that reviews of different checkouts never mix
+HUNK_STORE_DIR = os.path.join(CACHE_ROOT, 'hunk_reviews')
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def default_hunk_store_path(cwd: Optional[str] = None) -> str:
+    """
+    Store file of the repository containing `cwd`, named after a hash of its root directory.
+    Outside a repository the directory itself is used.
+    """
+    root = git_toplevel(cwd) or os.path.abspath(cwd or os.getcwd())
+    digest = hashlib.sha256(root.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(HUNK_STORE_DIR, f"{digest}.json")
+
+
+def rules_hash(rules_text: str) -> str:
+    return hashlib.sha256(rules_text.encode('utf-8')).hexdigest()
+
+
+def hunk_key(file_diff: FileDiff, hunk: Optional[Hunk], rules_digest: str, model: str) -> str:
+    """
+    Key of a hunk review. The hunk header is left out and trailing whitespace is stripped,
+    so a hunk that only moved because of edits above it keeps its key.
+    """
+    body = hunk.lines if hunk is not None else file_diff.header_lines
+    normalized = '\n'.join(line.rstrip() for line in body)
+    payload = json.dumps([file_diff.path, normalized, rules_digest, model])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def shift_line_numbers(issues: List[Dict[str, str]], delta: int) -> List[Dict[str, str]]:
+    """
+    Move the line numbers reported in stored issues by `delta` lines.
+    """
+    if delta == 0:
+        return issues
+    shifted = []
+    for issue in issues:
+        issue = dict(issue)
+        if 'Line Number(s)' in issue:
+            issue['Line Number(s)'] = re.sub(r'\d+', lambda m: str(max(1, int(m.group(0)) + delta)),
+                                             issue['Line Number(s)'])
+        shifted.append(issue)
+    return shifted
+
+
+class HunkReviewStore:
+    """
+    Review results per hunk, persisted as a JSON file between runs of review.py. By default
+    the file of the current repository under HUNK_STORE_DIR is used.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        path = path or default_hunk_store_path()
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Warning: ignoring hunk review store {path}: {e}")
+
+    def get(self, key: str, new_start: int) -> Optional[List[Dict[str, str]]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry['used_at'] = time.time()
+        return shift_line_numbers(entry['issues'], new_start - entry['new_start'])
+
+    def set(self, key: str, new_start: int, issues: List[Dict[str, str]]) -> None:
+        self.entries[key] = {"new_start": new_start, "issues": issues, "used_at": time.time()}
+
+    def save(self) -> None:
+        """
+        Write the store, keeping only the `max_entries` most recently used hunks.
+        """
+        if len(self.entries) > self.max_entries:
+            recent = sorted(self.entries.items(), key=lambda item: item[1]['used_at'], reverse=True)
+            self.entries = dict(recent[:self.max_entries])
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: could not write hunk review store: {e}")
+
+    def stats(self) -> str:
+        return f"Hunk review store: {self.hits} unchanged hunks reused, {self.misses} hunks reviewed"
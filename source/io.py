@@ -1,5 +1,38 @@
+import glob
 import json
+import os
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+# Markdown files read ahead of the extraction pipeline
+DEFAULT_READ_WORKERS = 8
+
+def load_rule_records(file_path):
+    """
+    Load the rule objects from a JSON rules file.
+
+    Every rule has an "id" and a "description". Rules may also set "always": true to be
+    included in every review prompt, regardless of relevance filtering, or "check" to name a
+    local check that enforces them instead of the LLM (see source.local_checks), with optional
+    "check_options"; the LLM still reviews such a rule on files the check does not read, and
+    everywhere with "review": true. "paths" (globs such as "frontend/**") and "languages" (such as ["python"])
+    restrict a rule to the files they match (see source.rule_scope).
+    """
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+            return data.get('rules', [])
+    except Exception as e:
+        print(f"Error loading rules from JSON: {e}")
+        sys.exit(1)
+
+def format_rules_text(rules_list):
+    """
+    Render rule objects as the numbered list used in review prompts.
+    """
+    return '\n'.join(f"{rule['id']}. {rule['description']}" for rule in rules_list)
 
 def load_rules_from_json(file_path):
     """
@@ -15,7 +48,7 @@ def load_rules_from_json(file_path):
         with open(file_path, 'r') as f:
             data = json.load(f)
             rules_list = data.get('rules', [])
-            rules_text = '\n'.join(f"{rule['id']}. {rule['description']}" for rule in rules_list)
+            rules_text = format_rules_text(rules_list)
             return rules_text
     except Exception as e:
         print(f"Error loading rules from JSON: {e}")
@@ -32,6 +65,41 @@ def load_markdown(file_path):
         print(f"Error reading Markdown file: {e}")
         sys.exit(1)
 
+def find_markdown_files(inputs):
+    """
+    Expand files, directories and glob patterns into a list of Markdown files, in a stable
+    order and without duplicates. Directories are searched recursively, skipping hidden ones.
+    """
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(MARKDOWN_EXTENSIONS))
+        elif glob.has_magic(pattern):
+            paths.extend(sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(os.path.normpath(path) for path in paths))
+
+def iter_markdown_documents(paths, workers=DEFAULT_READ_WORKERS):
+    """
+    Read Markdown files on `workers` threads and yield (path, content) pairs in the order of
+    `paths`. Only `workers` files are read ahead of the consumer, so documents are not all
+    held in memory at once.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(load_markdown, path)))
+            if len(pending) >= max(1, workers):
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
 
 def save_rules_to_json(rules, output_path):
     """
@@ -44,3 +112,34 @@ def save_rules_to_json(rules, output_path):
     except Exception as e:
         print(f"Error writing to JSON file: {e}")
         sys.exit(1)
+
+
+def load_manifest(manifest_path):
+    """
+    Load the section manifest written by a previous rule generation run.
+    Returns an empty manifest if the file does not exist or cannot be parsed.
+    """
+    empty = {"version": 1, "sections": {}, "rule_ids": {}}
+    if not os.path.exists(manifest_path):
+        return empty
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != 1:
+            raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+        return manifest
+    except Exception as e:
+        print(f"Warning: ignoring manifest {manifest_path}: {e}")
+        return empty
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Save the section manifest next to the rules output.
+    """
+    try:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+    except Exception as e:
+        print(f"Error writing manifest file: {e}")
+        sys.exit(1)
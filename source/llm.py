@@ -0,0 +1,278 @@
+import os
+import threading
+from typing import Dict, Iterator, List, Optional
+from source.cache import get_cache
+from source.profiling import span, annotate, estimate_cost
+from source.rate_limit import RetryableError, get_scheduler
+from source.token_utils import estimate_tokens
+
+# Model used for each kind of request, overridable with configure_llm or PR_HELPER_MODEL. The
+# defaults accept schema-constrained output, see source.structured_output
+DEFAULT_MODELS = {
+    "extract": "gpt-4o",
+    "curate": "gpt-4o",
+    "review": "gpt-4o",
+}
+DEFAULT_POOL_SIZE = int(os.getenv("PR_HELPER_POOL_SIZE", "16"))
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("PR_HELPER_TIMEOUT", "120"))
+
+
+class LLMError(Exception):
+    """
+    A request to the model failed or returned an unusable response.
+    """
+
+
+class TransientLLMError(LLMError, RetryableError):
+    """
+    A failed request that may succeed when retried: rate limits, 5xx responses and timeouts.
+    """
+
+
+def _retry_after(response) -> Optional[float]:
+    """
+    Delay in seconds requested by the Retry-After(-Ms) headers of a response, if any.
+    """
+    from email.utils import parsedate_to_datetime
+    from datetime import datetime, timezone
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMBackend:
+    """
+    Interface of a chat completion backend.
+    """
+    name = "base"
+
+    def complete(self, model: str, messages: List[Dict[str, str]], **params) -> Optional[str]:
+        raise NotImplementedError
+
+    def stream(self, model: str, messages: List[Dict[str, str]], **params) -> Iterator[str]:
+        """
+        Yield the completion in pieces as it is generated. Backends without streaming yield it whole.
+        """
+        content = self.complete(model, messages, **params)
+        if content:
+            yield content
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI chat completions over one pooled keep-alive HTTP client shared by all threads.
+    """
+    name = "openai"
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import openai
+                try:
+                    import httpx
+                except ImportError:
+                    # Without httpx the client keeps the library's default connection pool
+                    self._client = openai.OpenAI(timeout=self.timeout, max_retries=0)
+                else:
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                        timeout=self.timeout,
+                    )
+                    # Retries are left to the shared scheduler, which also adapts concurrency
+                    self._client = openai.OpenAI(http_client=http_client, timeout=self.timeout, max_retries=0)
+            return self._client
+
+    @staticmethod
+    def _translate_error(error) -> LLMError:
+        import openai
+        if isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) != 'insufficient_quota':
+            return TransientLLMError(str(error), throttled=True, retry_after=_retry_after(error.response))
+        if isinstance(error, openai.APIStatusError) and (error.status_code >= 500 or error.status_code in (408, 409)):
+            return TransientLLMError(str(error), retry_after=_retry_after(error.response))
+        if isinstance(error, openai.APIConnectionError):
+            return TransientLLMError(str(error))
+        return LLMError(str(error))
+
+    def complete(self, model: str, messages: List[Dict[str, str]], **params) -> Optional[str]:
+        import openai
+        try:
+            response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        except openai.OpenAIError as e:
+            raise self._translate_error(e) from e
+        if response.usage is not None:
+            annotate(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    def stream(self, model: str, messages: List[Dict[str, str]], **params) -> Iterator[str]:
+        import openai
+        try:
+            response = self.client.chat.completions.create(model=model, messages=messages, stream=True,
+                                                           stream_options={"include_usage": True}, **params)
+        except openai.OpenAIError as e:
+            raise self._translate_error(e) from e
+        try:
+            for chunk in response:
+                if getattr(chunk, 'usage', None) is not None:
+                    annotate(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise self._translate_error(e) from e
+        finally:
+            response.close()
+
+
+def create_backend(name: str, **options) -> LLMBackend:
+    """
+    Create a backend by name: "openai", or "fake" for the offline deterministic backend.
+    """
+    if name == "openai":
+        return OpenAIBackend(**options)
+    if name == "fake":
+        from source.fake_llm import FakeBackend
+        return FakeBackend(**options)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def _resolve_models(model: Optional[str]) -> Dict[str, str]:
+    model = model or os.getenv("PR_HELPER_MODEL")
+    return {kind: model or default for kind, default in DEFAULT_MODELS.items()}
+
+
+_backend: Optional[LLMBackend] = None
+_models = _resolve_models(None)
+_config_lock = threading.Lock()
+
+
+def configure_llm(backend: Optional[str] = None, model: Optional[str] = None, **options) -> LLMBackend:
+    """
+    Select the process-wide backend and model. `model` replaces the model of every request kind.
+    Without arguments the PR_HELPER_BACKEND and PR_HELPER_MODEL environment variables are used.
+    """
+    global _backend, _models
+    backend = backend or os.getenv("PR_HELPER_BACKEND", "openai")
+    with _config_lock:
+        _backend = create_backend(backend, **options)
+        _models = _resolve_models(model)
+        return _backend
+
+
+def get_backend() -> LLMBackend:
+    global _backend
+    with _config_lock:
+        if _backend is None:
+            _backend = create_backend(os.getenv("PR_HELPER_BACKEND", "openai"))
+        return _backend
+
+
+def get_model(kind: str) -> str:
+    """
+    Model configured for a kind of request: "extract", "curate" or "review".
+    """
+    return _models[kind]
+
+
+def _record_cost(record: Optional[Dict], model: str) -> None:
+    """
+    Mark a profiled request as a cache miss and add its estimated cost.
+    """
+    if record is None:
+        return
+    record["cache_hit"] = 0
+    cost = estimate_cost(model, record.get("prompt_tokens", 0), record.get("completion_tokens", 0))
+    if cost is not None:
+        record["cost_usd"] = cost
+
+
+def _estimate_request_tokens(messages: List[Dict[str, str]], params: Dict) -> int:
+    """
+    Tokens a request is expected to use, for the tokens-per-minute limit.
+    """
+    return sum(estimate_tokens(message["content"]) for message in messages) + params.get("max_tokens", 0)
+
+
+def chat_completion(model: str, messages: List[Dict[str, str]], cache_response: bool = True,
+                    **params) -> Optional[str]:
+    """
+    Send a chat completion request to the configured backend and return the message content.
+
+    Identical requests are answered from the completion cache when it is enabled. Requests go
+    through the shared scheduler, which rate limits them and retries transient failures.
+    With `cache_response` False a new completion is not cached, so that the caller can cache
+    it with cache_completion once it has checked it.
+    """
+    with span("llm_call", model=model) as record:
+        cache = get_cache()
+        key = None
+        if cache is not None:
+            key = cache.make_key(model, messages, params)
+            cached = cache.get(key)
+            if cached is not None:
+                annotate(cache_hit=1)
+                return cached
+
+        backend = get_backend()
+        content = get_scheduler().call(lambda: backend.complete(model, messages, **params),
+                                       tokens=_estimate_request_tokens(messages, params))
+        _record_cost(record, model)
+
+        if cache is not None and content is not None and cache_response:
+            cache.set(key, content)
+        return content
+
+
+def cache_completion(model: str, messages: List[Dict[str, str]], content: str, **params) -> None:
+    """
+    Store the completion of a request made with `cache_response=False` in the completion cache,
+    if it is enabled.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.set(cache.make_key(model, messages, params), content)
+
+
+def stream_chat_completion(model: str, messages: List[Dict[str, str]], **params) -> Iterator[str]:
+    """
+    Stream a chat completion from the configured backend, yielding text as it arrives.
+
+    A cached completion is yielded in one piece. A streamed completion is only cached if the
+    caller consumed it to the end.
+    """
+    with span("llm_stream", model=model) as record:
+        cache = get_cache()
+        key = None
+        if cache is not None:
+            key = cache.make_key(model, messages, params)
+            cached = cache.get(key)
+            if cached is not None:
+                annotate(cache_hit=1)
+                yield cached
+                return
+
+        pieces = []
+        backend = get_backend()
+        for piece in get_scheduler().stream(lambda: backend.stream(model, messages, **params),
+                                            tokens=_estimate_request_tokens(messages, params)):
+            pieces.append(piece)
+            yield piece
+        _record_cost(record, model)
+
+        if cache is not None and pieces:
+            cache.set(key, ''.join(pieces))
@@ -0,0 +1,331 @@
+import ast
+import io
+import tokenize
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from source.diff_utils import FileDiff
+from source.rule_scope import LANGUAGE_EXTENSIONS, RuleScope
+
+# Files the local checks read; on other files, rules with a check are left to the LLM review
+CHECKED_LANGUAGE = "python"
+CHECKED_EXTENSIONS = LANGUAGE_EXTENSIONS[CHECKED_LANGUAGE]
+
+# Longest line allowed by the "pep8" check unless the rule sets "check_options": {"max_line_length": N}
+DEFAULT_MAX_LINE_LENGTH = 79
+
+# Statements whose body is flagged when it starts on the same line as the statement (E701)
+_COMPOUND_STATEMENTS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith,
+                        ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class Finding:
+    path: str
+    line: int
+    code: str
+    message: str
+    suggestion: str
+
+
+# Check name, as used in the "check" field of a rule, to the function enforcing it
+CHECKS: Dict[str, Callable[..., List[Finding]]] = {}
+
+
+def register_check(name: str):
+    """
+    Register a function as the local check of rules with `"check": name`. It is called with a
+    PythonFile and the rule's "check_options" and returns the findings on added lines.
+    """
+    def decorator(function):
+        CHECKS[name] = function
+        return function
+    return decorator
+
+
+def is_local_rule(rule: Dict) -> bool:
+    """
+    Whether a rule is enforced by a local check instead of the LLM review.
+    """
+    return rule.get('check') in CHECKS
+
+
+def llm_rule(rule: Dict) -> Optional[Dict]:
+    """
+    The part of a rule that is left to the LLM review. Rules without a local check are reviewed
+    as they are, and so are rules with `"review": true`, whose check only covers part of them.
+    Otherwise the rule is reviewed only on the files its check does not read, and not at all
+    when its "languages" are all checked locally.
+    """
+    if not is_local_rule(rule) or rule.get('review'):
+        return rule
+    languages = rule.get('languages') or []
+    if isinstance(languages, str):
+        languages = [languages]
+    if languages and all(language.lower() == CHECKED_LANGUAGE for language in languages):
+        return None
+    excludes = rule.get('exclude_paths') or []
+    if isinstance(excludes, str):
+        excludes = [excludes]
+    return dict(rule, exclude_paths=list(excludes) + [f"*{extension}" for extension in CHECKED_EXTENSIONS])
+
+
+def added_lines(file_diff: FileDiff) -> Dict[int, str]:
+    """
+    Lines added by a file diff, by line number in the new file.
+    """
+    added = {}
+    for hunk in file_diff.hunks:
+        line_number = hunk.new_start()
+        for line in hunk.lines:
+            if line.startswith('+'):
+                added[line_number] = line[1:]
+                line_number += 1
+            elif line.startswith(' ') or line == '':
+                line_number += 1
+    return added
+
+
+def _new_side_blocks(file_diff: FileDiff) -> List[Tuple[int, str]]:
+    """
+    (first line number, text) of the new-file side of each hunk.
+    """
+    blocks = []
+    for hunk in file_diff.hunks:
+        lines = [line[1:] for line in hunk.lines if line.startswith(('+', ' ')) or line == '']
+        blocks.append((hunk.new_start(), '\n'.join(lines) + '\n'))
+    return blocks
+
+
+class PythonFile:
+    """
+    A Python file in a diff: its added lines and, when the full new source is available and
+    agrees with the diff, the source itself. Without the source, token-based checks fall back
+    to the hunks and checks that need the whole module are skipped.
+    """
+
+    def __init__(self, path: str, added: Dict[int, str], source: Optional[str] = None, blocks=()):
+        self.path = path
+        self.added = added
+        if source is not None:
+            lines = source.splitlines()
+            if any(number > len(lines) or lines[number - 1] != text for number, text in added.items()):
+                source = None  # The file changed after the diff was taken
+        self.source = source
+        # Rows starting a statement or holding only a comment, rows with a `;` between
+        # statements, and every row whose tokens could be read
+        self.statement_rows: Set[int] = set()
+        self.semicolon_rows: Set[int] = set()
+        self.tokenized_rows: Set[int] = set()
+        for first_line, text in ([(1, source)] if source is not None else blocks):
+            self._scan(first_line, text)
+        self._tree = None
+
+    def _scan(self, first_line: int, text: str) -> None:
+        statement_rows, semicolon_rows, covered = set(), set(), set()
+        in_statement = False
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(text).readline):
+                row = token.start[0] + first_line - 1
+                if token.type in (tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+                    in_statement = in_statement and token.type != tokenize.NEWLINE
+                    continue
+                if not in_statement and row not in covered:
+                    statement_rows.add(row)
+                if token.type != tokenize.COMMENT:
+                    in_statement = True
+                if token.type == tokenize.OP and token.string == ';':
+                    semicolon_rows.add(row)
+                    in_statement = False
+                # Rows inside a multi-line string only continue the token
+                covered.update(range(row + 1, token.end[0] + first_line))
+        except (tokenize.TokenError, SyntaxError):
+            return  # A hunk starting or ending mid-statement; its rows get the line-based checks only
+        self.statement_rows |= statement_rows
+        self.semicolon_rows |= semicolon_rows
+        self.tokenized_rows.update(range(first_line, first_line + text.count('\n') + 1))
+
+    @property
+    def tree(self) -> Optional[ast.Module]:
+        """
+        The parsed module, or None without the full source or when it does not parse.
+        """
+        if self._tree is None and self.source is not None:
+            try:
+                self._tree = ast.parse(self.source)
+            except (SyntaxError, ValueError):
+                self.source = None
+        return self._tree
+
+    def finding(self, line: int, code: str, message: str, suggestion: str) -> Finding:
+        return Finding(self.path, line, code, message, suggestion)
+
+
+@register_check('indentation')
+def check_indentation(python_file: PythonFile) -> List[Finding]:
+    """
+    Statements on added lines must be indented with spaces, in multiples of four. Continuation
+    lines are free to align with an opening bracket.
+    """
+    findings = []
+    for number, text in sorted(python_file.added.items()):
+        if not text.strip():
+            continue
+        if number in python_file.tokenized_rows and number not in python_file.statement_rows:
+            continue
+        indent = text[:len(text) - len(text.lstrip(' \t'))]
+        if '\t' in indent:
+            findings.append(python_file.finding(number, 'W191', "Indentation contains tabs",
+                                                "Indent with 4 spaces per level instead of tabs."))
+        elif len(indent) % 4 and number in python_file.tokenized_rows:
+            findings.append(python_file.finding(number, 'E111', "Indentation is not a multiple of 4 spaces",
+                                                "Indent with 4 spaces per level."))
+    return findings
+
+
+@register_check('pep8')
+def check_pep8(python_file: PythonFile, max_line_length: int = DEFAULT_MAX_LINE_LENGTH) -> List[Finding]:
+    """
+    Mechanical PEP 8 checks on added lines: line length, trailing whitespace, statements sharing
+    a line, comparisons to None/True/False with ==, and bare except clauses.
+    """
+    findings = []
+    for number, text in sorted(python_file.added.items()):
+        if len(text) > max_line_length:
+            findings.append(python_file.finding(number, 'E501', f"Line longer than {max_line_length} characters",
+                                                "Wrap the line, e.g. inside parentheses."))
+        if text != text.rstrip():
+            findings.append(python_file.finding(number, 'W291', "Trailing whitespace",
+                                                "Remove the whitespace at the end of the line."))
+        if number in python_file.semicolon_rows:
+            findings.append(python_file.finding(number, 'E702', "Multiple statements on one line (semicolon)",
+                                                "Put each statement on its own line."))
+
+    tree = python_file.tree
+    if tree is None:
+        return findings
+    for node in ast.walk(tree):
+        line = getattr(node, 'lineno', None)
+        if line not in python_file.added:
+            continue
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            for index, operator in enumerate(node.ops):
+                if not isinstance(operator, (ast.Eq, ast.NotEq)):
+                    continue
+                constants = [operand.value for operand in operands[index:index + 2] if isinstance(operand, ast.Constant)]
+                if any(value is None for value in constants):
+                    findings.append(python_file.finding(line, 'E711', "Comparison to None with == or !=",
+                                                        "Use `is None` or `is not None`."))
+                elif any(value is True or value is False for value in constants):
+                    findings.append(python_file.finding(line, 'E712', "Comparison to True or False with == or !=",
+                                                        "Test the value directly, e.g. `if flag:` or `if not flag:`."))
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            findings.append(python_file.finding(line, 'E722', "Bare except clause",
+                                                "Catch specific exceptions, or `Exception` if everything must be handled."))
+        elif isinstance(node, _COMPOUND_STATEMENTS) and node.body and node.body[0].lineno == line:
+            findings.append(python_file.finding(line, 'E701', "Multiple statements on one line (colon)",
+                                                "Put the body on its own indented line."))
+    return findings
+
+
+def _annotation_names(annotation: Optional[ast.AST]) -> Iterable[str]:
+    """
+    Names used by a string annotation such as `"Optional[Path]"`.
+    """
+    if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+        try:
+            expression = ast.parse(annotation.value, mode='eval')
+        except SyntaxError:
+            return
+        for node in ast.walk(expression):
+            if isinstance(node, ast.Name):
+                yield node.id
+
+
+def _used_names(tree: ast.Module) -> Set[str]:
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, (ast.arg, ast.AnnAssign)):
+            used.update(_annotation_names(node.annotation))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            used.update(_annotation_names(node.returns))
+        elif isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == '__all__'
+                                                  for target in node.targets):
+            if isinstance(node.value, (ast.List, ast.Tuple)):
+                used.update(element.value for element in node.value.elts
+                            if isinstance(element, ast.Constant) and isinstance(element.value, str))
+    return used
+
+
+@register_check('unused_imports')
+def check_unused_imports(python_file: PythonFile) -> List[Finding]:
+    """
+    Imports on added lines whose name is never used in the module. Needs the full source;
+    package `__init__.py` files, which import to re-export, are skipped.
+    """
+    tree = python_file.tree
+    if tree is None or python_file.path.rsplit('/', 1)[-1] == '__init__.py':
+        return []
+    used = _used_names(tree)
+    findings = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Import, ast.ImportFrom)) or node.lineno not in python_file.added:
+            continue
+        if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+            continue
+        for alias in node.names:
+            if alias.name == '*' or alias.asname == alias.name:
+                continue  # `import x as x` marks an explicit re-export
+            bound = alias.asname or (alias.name.split('.')[0] if isinstance(node, ast.Import) else alias.name)
+            if bound not in used:
+                findings.append(python_file.finding(node.lineno, 'F401', f"'{alias.name}' imported but unused",
+                                                    "Remove the import, or list the name in `__all__` if it is re-exported."))
+    return findings
+
+
+def _issues_from_findings(rule: Dict, findings: List[Finding]) -> List[Dict]:
+    """
+    Issues in the review format, one per file and kind of finding with all its line numbers.
+    """
+    grouped: Dict[Tuple[str, str, str], List[Finding]] = {}
+    for finding in findings:
+        grouped.setdefault((finding.path, finding.code, finding.message), []).append(finding)
+    return [{
+        "Rule Violated": f"{rule['id']}. {rule['description']}",
+        "Line Number(s)": ', '.join(str(line) for line in sorted({finding.line for finding in group})),
+        "Issue Description": f"{path}: {message} ({code})",
+        "Suggestion": group[0].suggestion,
+    } for (path, code, message), group in grouped.items()]
+
+
+def run_local_checks(file_diffs: Iterable[FileDiff], rules: List[Dict],
+                     read_source: Optional[Callable[[str], Optional[str]]] = None) -> List[Dict]:
+    """
+    Run the local checks of `rules` over the lines added to Python files and return the issues
+    in the same format as the LLM review.
+
+    `read_source(path)` returns the full new content of a file, or None when it is not
+    available; checks that need the whole module, such as unused imports, are skipped then.
+    Rules with "paths" or "languages" only check the files they apply to.
+    """
+    local_rules = [rule for rule in rules if is_local_rule(rule)]
+    if not local_rules:
+        return []
+    scope = RuleScope(local_rules)
+    issues = []
+    for file_diff in file_diffs:
+        if file_diff.binary or not file_diff.path.endswith(CHECKED_EXTENSIONS):
+            continue
+        added = added_lines(file_diff)
+        if not added:
+            continue
+        source = read_source(file_diff.path) if read_source is not None else None
+        python_file = PythonFile(file_diff.path, added, source, _new_side_blocks(file_diff))
+        for rule, applies in zip(local_rules, scope.mask([file_diff.path])):
+            if not applies:
+                continue
+            findings = CHECKS[rule['check']](python_file, **rule.get('check_options', {}))
+            issues.extend(_issues_from_findings(rule, findings))
+    return issues
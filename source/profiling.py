@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# USD per million (prompt, completion) tokens, used to estimate the cost of a run
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+}
+
+# Numeric span attributes that are summed per stage in the summary
+SUMMED_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "retries", "cache_hit", "cost_usd")
+
+
+class _NullSpan:
+    """
+    Shared no-op span returned while profiling is disabled.
+    """
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects timed spans for the stages of a run. While disabled, `span` and `annotate` do no work.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: Dict):
+        stack = self._local.__dict__.setdefault('stack', [])
+        record = {"name": name, "thread": threading.current_thread().name, **attributes}
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["start"] = round(start - self._origin, 6)
+            record["duration"] = round(time.perf_counter() - start, 6)
+            stack.pop()
+            with self._lock:
+                self.spans.append(record)
+
+    def annotate(self, **attributes) -> None:
+        """
+        Add attributes to the innermost open span of the current thread.
+        """
+        if not self.enabled:
+            return
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1].update(attributes)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count, total and maximum duration and summed token/cost attributes per span name.
+        """
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            stage = stages.setdefault(record["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stage["count"] += 1
+            stage["total_seconds"] += record["duration"]
+            stage["max_seconds"] = max(stage["max_seconds"], record["duration"])
+            for attribute in SUMMED_ATTRIBUTES:
+                if attribute in record:
+                    stage[attribute] = stage.get(attribute, 0) + record[attribute]
+        return stages
+
+    def summary_table(self) -> str:
+        lines = [f"{'Stage':<22}{'Count':>7}{'Total s':>10}{'Max s':>9}{'Prompt tok':>12}{'Compl tok':>11}{'Cache hits':>12}{'Cost $':>9}"]
+        for name, stage in sorted(self.summary().items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append(
+                f"{name:<22}{stage['count']:>7}{stage['total_seconds']:>10.3f}{stage['max_seconds']:>9.3f}"
+                f"{stage.get('prompt_tokens', ''):>12}{stage.get('completion_tokens', ''):>11}"
+                f"{stage.get('cache_hit', ''):>12}{format(stage['cost_usd'], '.4f') if 'cost_usd' in stage else '':>9}"
+            )
+        return '\n'.join(lines)
+
+    def write_json(self, path: str) -> None:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record["start"])
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"spans": spans, "summary": self.summary()}, f, indent=4)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """
+    Time a stage of the run: `with span("git_diff"): ...`. Free when profiling is disabled.
+    """
+    return _tracer.span(name, **attributes)
+
+
+def annotate(**attributes) -> None:
+    _tracer.annotate(**attributes)
+
+
+def enable_profiling() -> Tracer:
+    _tracer.enable()
+    return _tracer
+
+
+def report_profile(output_path: Optional[str] = None) -> None:
+    """
+    Print the per-stage summary and optionally write the full JSON trace. Does nothing while
+    profiling is disabled.
+    """
+    if not _tracer.enabled:
+        return
+    print()
+    print(_tracer.summary_table())
+    if output_path:
+        _tracer.write_json(output_path)
+        print(f"Profile trace written to {output_path}")
@@ -0,0 +1,255 @@
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterator, Optional, TypeVar
+from source.profiling import annotate
+
+T = TypeVar('T')
+
+# Limits shared by every LLM request of the process; None means unlimited
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("PR_HELPER_RPM", "0")) or None
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("PR_HELPER_TPM", "0")) or None
+# Upper bound of requests in flight; matches the size of the HTTP connection pool
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("PR_HELPER_POOL_SIZE", "16"))
+DEFAULT_MAX_RETRIES = int(os.getenv("PR_HELPER_MAX_RETRIES", "5"))
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 60.0
+
+
+class RetryableError(Exception):
+    """
+    A failure worth retrying, such as a rate limit, a 5xx response or a dropped connection.
+
+    `throttled` marks rate limit responses, which also lower the allowed concurrency.
+    `retry_after` is the delay in seconds the server asked for, if any.
+    """
+
+    def __init__(self, message: str, throttled: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute and holding at most `capacity`
+    (one minute's worth by default). `acquire` blocks until enough tokens are available.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Take `amount` tokens, waiting for the bucket to refill if needed. Requests larger than
+        the capacity take the whole bucket. Returns the time spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that adapts to throttling: halved when a request is rate limited and
+    raised by one after a full window of successful requests (additive increase,
+    multiplicative decrease).
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = self.maximum
+        self.in_flight = 0
+        self._successes = 0
+        self._clock = clock
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """
+        Wait for a free slot and return the time the request started.
+        """
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            return self._clock()
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify()
+
+    def on_throttle(self, started: float) -> None:
+        """
+        Halve the limit. Requests that were already in flight when the limit last went down
+        do not lower it again, so one burst of rate limit errors counts once.
+        """
+        with self._condition:
+            if started < self._last_decrease:
+                return
+            self.limit = max(self.minimum, self.limit // 2)
+            self._successes = 0
+            self._last_decrease = self._clock()
+
+
+class Scheduler:
+    """
+    Runs LLM requests under a shared rate limit and concurrency limit, retrying RetryableError
+    with exponential backoff and full jitter, or after the delay the server asked for.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY_SECONDS, max_delay: float = DEFAULT_MAX_DELAY_SECONDS,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.requests = TokenBucket(requests_per_minute, clock=clock, sleep=sleep) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock, sleep=sleep) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency, clock=clock)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_for_capacity(self, tokens: int) -> None:
+        # A Retry-After from the server holds back every request, not just the one that got it
+        with self._lock:
+            pause = self._paused_until - self._clock()
+        if pause > 0:
+            self._sleep(pause)
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            self.tokens.acquire(tokens)
+
+    def _backoff(self, error: RetryableError, attempt: int, started: float) -> None:
+        """
+        Record a failed attempt and sleep before the next one.
+        """
+        with self._lock:
+            self.retries += 1
+            if error.throttled:
+                self.throttled += 1
+        annotate(retries=attempt + 1)
+        if error.throttled:
+            self.concurrency.on_throttle(started)
+        if error.retry_after is not None:
+            delay = min(error.retry_after, self.max_delay)
+            with self._lock:
+                self._paused_until = max(self._paused_until, self._clock() + delay)
+        else:
+            delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        self._sleep(delay)
+
+    def call(self, fn: Callable[[], T], tokens: int = 0) -> T:
+        """
+        Run `fn` once capacity allows, retrying it on RetryableError up to `max_retries` times.
+        `tokens` is the estimated token count of the request for the tokens-per-minute limit.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.concurrency.acquire()
+            try:
+                self._wait_for_capacity(tokens)
+                result = fn()
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+            self._backoff(error, attempt, started)
+
+    def stream(self, fn: Callable[[], Iterator[T]], tokens: int = 0) -> Iterator[T]:
+        """
+        Like `call` for a streamed response. The slot is held until the stream ends; a failure
+        is only retried before the first piece has been yielded.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.concurrency.acquire()
+            yielded = False
+            try:
+                self._wait_for_capacity(tokens)
+                for piece in fn():
+                    yielded = True
+                    yield piece
+            except RetryableError as e:
+                if yielded or attempt == self.max_retries:
+                    raise
+                error = e
+            else:
+                self.concurrency.on_success()
+                return
+            finally:
+                self.concurrency.release()
+            self._backoff(error, attempt, started)
+
+    def stats(self) -> str:
+        return (f"LLM scheduler: {self.retries} retries, {self.throttled} rate limited, "
+                f"concurrency limit {self.concurrency.limit}/{self.concurrency.maximum}")
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def configure_scheduler(**options) -> Scheduler:
+    """
+    Replace the process-wide scheduler. Options are passed to Scheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = Scheduler(**options)
+        return _scheduler
+
+
+def get_scheduler() -> Scheduler:
+    """
+    The process-wide scheduler, created from the PR_HELPER_RPM, PR_HELPER_TPM,
+    PR_HELPER_POOL_SIZE and PR_HELPER_MAX_RETRIES environment variables on first use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from source.cache import DEFAULT_RESULT_STORE_PATH
+# Bump when the schema changes; older stores are rebuilt
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE reviews (
+    id INTEGER PRIMARY KEY,
+    ref TEXT NOT NULL,
+    commit_sha TEXT,
+    base_sha TEXT,
+    diff_hash TEXT,
+    settings TEXT NOT NULL,
+    author TEXT,
+    status TEXT NOT NULL,
+    files TEXT NOT NULL,
+    truncated_files TEXT NOT NULL,
+    reviewed_at REAL NOT NULL
+);
+CREATE TABLE issues (
+    review_id INTEGER NOT NULL REFERENCES reviews(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    rule_id TEXT,
+    path TEXT,
+    issue TEXT NOT NULL
+);
+CREATE INDEX reviews_commit ON reviews(commit_sha, base_sha, settings);
+CREATE INDEX reviews_diff ON reviews(diff_hash, settings);
+CREATE INDEX reviews_author ON reviews(author);
+CREATE INDEX issues_review ON issues(review_id);
+CREATE INDEX issues_rule ON issues(rule_id);
+CREATE INDEX issues_path ON issues(path);
+"""
+
+# Columns that query_counts can group by
+GROUPS = {
+    "rule": "issues.rule_id",
+    "path": "issues.path",
+    "author": "reviews.author",
+    "commit": "reviews.commit_sha",
+}
+
+
+def settings_key(**settings) -> str:
+    """
+    Key of everything besides the diff that decides a review's result: rules digest, model,
+    and options such as the context radius. Reviews are only reused under the same key.
+    """
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def diff_hash(diff_text: str) -> str:
+    return hashlib.sha256(diff_text.encode('utf-8')).hexdigest()
+
+
+def issue_rule_id(issue: Dict[str, str]) -> Optional[str]:
+    """
+    Id of the rule an issue reports, e.g. "R2" for "R2. Indent with 4 spaces.". Ids contain a
+    digit, so a rule quoted without its id gives None.
+    """
+    match = re.match(r'\s*(?:rule\s+)?([\w-]+)', issue.get("Rule Violated", ''), re.IGNORECASE)
+    if match and any(character.isdigit() for character in match.group(1)):
+        return match.group(1)
+    return None
+
+
+def issue_path(issue: Dict[str, str], paths: List[str]) -> Optional[str]:
+    """
+    File an issue is about: the path that starts its description, as in local-check issues,
+    the only file of the diff, or the first file of the diff that the issue mentions.
+    """
+    description = issue.get("Issue Description", '')
+    for path in paths:
+        if description.startswith(f"{path}: "):
+            return path
+    if len(paths) == 1:
+        return paths[0]
+    text = f"{description} {issue.get('Suggestion', '')}"
+    for path in paths:
+        if path in text:
+            return path
+    return None
+
+
+class ReviewResultStore:
+    """
+    Review results kept in an SQLite database, so that issues can be queried per rule, file,
+    author and commit after the run, and a commit or diff reviewed before with the same
+    settings is not reviewed again.
+
+    Reviews are buffered by `add` and written by `save` in one transaction. The store may be
+    shared by threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESULT_STORE_PATH):
+        self.path = path
+        self.hits = 0
+        self.pending: List[tuple] = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self._connection:
+                self._connection.execute("DROP TABLE IF EXISTS issues")
+                self._connection.execute("DROP TABLE IF EXISTS reviews")
+                self._connection.executescript(_SCHEMA)
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.save()
+        self._connection.close()
+
+    def find(self, settings: str, commit: Optional[str] = None, base: Optional[str] = None,
+             diff: Optional[str] = None) -> Optional[Dict]:
+        """
+        The result record of the latest review of a commit diffed against `base`, or of a diff
+        by its hash, under the same settings. None if there is none.
+        """
+        if commit is not None:
+            where, parameters = "commit_sha = ? AND base_sha IS ? AND settings = ?", (commit, base, settings)
+        else:
+            where, parameters = "diff_hash = ? AND settings = ?", (diff, settings)
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT * FROM reviews WHERE {where} ORDER BY reviewed_at DESC, id DESC LIMIT 1", parameters).fetchone()
+            if row is None:
+                return None
+            issues = [json.loads(issue) for (issue,) in self._connection.execute(
+                "SELECT issue FROM issues WHERE review_id = ? ORDER BY position", (row["id"],))]
+            self.hits += 1
+        return {
+            "ref": row["ref"],
+            "status": row["status"],
+            "files": json.loads(row["files"]),
+            "truncated_files": json.loads(row["truncated_files"]),
+            "issues": issues,
+        }
+
+    def add(self, record: Dict, settings: str, commit: Optional[str] = None, base: Optional[str] = None,
+            diff: Optional[str] = None, author: Optional[str] = None) -> None:
+        """
+        Queue the result record of a review, as written by batch reviews, for the next `save`.
+        """
+        with self._lock:
+            self.pending.append((record, settings, commit, base, diff, author, time.time()))
+
+    def save(self) -> None:
+        """
+        Write the queued reviews in one transaction.
+        """
+        with self._lock:
+            if not self.pending:
+                return
+            with self._connection:
+                for record, settings, commit, base, diff, author, reviewed_at in self.pending:
+                    files = record.get("files", [])
+                    cursor = self._connection.execute(
+                        "INSERT INTO reviews (ref, commit_sha, base_sha, diff_hash, settings, author, status, files,"
+                        " truncated_files, reviewed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (record["ref"], commit, base, diff, settings, author, record["status"], json.dumps(files),
+                         json.dumps(record.get("truncated_files", [])), reviewed_at))
+                    self._connection.executemany(
+                        "INSERT INTO issues (review_id, position, rule_id, path, issue) VALUES (?, ?, ?, ?, ?)",
+                        [(cursor.lastrowid, position, issue_rule_id(issue), issue_path(issue, files), json.dumps(issue))
+                         for position, issue in enumerate(record.get("issues", []))])
+            self.pending = []
+
+    def _filters(self, rule: Optional[str], path: Optional[str], author: Optional[str], commit: Optional[str],
+                 ref: Optional[str], since: Optional[float]):
+        clauses, parameters = [], []
+        if rule is not None:
+            clauses.append("issues.rule_id = ?")
+            parameters.append(rule)
+        if path is not None:
+            clauses.append("issues.path GLOB ?")
+            parameters.append(path)
+        if author is not None:
+            clauses.append("reviews.author LIKE ?")
+            parameters.append(f"%{author}%")
+        if commit is not None:
+            clauses.append("reviews.commit_sha LIKE ?")
+            parameters.append(f"{commit}%")
+        if ref is not None:
+            clauses.append("reviews.ref = ?")
+            parameters.append(ref)
+        if since is not None:
+            clauses.append("reviews.reviewed_at >= ?")
+            parameters.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", parameters
+
+    def query_counts(self, group: str, rule: Optional[str] = None, path: Optional[str] = None,
+                     author: Optional[str] = None, commit: Optional[str] = None, ref: Optional[str] = None,
+                     since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Number of issues per rule, path, author or commit (see GROUPS), most first. `path` is a
+        glob, `author` a substring and `commit` a prefix of the commit id.
+        """
+        column = GROUPS[group]
+        where, parameters = self._filters(rule, path, author, commit, ref, since)
+        sql = (f"SELECT {column} AS value, COUNT(*) AS issues, COUNT(DISTINCT reviews.id) AS reviews"
+               f" FROM issues JOIN reviews ON reviews.id = issues.review_id{where}"
+               f" GROUP BY {column} ORDER BY issues DESC, value")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(sql, parameters)]
+
+    def query_issues(self, rule: Optional[str] = None, path: Optional[str] = None, author: Optional[str] = None,
+                     commit: Optional[str] = None, ref: Optional[str] = None, since: Optional[float] = None,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """
+        Stored issues matching the filters of `query_counts`, newest review first, each with
+        the ref, commit, author, path and rule id of its review.
+        """
+        where, parameters = self._filters(rule, path, author, commit, ref, since)
+        sql = ("SELECT reviews.ref, reviews.commit_sha, reviews.author, reviews.reviewed_at, issues.rule_id,"
+               f" issues.path, issues.issue FROM issues JOIN reviews ON reviews.id = issues.review_id{where}"
+               " ORDER BY reviews.reviewed_at DESC, reviews.id DESC, issues.position")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [dict(row, issue=json.loads(row["issue"])) for row in rows]
+
+    def stats(self) -> str:
+        return f"Result store: {self.hits} stored reviews reused"
+
+
+def open_result_store(path: Optional[str]) -> Optional[ReviewResultStore]:
+    """
+    The result store at `path`, or None when `path` is None or the database cannot be opened.
+    """
+    if path is None:
+        return None
+    try:
+        return ReviewResultStore(path)
+    except sqlite3.Error as e:
+        print(f"Warning: not using the result store {path}: {e}")
+        return None
+
+
+def record_from_issues(ref: str, paths: Iterable[str], issues: List[Dict], truncated: Iterable[str] = ()) -> Dict:
+    """
+    Result record of a review, in the format of batch reviews.
+    """
+    if issues and issues[0].get("Message") == "No issues found.":
+        issues = []
+    return {
+        "ref": ref,
+        "status": "issues" if issues else "clean",
+        "files": list(paths),
+        "truncated_files": list(truncated),
+        "issues": issues,
+    }
@@ -1,11 +1,18 @@
-import json
-import sys
-import openai
-import os 
-from openai import OpenAI
+import itertools
 import re
-from source.io import load_rules_from_json
+from concurrent.futures import ThreadPoolExecutor
+from source.io import load_rules_from_json, format_rules_text
+from source.diff_compaction import DEFAULT_CONTEXT_RADIUS, compact_diff
+from source.diff_utils import HUNK_HEADER_RE, diff_paths, pack_diff_shards, parse_diff
+from source.hunk_store import hunk_key, rules_hash
+from source.llm import stream_chat_completion, get_model
+from source.local_checks import run_local_checks
+from source.profiling import span
+from source.structured_output import REVIEW_SCHEMA, complete_structured, parse_review_issues
 
+ISSUE_FIELD_RE = re.compile(r'^(Rule Violated|Line Number\(s\)|Issue Description|Suggestion):\s*(.*)', re.IGNORECASE)
+ISSUE_FIELDS = {'rule violated': 'Rule Violated', 'line number(s)': 'Line Number(s)',
+                'issue description': 'Issue Description', 'suggestion': 'Suggestion'}
 
 def format_response(raw_response):
     issues = []
@@ -15,7 +22,7 @@ def format_response(raw_response):
         if not line:
             continue  # Skip empty lines
         # Use regex to split at the first colon
-        match = re.match(r'^(Rule Violated|Line Number\(s\)|Issue Description|Suggestion):\s*(.*)', line, re.IGNORECASE)
+        match = ISSUE_FIELD_RE.match(line)
         if match:
             key, value = match.groups()
             key = key.lower()
@@ -38,10 +45,24 @@ def format_response(raw_response):
     
     return issues
 
-def check_diff_with_gpt(diff_text, rules):
+def build_review_messages(diff_text, rules, structured=True):
     """
-    Use OpenAI GPT-4 to check the diff against the rules.
+    Chat messages asking the model to review the diff against the rules. With `structured`
+    the model answers with a JSON object of issues, otherwise with plain text issue blocks.
     """
+    if structured:
+        response_instructions = """Respond with a JSON object of the form:
+{"issues": [{"rule": "<Rule description>", "line_numbers": "<Line numbers where the violation occurs>", "description": "<Description of the issue>", "suggestion": "<Suggestion on how to fix it, or an empty string>"}]}
+
+If there are no issues, respond with {"issues": []}."""
+    else:
+        response_instructions = """Structure your response with:
+Rule Violated: <Rule description>
+Line Number(s): <Line numbers where the violation occurs>
+Issue Description: <Description of the issue>
+Suggestion: <Suggestion on how to fix it (optional)>
+
+If there are no issues, respond with 'No issues found.'"""
     prompt = f"""
 You are a code reviewer who ensures code changes adhere to the following guidelines:
 
@@ -49,31 +70,311 @@ You are a code reviewer who ensures code changes adhere to the following guideli
 
 Please review the following git diff and report any violations of the guidelines. Be specific about the issues and reference the relevant line numbers if possible.
 
-Structure your response with:
-Rule Violated: <Rule description>
-Line Number(s): <Line numbers where the violation occurs>
-Issue Description: <Description of the issue>
-Suggestion: <Suggestion on how to fix it (optional)>
+{response_instructions}
 
 Git diff:
 {diff_text}
-
-If there are no issues, respond with 'No issues found.'
 """
-    client = OpenAI()
-
-    response = client.chat.completions.create(
-        model="gpt-4",  
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    # check if there was an error
-    if response.choices[0].message.content is None:
-        print("Error: No response from GPT-4")
-        sys.exit(1)
-    return format_response(response.choices[0].message.content)
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+def check_diff_with_gpt(diff_text, rules):
+    """
+    Use OpenAI GPT-4 to check the diff against the rules.
+
+    The review is requested as schema-constrained JSON. Raises StructuredOutputError if the
+    response cannot be parsed even after a repair request. Without any rule to check, e.g.
+    when no rule applies to the files of the diff, no request is made.
+    """
+    if not rules.strip():
+        return [{"Message": "No issues found."}]
+    with span("build_prompt"):
+        messages = build_review_messages(diff_text, rules)
+    return complete_structured(get_model("review"), messages, "code_review", REVIEW_SCHEMA, parse_review_issues)
+
+def issue_key(issue):
+    """
+    Identity of an issue for deduplication, ignoring case and whitespace.
+    """
+    return tuple(' '.join(issue.get(field, '').lower().split())
+                 for field in ('Rule Violated', 'Line Number(s)', 'Issue Description'))
+
+def merge_issues(issue_lists):
+    """
+    Merge the parsed issues of several reviews into one list, dropping duplicates and "No issues found." markers.
+    """
+    merged = []
+    seen = set()
+    for issues in issue_lists:
+        for issue in issues:
+            if issue.get("Message") == "No issues found.":
+                continue
+            key = issue_key(issue)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(issue)
+
+    if not merged:
+        return [{"Message": "No issues found."}]
+
+    return merged
+
+def select_rules(texts, rules, rule_index=None, top_k=0, rule_scope=None):
+    """
+    Rules text to send with each diff text. With a rule scope, only the rules that apply to
+    the files of a text are kept. With a rule index, only the `top_k` of those most relevant
+    to the text (plus pinned rules) are kept; otherwise every text gets all its rules.
+    """
+    masks = None
+    if rule_scope is not None:
+        with span("select_rules"):
+            masks = [rule_scope.mask(diff_paths(text)) for text in texts]
+    if rule_index is None or top_k <= 0:
+        if masks is None:
+            return [rules] * len(texts)
+        return [format_rules_text([rule for rule, keep in zip(rule_scope.rules, mask) if keep]) for mask in masks]
+    return [format_rules_text(selected) for selected in rule_index.select_batch(texts, top_k, masks)]
+
+def check_diff_locally(diff_text, local_rules, read_source=None):
+    """
+    Issues found by the local checks of `local_rules` (rule objects) on the added lines of the
+    diff, without calling the LLM. See source.local_checks.
+    """
+    if not local_rules:
+        return []
+    with span("local_checks"):
+        return run_local_checks(parse_diff(diff_text), local_rules, read_source)
+
+def compact_review_diff(diff_text, context_radius=DEFAULT_CONTEXT_RADIUS):
+    """
+    The diff as sent to the LLM: compacted with `context_radius` lines of context, or unchanged
+    when `context_radius` is None.
+    """
+    if context_radius is None:
+        return diff_text
+    with span("compact_diff"):
+        return compact_diff(diff_text, context_radius)
+
+def check_diff_sharded(diff_text, rules, max_shard_tokens=6000, concurrency=4, rule_index=None, top_k=0,
+                       local_rules=(), read_source=None, context_radius=DEFAULT_CONTEXT_RADIUS, rule_scope=None):
+    """
+    Review a large diff by splitting it into token-budgeted shards at file/hunk boundaries,
+    reviewing the shards concurrently and merging the issues.
+
+    Issues from the local checks of `local_rules` are merged in; when every rule is checked
+    locally (`rules` is empty), the LLM is not called. The LLM sees the compacted diff, and
+    with a `rule_scope` each shard is checked only against the rules for its files.
+    """
+    local_issues = check_diff_locally(diff_text, local_rules, read_source)
+    if not rules.strip():
+        return merge_issues([local_issues])
+    diff_text = compact_review_diff(diff_text, context_radius)
+    shards = pack_diff_shards(diff_text, max_tokens=max_shard_tokens)
+    if len(shards) <= 1:
+        return merge_issues([local_issues, check_diff_with_gpt(diff_text, select_rules([diff_text], rules, rule_index, top_k, rule_scope)[0])])
+
+    shard_rules = select_rules(shards, rules, rule_index, top_k, rule_scope)
+    print(f"Reviewing diff in {len(shards)} shards...")
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        issue_lists = list(executor.map(check_diff_with_gpt, shards, shard_rules))
+    return merge_issues([local_issues] + issue_lists)
+
+def _hunk_lines(hunk):
+    """
+    Range of the new-file lines a hunk covers; empty for a file without hunks.
+    """
+    match = HUNK_HEADER_RE.match(hunk.header) if hunk is not None else None
+    if match is None:
+        return range(0)
+    start = int(match.group(3))
+    return range(start, start + max(1, int(match.group(4) or 1)))
+
+def _issue_piece(issue, pieces, candidates):
+    """
+    Which of the `candidates` (indices into `pieces`) an issue from a review of all of them
+    belongs to: the hunks of the file the issue names (or of the only file), then the hunk
+    whose lines contain, or are nearest to, the first line number of the issue.
+    """
+    text = f"{issue.get('Issue Description', '')} {issue.get('Suggestion', '')}"
+    paths = {pieces[index][0].path for index in candidates}
+    named = [path for path in paths if path in text]
+    if named or len(paths) == 1:
+        candidates = [index for index in candidates if pieces[index][0].path in (named or paths)]
+    numbers = re.findall(r'\d+', issue.get('Line Number(s)', ''))
+    if not numbers:
+        return candidates[0]
+    line = int(numbers[0])
+
+    def distance(index):
+        lines = _hunk_lines(pieces[index][1])
+        if not lines:
+            return float('inf')
+        return 0 if line in lines else min(abs(line - lines[0]), abs(line - lines[-1]))
+
+    return min(candidates, key=distance)
+
+def check_diff_incremental(diff_text, rules, store, concurrency=4, rule_index=None, top_k=0, max_shard_tokens=6000,
+                           local_rules=(), read_source=None, context_radius=DEFAULT_CONTEXT_RADIUS, rule_scope=None):
+    """
+    Review only the hunks that are not in the hunk review store yet and merge the stored
+    issues of unchanged hunks back in. Local checks are cheap and always rerun.
+
+    Pending hunks that are checked against the same rules are packed into shards of at most
+    `max_shard_tokens` tokens, and the issues of each shard are stored with the hunk they
+    point at, so a diff with many small changes takes a few requests instead of one per hunk.
+    """
+    local_issues = check_diff_locally(diff_text, local_rules, read_source)
+    if not rules.strip():
+        return merge_issues([local_issues])
+    diff_text = compact_review_diff(diff_text, context_radius)
+    pieces = []
+    for file_diff in parse_diff(diff_text):
+        for hunk in file_diff.hunks or [None]:
+            text = f"{file_diff.header()}\n{hunk.text()}" if hunk is not None else file_diff.header()
+            new_start = hunk.new_start() if hunk is not None else 0
+            pieces.append((file_diff, hunk, new_start, text))
+    piece_rules = select_rules([text for *_, text in pieces], rules, rule_index, top_k, rule_scope)
+    keys = [hunk_key(file_diff, hunk, rules_hash(selected), get_model("review"))
+            for (file_diff, hunk, _, _), selected in zip(pieces, piece_rules)]
+
+    issue_lists = [store.get(key, piece[2]) for key, piece in zip(keys, pieces)]
+    pending = [index for index, issues in enumerate(issue_lists) if issues is None]
+    if pending:
+        groups = {}
+        for index in pending:
+            groups.setdefault(piece_rules[index], []).append(index)
+        shards = []  # (shard text, rules, indices of the pieces in the shard)
+        for group_rules, indices in groups.items():
+            positions = {(pieces[index][0].path, pieces[index][1].header if pieces[index][1] else None): index
+                         for index in indices}
+            for shard in pack_diff_shards('\n'.join(pieces[index][3] for index in indices), max_tokens=max_shard_tokens):
+                shards.append((shard, group_rules, [positions[(file_diff.path, hunk.header if hunk else None)]
+                                                    for file_diff in parse_diff(shard) for hunk in file_diff.hunks or [None]]))
+        print(f"Reviewing {len(pending)} new or changed hunks in {len(shards)} requests "
+              f"({len(pieces) - len(pending)} unchanged)...")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            reviewed = list(executor.map(lambda shard: check_diff_with_gpt(shard[0], shard[1]), shards))
+        for (_, _, indices), issues in zip(shards, reviewed):
+            found = {index: [] for index in indices}
+            for issue in issues:
+                if issue.get("Message") != "No issues found.":
+                    found[_issue_piece(issue, pieces, indices)].append(issue)
+            for index, piece_issues in found.items():
+                piece_issues = piece_issues or [{"Message": "No issues found."}]
+                store.set(keys[index], pieces[index][2], piece_issues)
+                issue_lists[index] = piece_issues
+        store.save()
+    return merge_issues([local_issues] + issue_lists)
+
+class IssueStreamParser:
+    """
+    Incremental parser for "Rule Violated / Line Number(s) / ..." blocks.
+
+    Text is fed as it streams in; an issue is returned as soon as it is complete, which is when
+    its Suggestion line ends, the next issue starts, or the stream is closed.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._issue = {}
+
+    def _parse_line(self, line):
+        completed = []
+        match = ISSUE_FIELD_RE.match(line.strip())
+        if not match:
+            return completed
+        key, value = match.groups()
+        field = ISSUE_FIELDS[key.lower()]
+        if (field == 'Rule Violated' or field in self._issue) and self._issue:
+            completed.append(self._issue)
+            self._issue = {}
+        self._issue[field] = value
+        if field == 'Suggestion':
+            completed.append(self._issue)
+            self._issue = {}
+        return completed
+
+    def feed(self, text):
+        """
+        Add streamed text and return the issues completed by it.
+        """
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        completed = []
+        for line in lines:
+            completed.extend(self._parse_line(line))
+        return completed
+
+    def close(self):
+        """
+        Flush the last partial line and return any remaining issue.
+        """
+        completed = self._parse_line(self._buffer)
+        self._buffer = ''
+        if self._issue:
+            completed.append(self._issue)
+            self._issue = {}
+        return completed
+
+def iter_issues_streaming(diff_text, rules):
+    """
+    Stream the review of a diff and yield each issue as soon as it is complete.
+    """
+    if not rules.strip():
+        return
+    parser = IssueStreamParser()
+    stream = stream_chat_completion(model=get_model("review"), messages=build_review_messages(diff_text, rules, structured=False))
+    try:
+        for delta in stream:
+            yield from parser.feed(delta)
+    finally:
+        stream.close()
+    yield from parser.close()
+
+def _iter_streamed_issues(diff_text, rules, max_shard_tokens, rule_index, top_k, context_radius, rule_scope):
+    if not rules.strip():
+        return
+    diff_text = compact_review_diff(diff_text, context_radius)
+    shards = pack_diff_shards(diff_text, max_tokens=max_shard_tokens) or [diff_text]
+    for shard, shard_rules in zip(shards, select_rules(shards, rules, rule_index, top_k, rule_scope)):
+        yield from iter_issues_streaming(shard, shard_rules)
+
+def check_diff_streaming(diff_text, rules, on_issue=None, fail_fast=False, max_shard_tokens=6000,
+                         rule_index=None, top_k=0, local_rules=(), read_source=None,
+                         context_radius=DEFAULT_CONTEXT_RADIUS, rule_scope=None):
+    """
+    Review the diff shard by shard with streamed completions, calling `on_issue` for each new
+    issue as soon as it has been parsed. With `fail_fast`, stop at the first issue.
+
+    Issues from local checks are reported first, before any request is made.
+    """
+    local_issues = check_diff_locally(diff_text, local_rules, read_source)
+    issues = []
+    seen = set()
+    streamed = _iter_streamed_issues(diff_text, rules, max_shard_tokens, rule_index, top_k, context_radius, rule_scope)
+    for issue in itertools.chain(local_issues, streamed):
+        if issue_key(issue) in seen:
+            continue
+        seen.add(issue_key(issue))
+        issues.append(issue)
+        if on_issue is not None:
+            on_issue(issue)
+        if fail_fast:
+            return issues
+    return issues or [{"Message": "No issues found."}]
+
+def display_issue(issue):
+    """
+    Display a single issue.
+    """
+    print(f"Rule Violated: {issue.get('Rule Violated', 'N/A')}")
+    print(f"Line Number(s): {issue.get('Line Number(s)', 'N/A')}")
+    print(f"Issue Description: {issue.get('Issue Description', 'N/A')}")
+    print(f"Suggestion: {issue.get('Suggestion', 'N/A')}")
+    print('-' * 80)
 
 def display_issues(issues):
     """
@@ -83,8 +384,4 @@ def display_issues(issues):
         print("No issues found.")
     else:
         for issue in issues:
-            print(f"Rule Violated: {issue.get('Rule Violated', 'N/A')}")
-            print(f"Line Number(s): {issue.get('Line Number(s)', 'N/A')}")
-            print(f"Issue Description: {issue.get('Issue Description', 'N/A')}")
-            print(f"Suggestion: {issue.get('Suggestion', 'N/A')}")
-            print('-' * 80)
\ No newline at end of file
+            display_issue(issue)
@@ -0,0 +1,128 @@
+import re
+import zlib
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Number of hashed features; large enough that rule vocabularies rarely collide
+DEFAULT_N_FEATURES = 4096
+
+WORD_RE = re.compile(r'[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase words of `text`. Identifiers are split at snake_case and camelCase boundaries
+    and a plural "s" is dropped, so code and rule prose share a vocabulary.
+    """
+    tokens = []
+    for word in WORD_RE.findall(text):
+        word = word.lower()
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        if len(word) > 1:
+            tokens.append(word)
+    return tokens
+
+
+class RuleIndex:
+    """
+    Hashed-feature TF-IDF index over rule descriptions, stored as a sparse CSR matrix: the
+    features of rule i are `indices[indptr[i]:indptr[i + 1]]` with weights in `values`.
+
+    Diff texts are scored against all rules by gathering the rule weights of the text's
+    features, and only the most relevant rules plus the rules marked "always" are kept for
+    the review prompt.
+    """
+
+    def __init__(self, rules: List[Dict[str, str]], n_features: int = DEFAULT_N_FEATURES):
+        self.rules = rules
+        self.n_features = n_features
+        self.pinned = np.array([bool(rule.get('always')) for rule in rules], dtype=bool)
+
+        features = [self._features(rule.get('description', '')) for rule in rules]
+        self.indptr = np.concatenate(([0], np.cumsum([len(columns) for columns, _ in features]))).astype(np.int32)
+        self.indices = np.concatenate([columns for columns, _ in features] + [[]]).astype(np.int32)
+        counts = np.concatenate([counts for _, counts in features] + [[]])
+        document_frequency = np.bincount(self.indices, minlength=n_features)
+        self.idf = np.log((1 + len(rules)) / (1 + document_frequency)).astype(np.float32) + 1
+        weights = (1 + np.log(counts)) * self.idf[self.indices]
+        rows = np.repeat(np.arange(len(rules)), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(rules)))
+        self.values = (weights / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+        self._segments()
+
+    @classmethod
+    def from_arrays(cls, rules: List[Dict[str, str]], idf: np.ndarray, indptr: np.ndarray,
+                    indices: np.ndarray, values: np.ndarray) -> 'RuleIndex':
+        """
+        Index with precomputed IDF weights and CSR rule matrix, as stored in a compiled rules
+        bundle. The arrays are used as they are, so they may be views of a mapped file.
+        """
+        index = cls.__new__(cls)
+        index.rules = rules
+        index.n_features = len(idf)
+        index.pinned = np.array([bool(rule.get('always')) for rule in rules], dtype=bool)
+        index.idf = idf
+        index.indptr = indptr
+        index.indices = indices
+        index.values = values
+        index._segments()
+        return index
+
+    def _segments(self) -> None:
+        # np.add.reduceat cannot sum an empty segment, so only rules with features are reduced
+        self._nonempty = self.indptr[:-1] < self.indptr[1:]
+        self._starts = self.indptr[:-1][self._nonempty]
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sorted hashed feature columns of a text and the number of tokens in each.
+        """
+        columns = [zlib.crc32(token.encode('utf-8')) % self.n_features for token in tokenize(text)]
+        return np.unique(np.array(columns, dtype=np.int32), return_counts=True)
+
+    def scores(self, texts: List[str]) -> np.ndarray:
+        """
+        Cosine similarity of every text against every rule, shape (len(texts), len(rules)).
+        Texts use the same sublinear TF-IDF weighting with L2 normalisation as the rules.
+        """
+        scores = np.zeros((len(texts), len(self.rules)), dtype=np.float32)
+        if not len(self._starts):
+            return scores
+        query = np.zeros(self.n_features, dtype=np.float32)
+        for row, text in enumerate(texts):
+            columns, counts = self._features(text)
+            weights = (1 + np.log(counts)) * self.idf[columns]
+            query[columns] = weights / max(np.linalg.norm(weights), 1e-12)
+            scores[row, self._nonempty] = np.add.reduceat(query[self.indices] * self.values, self._starts)
+            query[columns] = 0
+        return scores
+
+    def select_batch(self, texts: List[str], top_k: int, masks=None) -> List[List[Dict[str, str]]]:
+        """
+        For every text, the `top_k` most relevant rules plus all pinned rules, in rule-file order.
+        A text that shares no terms with any rule keeps the full rule set.
+
+        `masks` holds one row of booleans per text; rules outside a text's row are never
+        selected for it, e.g. rules scoped to other paths.
+        """
+        if not self.rules:
+            return [[] for _ in texts]
+        scores = self.scores(texts)
+        allowed = np.ones(scores.shape, dtype=bool) if masks is None else np.asarray(masks, dtype=bool)
+        scores = np.where(allowed, scores, 0)
+        k = min(top_k, len(self.rules))
+        selections = []
+        for row, allowed_row in zip(scores, allowed):
+            if not np.any(row > 0):
+                selections.append([rule for rule, keep in zip(self.rules, allowed_row) if keep])
+                continue
+            selected = self.pinned & allowed_row
+            if k > 0:
+                top = np.argpartition(-row, k - 1)[:k]
+                selected[top[row[top] > 0]] = True
+            selections.append([rule for rule, keep in zip(self.rules, selected) if keep])
+        return selections
+
+    def select(self, text: str, top_k: int) -> List[Dict[str, str]]:
+        return self.select_batch([text], top_k)[0]
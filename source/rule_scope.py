@@ -0,0 +1,234 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+# File extensions of the names accepted in a rule's "languages"
+LANGUAGE_EXTENSIONS = {
+    "c": (".c", ".h"),
+    "cpp": (".cc", ".cpp", ".cxx", ".hh", ".hpp", ".hxx", ".h"),
+    "csharp": (".cs",),
+    "css": (".css", ".scss", ".sass", ".less"),
+    "go": (".go",),
+    "html": (".html", ".htm"),
+    "java": (".java",),
+    "javascript": (".js", ".jsx", ".mjs", ".cjs"),
+    "json": (".json",),
+    "kotlin": (".kt", ".kts"),
+    "markdown": (".md", ".markdown"),
+    "php": (".php",),
+    "python": (".py", ".pyi"),
+    "ruby": (".rb",),
+    "rust": (".rs",),
+    "shell": (".sh", ".bash", ".zsh"),
+    "sql": (".sql",),
+    "swift": (".swift",),
+    "typescript": (".ts", ".tsx", ".mts", ".cts"),
+    "yaml": (".yml", ".yaml"),
+}
+
+_MAGIC = re.compile(r'[*?[]')
+
+
+def _glob_regex(pattern: str) -> Pattern:
+    """
+    Compile a glob where `*` and `?` stay within one path segment and `**` spans segments.
+    """
+    out = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**/', index):
+            out.append('(?:.*/)?')
+            index += 3
+        elif pattern.startswith('**', index):
+            out.append('.*')
+            index += 2
+        elif pattern[index] == '*':
+            out.append('[^/]*')
+            index += 1
+        elif pattern[index] == '?':
+            out.append('[^/]')
+            index += 1
+        elif pattern[index] == '[' and ']' in pattern[index + 2:]:
+            end = pattern.index(']', index + 2)
+            body = pattern[index + 1:end]
+            out.append('[' + ('^' + body[1:] if body.startswith('!') else body) + ']')
+            index = end + 1
+        else:
+            out.append(re.escape(pattern[index]))
+            index += 1
+    return re.compile(''.join(out) + r'\Z')
+
+
+class _PathGlob:
+    """
+    One entry of a rule's "paths", with gitignore-like semantics: a pattern containing a `/` is
+    anchored at the repository root, any other pattern matches a file or directory name at any
+    depth, and a pattern matching a directory matches everything below it.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.anchored = '/' in pattern.rstrip('/')
+        self.regex = _glob_regex(pattern.strip('/'))
+        segments = pattern.strip('/').split('/')
+        # Leading segments without wildcards, used to place the glob in the prefix trie
+        self.prefix: Tuple[str, ...] = ()
+        if self.anchored:
+            literal = []
+            for segment in segments:
+                if _MAGIC.search(segment):
+                    break
+                literal.append(segment)
+            self.prefix = tuple(literal)
+
+    def matches(self, path: str) -> bool:
+        segments = path.split('/')
+        if self.anchored:
+            return any(self.regex.match('/'.join(segments[:end])) for end in range(len(segments), 0, -1))
+        return any(self.regex.match(segment) for segment in segments)
+
+
+def _as_list(value) -> List:
+    return [value] if isinstance(value, str) else list(value or [])
+
+
+def _is_scoped(rule: Dict) -> bool:
+    return bool(rule.get('paths') or rule.get('languages') or rule.get('exclude_paths'))
+
+
+class _ScopedRule:
+
+    def __init__(self, rule: Dict):
+        paths = _as_list(rule.get('paths'))
+        languages = _as_list(rule.get('languages'))
+        unknown = [language for language in languages if language.lower() not in LANGUAGE_EXTENSIONS]
+        if unknown:
+            raise ValueError(f"Rule {rule.get('id')}: unknown language(s) {', '.join(unknown)}; "
+                             f"expected one of {', '.join(sorted(LANGUAGE_EXTENSIONS))}")
+        self.globs = [_PathGlob(pattern) for pattern in paths]
+        self.excludes = [_PathGlob(pattern) for pattern in _as_list(rule.get('exclude_paths'))]
+        self.extensions: Optional[Set[str]] = None
+        if languages:
+            self.extensions = {extension for language in languages for extension in LANGUAGE_EXTENSIONS[language.lower()]}
+
+    def applies(self, path: str) -> bool:
+        if self.globs and not any(glob.matches(path) for glob in self.globs):
+            return False
+        if any(glob.matches(path) for glob in self.excludes):
+            return False
+        return self.extensions is None or os.path.splitext(path)[1].lower() in self.extensions
+
+
+def rule_applies(rule: Dict, path: str) -> bool:
+    """
+    Whether a rule applies to a file, given the rule's optional "paths" globs, "languages" and
+    "exclude_paths" globs.
+    """
+    if not _is_scoped(rule):
+        return True
+    return _ScopedRule(rule).applies(path)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.rules: List[int] = []
+
+
+class RuleScope:
+    """
+    Selects the rules that apply to the files of a diff.
+
+    Rules may set "paths", a list of globs such as "frontend/**" or "*.py", and "languages",
+    such as ["python"]; a rule with both applies to files matching both. "exclude_paths" globs
+    take files back out. Rules with none of these apply everywhere. Anchored globs are stored in a trie of their literal leading directories,
+    extensions and file names in hash indexes, so looking up a file visits only its own
+    directories and the few rules that could match, which are then checked exactly.
+    """
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        self._scoped: List[Optional[_ScopedRule]] = []
+        self._global: List[int] = []
+        self._trie = _TrieNode()
+        self._extensions: Dict[str, Set[int]] = {}
+        self._names: Dict[str, Set[int]] = {}
+        self._floating: Set[int] = set()  # Name globs that cannot be indexed, and rules with only exclusions
+        for index, rule in enumerate(rules):
+            scoped = _ScopedRule(rule) if _is_scoped(rule) else None
+            self._scoped.append(scoped)
+            if scoped is None:
+                self._global.append(index)
+            elif scoped.globs:
+                for glob in scoped.globs:
+                    self._index_glob(index, glob)
+            elif scoped.extensions is None:
+                self._floating.add(index)
+            else:
+                for extension in scoped.extensions:
+                    self._extensions.setdefault(extension, set()).add(index)
+
+    def _index_glob(self, index: int, glob: _PathGlob) -> None:
+        if glob.anchored:
+            node = self._trie
+            for segment in glob.prefix:
+                node = node.children.setdefault(segment, _TrieNode())
+            node.rules.append(index)
+            return
+        name = glob.pattern.strip('/')
+        extension = os.path.splitext(name)[1].lower()
+        if not _MAGIC.search(name):
+            self._names.setdefault(name, set()).add(index)
+        elif name.startswith('*') and extension and not _MAGIC.search(name[1:]):
+            self._extensions.setdefault(extension, set()).add(index)
+        else:
+            self._floating.add(index)
+
+    @property
+    def scoped(self) -> bool:
+        """
+        Whether any rule is restricted to some paths or languages, or excludes some paths.
+        """
+        return len(self._global) < len(self.rules)
+
+    def _candidates(self, path: str) -> Set[int]:
+        segments = path.split('/')
+        candidates = set(self._floating)
+        node = self._trie
+        candidates.update(node.rules)
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            candidates.update(node.rules)
+        candidates.update(self._extensions.get(os.path.splitext(path)[1].lower(), ()))
+        for segment in segments:
+            candidates.update(self._names.get(segment, ()))
+        return candidates
+
+    def indices_for(self, path: str) -> Set[int]:
+        """
+        Positions in `rules` of the scoped rules that apply to `path`.
+        """
+        return {index for index in self._candidates(path) if self._scoped[index].applies(path)}
+
+    def mask(self, paths: Iterable[str]) -> List[bool]:
+        """
+        For every rule, whether it applies to at least one of `paths`. Without any path, every
+        rule applies.
+        """
+        paths = list(paths)
+        if not paths:
+            return [True] * len(self.rules)
+        selected = set(self._global)
+        for path in paths:
+            selected |= self.indices_for(path)
+        return [index in selected for index in range(len(self.rules))]
+
+    def select(self, paths: Iterable[str]) -> List[Dict]:
+        """
+        The rules that apply to at least one of `paths`, in rule-file order.
+        """
+        return [rule for rule, keep in zip(self.rules, self.mask(paths)) if keep]
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, List, Optional
+from source.io import load_rule_records, format_rules_text
+from source.local_checks import is_local_rule, llm_rule
+
+# File layout: magic, format version and header length, a JSON header with the section table,
+# then the sections, each starting at a multiple of 8 bytes so arrays can be used in place
+BUNDLE_MAGIC = b'PRHRULES'
+BUNDLE_VERSION = 3
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 8
+
+
+class RulesBundleError(ValueError):
+    """
+    Raised for a file that is not a rules bundle or has an unsupported version.
+    """
+
+
+def rules_digest(records: List[Dict]) -> str:
+    """
+    Content hash identifying a rule set, independent of JSON formatting.
+    """
+    canonical = json.dumps(records, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RulesBundle:
+    """
+    A rule set with everything derived from it computed once: the prompt text, a content hash
+    and optionally the TF-IDF rule index. Rules enforced by local checks are left out of the
+    prompt and the index.
+
+    Bundles are compiled from a rules JSON file with `compile_rules` and loaded with one read,
+    or memory-mapped so that long-running processes share the pages. Sections are decoded only
+    when first used.
+    """
+
+    def __init__(self, buffer, header: Dict, records: Optional[List[Dict]] = None):
+        self._buffer = buffer
+        self.header = header
+        self.digest = header["digest"]
+        self._records = records
+        self._prompt_records = None
+        self._text = None
+        self._rule_index = None
+        self._rule_scope = None
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'RulesBundle':
+        """
+        In-memory bundle for rules loaded from JSON; nothing is precomputed.
+        """
+        return cls(None, {"digest": rules_digest(records), "rule_count": len(records), "sections": {}}, records)
+
+    @classmethod
+    def open(cls, path: str, use_mmap: bool = False) -> 'RulesBundle':
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else f.read()
+        if len(buffer) < _PREAMBLE.size:
+            raise RulesBundleError(f"{path} is not a rules bundle")
+        magic, version, header_length = _PREAMBLE.unpack_from(buffer, 0)
+        if magic != BUNDLE_MAGIC:
+            raise RulesBundleError(f"{path} is not a rules bundle")
+        if version != BUNDLE_VERSION:
+            raise RulesBundleError(f"{path} has bundle format version {version}, expected {BUNDLE_VERSION}; recompile it")
+        header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+        return cls(buffer, header)
+
+    def _section(self, name: str) -> memoryview:
+        offset, length = self.header["sections"][name]
+        return memoryview(self._buffer)[offset:offset + length]
+
+    @property
+    def records(self) -> List[Dict]:
+        if self._records is None:
+            self._records = json.loads(bytes(self._section("rules")))
+        return self._records
+
+    @property
+    def prompt_records(self) -> List[Dict]:
+        """
+        The rules reviewed by the LLM. Rules with a local check are kept, scoped to the files
+        their check does not read, unless the check covers every file they apply to.
+        """
+        if self._prompt_records is None:
+            self._prompt_records = [rule for rule in map(llm_rule, self.records) if rule is not None]
+        return self._prompt_records
+
+    @property
+    def local_rules(self) -> List[Dict]:
+        """
+        The rules enforced by local checks, see source.local_checks.
+        """
+        return [rule for rule in self.records if is_local_rule(rule)]
+
+    @property
+    def text(self) -> str:
+        """
+        The numbered rules list used in review prompts.
+        """
+        if self._text is None:
+            if "prompt" in self.header["sections"]:
+                self._text = bytes(self._section("prompt")).decode('utf-8')
+            else:
+                self._text = format_rules_text(self.prompt_records)
+        return self._text
+
+    def rule_index(self):
+        """
+        Rule index for relevance filtering, read from the bundle when it was compiled with one.
+        """
+        if self._rule_index is None:
+            from source.rule_index import RuleIndex
+            if "index" in self.header:
+                self._rule_index = RuleIndex.from_arrays(self.prompt_records, *self._index_arrays())
+            else:
+                self._rule_index = RuleIndex(self.prompt_records)
+        return self._rule_index
+
+    def rule_scope(self):
+        """
+        Selector of the rules that apply to given paths, or None when every rule applies
+        everywhere. Raises ValueError for a rule with an unknown language.
+        """
+        if self._rule_scope is None:
+            from source.rule_scope import RuleScope
+            self._rule_scope = RuleScope(self.prompt_records)
+        return self._rule_scope if self._rule_scope.scoped else None
+
+    def _index_arrays(self):
+        import numpy as np
+        idf = np.frombuffer(self._section("index_idf"), dtype=np.float32)
+        indptr = np.frombuffer(self._section("index_indptr"), dtype=np.int32)
+        indices = np.frombuffer(self._section("index_indices"), dtype=np.int32)
+        values = np.frombuffer(self._section("index_values"), dtype=np.float32)
+        return idf, indptr, indices, values
+
+    def write(self, path: str, with_index: bool = True) -> None:
+        """
+        Write the bundle atomically, so processes that mapped the previous file keep a valid view.
+        """
+        from source.rule_scope import RuleScope
+        RuleScope(self.records)  # Rejects unknown languages before anything is written
+        sections = {
+            "rules": json.dumps(self.records, ensure_ascii=False).encode('utf-8'),
+            "prompt": self.text.encode('utf-8'),
+        }
+        header = {"digest": self.digest, "rule_count": len(self.records), "sections": {}}
+        if with_index:
+            import numpy as np
+            index = self.rule_index()
+            sections["index_idf"] = index.idf.astype(np.float32).tobytes()
+            sections["index_indptr"] = index.indptr.astype(np.int32).tobytes()
+            sections["index_indices"] = index.indices.astype(np.int32).tobytes()
+            sections["index_values"] = index.values.astype(np.float32).tobytes()
+            header["index"] = {"n_features": index.n_features}
+
+        # Offsets depend on the header length, so lay the sections out until it is stable
+        header_bytes = b''
+        while True:
+            offset = _PREAMBLE.size + len(header_bytes)
+            for name, data in sections.items():
+                offset += -offset % _ALIGNMENT
+                header["sections"][name] = [offset, len(data)]
+                offset += len(data)
+            encoded = json.dumps(header).encode('utf-8')
+            stable = len(encoded) == len(header_bytes)
+            header_bytes = encoded
+            if stable:
+                break
+
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header_bytes)))
+                f.write(header_bytes)
+                for name, data in sections.items():
+                    f.write(b'\0' * (header["sections"][name][0] - f.tell()))
+                    f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def is_rules_bundle(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(BUNDLE_MAGIC)) == BUNDLE_MAGIC
+
+
+def compile_rules(json_path: str, output_path: str, with_index: bool = True) -> RulesBundle:
+    """
+    Compile a rules JSON file into a bundle at `output_path`.
+    """
+    bundle = RulesBundle.from_records(load_rule_records(json_path))
+    bundle.write(output_path, with_index=with_index)
+    return bundle
+
+
+def load_rules(path: str, use_mmap: bool = False) -> RulesBundle:
+    """
+    Load rules from either a compiled bundle or a rules JSON file.
+    """
+    if os.path.exists(path) and is_rules_bundle(path):
+        return RulesBundle.open(path, use_mmap=use_mmap)
+    return RulesBundle.from_records(load_rule_records(path))
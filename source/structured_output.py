@@ -0,0 +1,212 @@
+import json
+from typing import Callable, Dict, List, Optional
+from source.llm import LLMError, cache_completion, chat_completion
+from source.profiling import span, annotate
+
+# Field names of the JSON review output and the issue keys they map to
+ISSUE_KEYS = {
+    "rule": "Rule Violated",
+    "line_numbers": "Line Number(s)",
+    "description": "Issue Description",
+    "suggestion": "Suggestion",
+}
+
+REVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "issues": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in ISSUE_KEYS},
+                "required": list(ISSUE_KEYS),
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["issues"],
+    "additionalProperties": False,
+}
+
+RULES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rules": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, "description": {"type": "string"}},
+                "required": ["id", "description"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["rules"],
+    "additionalProperties": False,
+}
+
+# Rules extracted from several numbered sections at once, each with the section it comes from
+SECTION_RULES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rules": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, "description": {"type": "string"},
+                               "section": {"type": "integer"}},
+                "required": ["id", "description", "section"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["rules"],
+    "additionalProperties": False,
+}
+
+# Follow-up requests sent after a response that does not match the schema
+DEFAULT_MAX_REPAIRS = 1
+
+# Models that accept a JSON schema as `response_format`, by name prefix, and the older
+# snapshots of those families that do not
+JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+_NO_JSON_SCHEMA_MODELS = ("gpt-4o-2024-05-13", "o1-mini", "o1-preview")
+
+# Added to the system prompt of models that are asked for JSON in plain text instead
+SCHEMA_INSTRUCTIONS = "Respond with only a JSON object that matches this JSON schema, without Markdown fences:\n"
+
+_JSON_TYPES = {"object": dict, "array": list, "string": str, "integer": int}
+
+
+class StructuredOutputError(LLMError, ValueError):
+    """
+    Raised when a model response does not match the requested schema, even after repair.
+    """
+
+
+def response_format(name: str, schema: Dict) -> Dict:
+    """
+    `response_format` request parameter asking for output that matches `schema`.
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def supports_json_schema(model: str) -> bool:
+    """
+    Whether a model accepts `response_format` with a JSON schema. Others, such as gpt-4,
+    reject the request.
+    """
+    return model.startswith(JSON_SCHEMA_MODELS) and not model.startswith(_NO_JSON_SCHEMA_MODELS)
+
+
+def _with_schema_instructions(messages: List[Dict[str, str]], schema: Dict) -> List[Dict[str, str]]:
+    """
+    The messages with the schema spelled out in the system prompt.
+    """
+    instructions = SCHEMA_INSTRUCTIONS + json.dumps(schema)
+    if messages and messages[0]["role"] == "system":
+        return [dict(messages[0], content=f"{messages[0]['content']}\n\n{instructions}")] + messages[1:]
+    return [{"role": "system", "content": instructions}] + messages
+
+
+def validate(value, schema: Dict, path: str = '$') -> None:
+    """
+    Check `value` against the subset of JSON schema used here (object, array, string and integer types,
+    required properties and additionalProperties). Raises StructuredOutputError naming the first
+    offending location.
+    """
+    expected = _JSON_TYPES[schema["type"]]
+    if not isinstance(value, expected):
+        raise StructuredOutputError(f"{path}: expected {schema['type']}, got {type(value).__name__}")
+    if schema["type"] == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                raise StructuredOutputError(f"{path}: missing required property '{key}'")
+        properties = schema.get("properties", {})
+        for key, item in value.items():
+            if key in properties:
+                validate(item, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                raise StructuredOutputError(f"{path}: unexpected property '{key}'")
+    elif schema["type"] == "array":
+        for index, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{index}]")
+
+
+def parse_json(content: Optional[str], schema: Dict) -> Dict:
+    """
+    Decode and validate a JSON response in one pass.
+    """
+    if content is None:
+        raise StructuredOutputError("empty response")
+    content = content.strip()
+    if content.startswith('```'):
+        # Models asked for JSON in plain text may still wrap it in a code block
+        content = content.split('\n', 1)[-1].rsplit('```', 1)[0]
+    try:
+        value = json.loads(content)
+    except ValueError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}") from None
+    validate(value, schema)
+    return value
+
+
+def parse_review_issues(content: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Parse a JSON review into issue dictionaries, or the "No issues found." marker.
+    """
+    issues = [{ISSUE_KEYS[field]: issue[field].strip() for field in ISSUE_KEYS}
+              for issue in parse_json(content, REVIEW_SCHEMA)["issues"]]
+    return issues or [{"Message": "No issues found."}]
+
+
+def parse_rules(content: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Parse a JSON list of rules into rule dictionaries.
+    """
+    return [{"id": rule["id"], "description": rule["description"].strip()}
+            for rule in parse_json(content, RULES_SCHEMA)["rules"]]
+
+
+def parse_section_rules(content: Optional[str]) -> List[Dict]:
+    """
+    Parse a JSON list of rules, each with the number of the section it was extracted from.
+    """
+    return [{"id": rule["id"], "description": rule["description"].strip(), "section": rule["section"]}
+            for rule in parse_json(content, SECTION_RULES_SCHEMA)["rules"]]
+
+
+def complete_structured(model: str, messages: List[Dict[str, str]], name: str, schema: Dict,
+                        parse: Callable[[Optional[str]], List[Dict[str, str]]],
+                        max_repairs: int = DEFAULT_MAX_REPAIRS) -> List[Dict[str, str]]:
+    """
+    Request schema-constrained output and parse it with `parse`.
+
+    A response that does not parse is sent back with the validation error so the model can
+    correct it, up to `max_repairs` times. Raises StructuredOutputError if it still fails.
+    Models without JSON schema support get the schema in the system prompt instead. Only a
+    response that parses is cached, so a rerun does not replay an invalid one.
+    """
+    if supports_json_schema(model):
+        params = {"response_format": response_format(name, schema)}
+    else:
+        params = {}
+        messages = _with_schema_instructions(messages, schema)
+    content = chat_completion(model=model, messages=messages, cache_response=False, **params)
+    for attempt in range(max_repairs + 1):
+        try:
+            with span("parse_response"):
+                result = parse(content)
+            cache_completion(model, messages, content, **params)
+            return result
+        except StructuredOutputError as e:
+            if attempt == max_repairs:
+                raise StructuredOutputError(f"{name} response did not match the schema after {max_repairs} repair(s): {e}") from None
+            with span("repair_response", error=str(e)):
+                annotate(retries=1)
+                messages = messages + [
+                    {"role": "assistant", "content": content or ""},
+                    {"role": "user", "content": f"Your response was not valid: {e}. "
+                                                "Reply again with only the JSON object matching the schema."},
+                ]
+                content = chat_completion(model=model, messages=messages, cache_response=False, **params)
@@ -0,0 +1,16 @@
+import math
+
+# Average number of characters per token for English prose and source code.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of tokens the model will see for `text`.
+
+    This is a cheap local approximation so callers can budget prompts without
+    calling a tokenizer.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from source.batch import load_completed_refs, run_batch
+from source.result_store import ReviewResultStore
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        for command in (['git', 'init', '-q', '-b', 'main'], ['git', 'config', 'user.email', 'test@example.com'],
+                        ['git', 'config', 'user.name', 'Test']):
+            subprocess.run(command, check=True)
+        self._commit('app.py', 'x = 1\n')
+        for branch, content in (('feature-a', 'x = 2\n'), ('feature-b', 'x = 3\n')):
+            subprocess.run(['git', 'checkout', '-q', '-b', branch, 'main'], check=True)
+            self._commit('app.py', content)
+        subprocess.run(['git', 'checkout', '-q', 'main'], check=True)
+        self.output = os.path.join(self.tmp_dir.name, 'results.jsonl')
+
+    def tearDown(self):
+        os.chdir(self.previous_cwd)
+        self.tmp_dir.cleanup()
+
+    def _commit(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+        subprocess.run(['git', 'add', path], check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', f'update {path}'], check=True)
+
+    def _records(self):
+        records = {}
+        with open(self.output) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record['ref']] = record
+        return records
+
+    @patch('source.batch.check_diff_sharded')
+    def test_run_batch_writes_one_record_per_ref(self, mock_check):
+        mock_check.side_effect = lambda diff_text, rules, **kwargs: (
+            [{"Rule Violated": "R1", "Line Number(s)": "1"}] if '+x = 2' in diff_text else [{"Message": "No issues found."}]
+        )
+        with patch('builtins.print'):
+            counts = run_batch(['feature-a', 'feature-b', 'main', 'missing-branch'], "1. R1", self.output, base='main')
+
+        records = self._records()
+        self.assertEqual(counts, {"issues": 1, "clean": 1, "empty": 1, "error": 1})
+        self.assertEqual(records['feature-a']['issues'], [{"Rule Violated": "R1", "Line Number(s)": "1"}])
+        self.assertEqual(records['feature-a']['files'], ['app.py'])
+        self.assertEqual(records['feature-b']['status'], 'clean')
+        self.assertEqual(records['missing-branch']['status'], 'error')
+
+    @patch('source.batch.check_diff_sharded')
+    def test_run_batch_resumes(self, mock_check):
+        mock_check.return_value = [{"Message": "No issues found."}]
+        with open(self.output, 'w') as f:
+            f.write(json.dumps({"ref": "feature-a", "status": "clean", "issues": []}) + '\n')
+            f.write(json.dumps({"ref": "feature-b", "status": "error", "error": "timeout"}) + '\n')
+            f.write('{"ref": "main", "sta')
+
+        self.assertEqual(load_completed_refs(self.output), {'feature-a'})
+        with patch('builtins.print'):
+            run_batch(['feature-a', 'feature-b'], "1. R1", self.output, base='main')
+        mock_check.assert_called_once()
+        self.assertEqual(self._records()['feature-b']['status'], 'clean')
+
+    @patch('source.batch.check_diff_sharded')
+    def test_reviewed_commits_are_taken_from_the_result_store(self, mock_check):
+        mock_check.return_value = [{"Rule Violated": "R1", "Line Number(s)": "1"}]
+        store = ReviewResultStore(os.path.join(self.tmp_dir.name, 'results.sqlite'))
+        with patch('builtins.print'):
+            run_batch(['feature-a'], "1. R1", self.output, base='main', result_store=store, settings='s')
+            # A new output file, so the ref is not skipped as already done
+            self.output = os.path.join(self.tmp_dir.name, 'second.jsonl')
+            run_batch(['feature-a', 'feature-a~1..feature-a'], "1. R1", self.output, base='main',
+                      result_store=store, settings='s')
+        mock_check.assert_called_once()
+        records = self._records()
+        self.assertTrue(records['feature-a']['stored'])
+        self.assertTrue(records['feature-a~1..feature-a']['stored'])
+        self.assertEqual(records['feature-a']['issues'], [{"Rule Violated": "R1", "Line Number(s)": "1"}])
+        self.assertEqual(store.query_counts("author"), [{"value": "Test <test@example.com>", "issues": 1, "reviews": 1}])
+        store.close()
+
+    @patch('source.batch.check_diff_sharded')
+    def test_stored_results_are_not_reused_without_reuse_results(self, mock_check):
+        mock_check.return_value = [{"Rule Violated": "R1", "Line Number(s)": "1"}]
+        store = ReviewResultStore(os.path.join(self.tmp_dir.name, 'results.sqlite'))
+        with patch('builtins.print'):
+            run_batch(['feature-a'], "1. R1", self.output, base='main', result_store=store, settings='s')
+            self.output = os.path.join(self.tmp_dir.name, 'second.jsonl')
+            run_batch(['feature-a'], "1. R1", self.output, base='main', result_store=store, settings='s',
+                      reuse_results=False)
+        self.assertEqual(mock_check.call_count, 2)
+        self.assertNotIn('stored', self._records()['feature-a'])
+        self.assertEqual(store.query_counts("author"), [{"value": "Test <test@example.com>", "issues": 2, "reviews": 2}])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
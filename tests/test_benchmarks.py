@@ -0,0 +1,38 @@
+import random
+import tempfile
+import unittest
+
+from benchmarks import generators
+from benchmarks.run_benchmarks import _benchmarks, compare, measure
+from source.create_rules_utils import format_rules
+from source.diff_utils import parse_diff
+from source.review_utils import format_response
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_generators_produce_parsable_inputs(self):
+        rng = random.Random(0)
+        self.assertEqual(len(format_rules(generators.make_rules_response(rng, 5))), 5)
+        self.assertEqual(len(format_response(generators.make_review_response(rng, 3))), 3)
+        files = parse_diff(generators.make_diff(rng, 2, 3, 4))
+        self.assertEqual([len(f.hunks) for f in files], [3, 3])
+        self.assertIn("## Topic", generators.make_markdown(rng, 2000))
+
+    def test_every_benchmark_runs_at_small_scale(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, fn in _benchmarks(0.001, random.Random(0), tmp_dir):
+                result = measure(fn, repeat=1)
+                self.assertGreater(result["peak_bytes"], 0, name)
+
+    def test_compare_reports_regressions(self):
+        baseline = {"a": {"seconds": 1.0, "peak_bytes": 100}, "b": {"seconds": 1.0, "peak_bytes": 100}}
+        results = {"a": {"seconds": 1.2, "peak_bytes": 100}, "b": {"seconds": 2.0, "peak_bytes": 200},
+                   "new": {"seconds": 9.0, "peak_bytes": 900}}
+        regressions = compare(results, baseline, time_tolerance=1.5, memory_tolerance=1.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith("b:") for regression in regressions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from source.cache import CompletionCache, configure_cache
+from source.llm import chat_completion
+
+
+class TestCompletionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        configure_cache(enabled=False)
+        self.tmp_dir.cleanup()
+
+    def test_make_key_depends_on_model_messages_and_params(self):
+        messages = [{"role": "user", "content": "hi"}]
+        key = CompletionCache.make_key("gpt-4", messages, {"temperature": 0})
+        self.assertEqual(key, CompletionCache.make_key("gpt-4", messages, {"temperature": 0}))
+        self.assertNotEqual(key, CompletionCache.make_key("gpt-4o", messages, {"temperature": 0}))
+        self.assertNotEqual(key, CompletionCache.make_key("gpt-4", messages, {"temperature": 1}))
+
+    def test_get_and_set_count_hits_and_misses(self):
+        cache = CompletionCache(self.cache_dir)
+        self.assertIsNone(cache.get("ab" * 32))
+        cache.set("ab" * 32, "cached answer")
+        self.assertEqual(cache.get("ab" * 32), "cached answer")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_expired_entries_are_misses(self):
+        cache = CompletionCache(self.cache_dir, ttl_seconds=60)
+        cache.set("cd" * 32, "old answer")
+        with patch('source.cache.time.time', return_value=time.time() + 120):
+            self.assertIsNone(cache.get("cd" * 32))
+        self.assertFalse(os.path.exists(cache._path("cd" * 32)))
+
+    def test_evict_removes_least_recently_used(self):
+        cache = CompletionCache(self.cache_dir, max_bytes=10 ** 6)
+        for index, key in enumerate(["aa" * 32, "bb" * 32, "cc" * 32]):
+            cache.set(key, "x" * 100)
+            os.utime(cache._path(key), (1000 + index, 1000 + index))
+        # Touch the oldest entry so it becomes the most recently used
+        cache.get("aa" * 32)
+        entry_size = os.path.getsize(cache._path("aa" * 32))
+        cache.max_bytes = 2 * entry_size + entry_size // 2
+        cache.evict()
+        self.assertTrue(os.path.exists(cache._path("aa" * 32)))
+        self.assertFalse(os.path.exists(cache._path("bb" * 32)))
+        self.assertTrue(os.path.exists(cache._path("cc" * 32)))
+
+    def test_set_walks_the_cache_only_when_it_is_full(self):
+        cache = CompletionCache(self.cache_dir, max_bytes=10 ** 6)
+        with patch('source.cache.os.walk', wraps=os.walk) as walk:
+            for index in range(20):
+                cache.set(f"{index:064x}", "x" * 100)
+            self.assertEqual(walk.call_count, 1)
+            # Entries differ by a byte or so with the length of their timestamp
+            cache.max_bytes = 5 * max(os.path.getsize(cache._path(f"{index:064x}")) for index in range(20))
+            cache.set(f"{20:064x}", "x" * 100)
+            self.assertEqual(walk.call_count, 2)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.cache_dir)), 5)
+
+    ### Tests for chat_completion ###
+
+    def test_chat_completion_uses_cache(self):
+        backend = MagicMock()
+        backend.complete.return_value = "answer"
+        cache = configure_cache(enabled=True, cache_dir=self.cache_dir)
+
+        messages = [{"role": "user", "content": "question"}]
+        with patch('source.llm._backend', backend):
+            self.assertEqual(chat_completion("gpt-4", messages), "answer")
+            self.assertEqual(chat_completion("gpt-4", messages), "answer")
+
+        backend.complete.assert_called_once_with("gpt-4", messages)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_chat_completion_without_cache(self):
+        backend = MagicMock()
+        backend.complete.return_value = "answer"
+        configure_cache(enabled=False)
+
+        messages = [{"role": "user", "content": "question"}]
+        with patch('source.llm._backend', backend):
+            chat_completion("gpt-4", messages)
+            chat_completion("gpt-4", messages)
+        self.assertEqual(backend.complete.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+import json
+import os
+import re
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from source.create_rules_utils import (
+    generate_rules,
+    generate_rules_from_chunk,
+    generate_rules_from_documents,
+    aggregate_rules,
+    curate_rules,
+    review_rules,
+    iter_markdown_sections,
+    section_hash,
+    split_markdown_into_sections,
+)
+from source.io import find_markdown_files
+from source.llm import LLMError
+from source.structured_output import StructuredOutputError
+from source.token_utils import estimate_tokens
+
+
+def per_section(extract):
+    """
+    Side effect for a mocked generate_rules_from_chunk that extracts every section on its own.
+    """
+    return lambda sections: [extract(text) for text in sections]
+
+
+class TestCreateRulesUtils(unittest.TestCase):
+
+    ### Tests for split_markdown_into_sections ###
+
+    def test_split_markdown_packs_small_sections_together(self):
+        markdown = "# Guide\n## Style\nUse 4 spaces.\n\nWrap at 79.\n## Naming\nUse snake_case.\n"
+        self.assertEqual(split_markdown_into_sections(markdown, max_tokens=1000),
+                         ["# Guide\n\n## Style\n\nUse 4 spaces.\n\nWrap at 79.\n\n# Guide\n\n## Naming\n\nUse snake_case."])
+
+    def test_sections_are_hashed_per_heading(self):
+        sections = [f"## Section {i}\n" + "\n\n".join(f"Paragraph {i}.{j} " + "word " * 15 for j in range(5))
+                    for i in range(5)]
+
+        def hashes():
+            return [section_hash(text) for path, text in iter_markdown_sections("# Guide\n" + "\n".join(sections), 60)
+                    if path[-1] != "## Section 0"]
+
+        before = hashes()
+        sections[0] = sections[0].replace("Paragraph 0.1", "Paragraph 0.1 " + "edit " * 30)
+        self.assertGreater(len(before), 4)
+        self.assertEqual(hashes(), before)
+
+    def test_split_markdown_does_not_send_a_trailing_heading_alone(self):
+        markdown = "# Guide\n" + "word " * 60 + "\n# Other\n"
+        chunks = split_markdown_into_sections(markdown, max_tokens=80)
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].endswith("# Other"))
+
+    def test_split_markdown_repeats_heading_context(self):
+        markdown = "# Guide\n## Style\n" + "\n\n".join(f"Paragraph {i} " + "word " * 20 for i in range(4))
+        chunks = split_markdown_into_sections(markdown, max_tokens=60)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith("# Guide\n\n## Style\n\n"))
+            self.assertLessEqual(estimate_tokens(chunk), 60)
+
+    def test_split_markdown_ignores_headings_in_code_fences(self):
+        markdown = "# Guide\n```bash\n# install\npip install x\n```\n"
+        self.assertEqual(split_markdown_into_sections(markdown),
+                         ["# Guide\n\n```bash\n# install\npip install x\n```"])
+
+    def test_split_markdown_splits_oversized_code_fence(self):
+        code = "\n".join(f"value_{i} = {i}" for i in range(100))
+        chunks = split_markdown_into_sections(f"# Code\n```python\n{code}\n```\n", max_tokens=80)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith("# Code\n\n```python\n"))
+            self.assertTrue(chunk.endswith("\n```"))
+        self.assertIn("value_99 = 99", chunks[-1])
+
+    def test_split_markdown_keeps_empty_headings(self):
+        markdown = "# Rules\n## Never commit secrets\n## Style\nUse 4 spaces.\n"
+        self.assertIn("## Never commit secrets", split_markdown_into_sections(markdown)[0])
+
+    ### Tests for generate_rules ###
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_concurrent_keeps_section_order(self, mock_generate, mock_review):
+        markdown = "".join(f"\n# Section {i}\nRule text {i}\n" + "x" * 3000 for i in range(6))
+
+        def slow_first(chunk):
+            # Earlier sections finish last
+            index = int(chunk.split("Rule text ")[1][0])
+            time.sleep(0.01 * (6 - index))
+            return [{"id": "1", "description": f"Rule {index}"}]
+
+        mock_generate.side_effect = per_section(slow_first)
+        mock_review.side_effect = lambda rules, keep: rules[:keep]
+        with patch('builtins.print'):
+            result = generate_rules(markdown, concurrency=4)
+
+        descriptions = [rule["description"] for rule in result["rules"]]
+        self.assertEqual(descriptions, [f"Rule {i}" for i in range(6)])
+        self.assertEqual([rule["id"] for rule in result["rules"]], ["1", "2", "3", "4", "5", "6"])
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_fails_on_unparsable_sections(self, mock_generate, mock_review):
+        def generate(chunk):
+            if "# A" in chunk:
+                raise StructuredOutputError("invalid JSON")
+            return [{"id": "1", "description": "Use snake_case."}]
+        mock_generate.side_effect = lambda sections: [generate(text) for text in sections]
+        markdown = "\n# A\n" + "a" * 3000 + "\n# B\n" + "b" * 3000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "rules.manifest.json")
+            with patch('builtins.print'), self.assertRaises(LLMError):
+                generate_rules(markdown, concurrency=2, manifest_path=manifest_path)
+            # The section that parsed is kept, so a rerun only extracts the failed one
+            with open(manifest_path) as f:
+                self.assertEqual(len(json.load(f)["sections"]), 1)
+        mock_review.assert_not_called()
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_only_extracts_changed_sections(self, mock_generate, mock_review):
+        mock_generate.side_effect = per_section(lambda text: [{"id": "1", "description": re.search(r"Rule \w+", text).group(0)}])
+        mock_review.side_effect = lambda rules, keep: rules[:keep]
+        before = "\n# A\nRule A\n" + "a" * 3000 + "\n# B\nRule B\n" + "b" * 3000
+        after = "\n# A\nRule A\n" + "a" * 3000 + "\n# B\nRule B2\n" + "b" * 3000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "rules.manifest.json")
+            with patch('builtins.print'):
+                first = generate_rules(before, manifest_path=manifest_path)
+                self.assertEqual(mock_generate.call_count, 2)
+                second = generate_rules(after, manifest_path=manifest_path)
+            self.assertEqual(mock_generate.call_count, 3)
+            with open(manifest_path) as f:
+                self.assertEqual(len(json.load(f)["sections"]), 2)
+
+        self.assertEqual(first["rules"], [{"id": "1", "description": "Rule A", "heading": "A"},
+                                          {"id": "2", "description": "Rule B", "heading": "B"}])
+        self.assertEqual(second["rules"], [{"id": "1", "description": "Rule A", "heading": "A"},
+                                           {"id": "3", "description": "Rule B2", "heading": "B"}])
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_packs_sections_and_reextracts_only_changed_ones(self, mock_generate, mock_review):
+        mock_generate.side_effect = per_section(lambda text: [{"id": "1", "description": re.search(r"Use \w+", text).group(0)}])
+        mock_review.side_effect = lambda rules, keep: rules[:keep]
+        sections = [f"## Rule {i}\nUse thing{i}.\n" for i in range(200)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "rules.manifest.json")
+            with patch('builtins.print'):
+                first = generate_rules("# Handbook\n" + "".join(sections), manifest_path=manifest_path)
+                self.assertLessEqual(mock_generate.call_count, 10)
+                mock_generate.reset_mock()
+                sections[100] = "## Rule 100\nUse other100.\n"
+                generate_rules("# Handbook\n" + "".join(sections), manifest_path=manifest_path)
+        mock_generate.assert_called_once_with(["# Handbook\n\n## Rule 100\n\nUse other100."])
+        self.assertEqual(len(first["rules"]), 24)
+        self.assertEqual(first["rules"][3], {"id": "4", "description": "Use thing3", "heading": "Handbook > Rule 3"})
+
+    @patch('source.create_rules_utils.complete_structured')
+    def test_generate_rules_from_chunk_returns_rules_per_section(self, mock_complete):
+        mock_complete.return_value = [{"id": "1", "description": "Use tabs.", "section": 2},
+                                      {"id": "2", "description": "Use names.", "section": 1},
+                                      {"id": "3", "description": "Made up.", "section": 7}]
+        self.assertEqual(generate_rules_from_chunk(["# A\n\nUse names.", "# B\n\nUse tabs."]),
+                         [[{"id": "2", "description": "Use names."}, {"id": "3", "description": "Made up."}],
+                          [{"id": "1", "description": "Use tabs."}]])
+        prompt = mock_complete.call_args[0][1][1]["content"]
+        self.assertIn("=== Section 1 ===\n# A\n\nUse names.\n\n=== Section 2 ===\n# B", prompt)
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_tags_rules_with_their_own_heading(self, mock_generate, mock_review):
+        mock_generate.side_effect = per_section(lambda text: [{"id": "1", "description": description}
+                                                              for description in re.findall(r"Rule \w+", text)])
+        mock_review.side_effect = lambda rules, keep: rules[:keep]
+        markdown = "# Guide\n## Style\nRule Indent\n## Tests\nRule Names\n### Fixtures\nRule Scope\n"
+        with patch('builtins.print'):
+            result = generate_rules(markdown)
+
+        # One request for all three sections, with every rule tagged with its own section
+        mock_generate.assert_called_once()
+        self.assertEqual([(rule["description"], rule["heading"]) for rule in result["rules"]],
+                         [("Rule Indent", "Guide > Style"), ("Rule Names", "Guide > Tests"),
+                          ("Rule Scope", "Guide > Tests > Fixtures")])
+
+    @patch('source.create_rules_utils.review_rules')
+    @patch('source.create_rules_utils.generate_rules_from_chunk')
+    def test_generate_rules_from_documents_tags_source_and_heading(self, mock_generate, mock_review):
+        mock_generate.side_effect = per_section(lambda text: [{"id": "1", "description": re.search(r"Rule \w+", text).group(0)}])
+        mock_review.side_effect = lambda rules, keep: rules[:keep]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "docs", "style"))
+            os.makedirs(os.path.join(tmp_dir, "docs", ".hidden"))
+            documents = {"README.md": "# Intro\nRule R\n", "docs/style/naming.md": "# Style\n## Naming\nRule N\n",
+                         "docs/api.markdown": "# API\nRule A\n", "docs/.hidden/x.md": "# X\nRule X\n",
+                         "docs/notes.txt": "Rule T\n"}
+            for name, content in documents.items():
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write(content)
+            readme = os.path.join(tmp_dir, "README.md")
+            paths = find_markdown_files([readme, os.path.join(tmp_dir, "docs"), os.path.join(tmp_dir, "*.md")])
+            self.assertEqual([os.path.relpath(path, tmp_dir) for path in paths],
+                             ["README.md", os.path.join("docs", "api.markdown"), os.path.join("docs", "style", "naming.md")])
+            with patch('builtins.print'):
+                result = generate_rules_from_documents(paths, concurrency=2, read_workers=2)
+        mock_generate.assert_called_once()
+
+        self.assertEqual([(rule["description"], rule["source"], rule["heading"]) for rule in result["rules"]],
+                         [("Rule R", paths[0], "Intro"), ("Rule A", paths[1], "API"), ("Rule N", paths[2], "Style > Naming")])
+
+    ### Tests for curate_rules ###
+
+    @patch('source.create_rules_utils.review_rules')
+    def test_curate_rules_reduces_in_rounds(self, mock_review):
+        rules = [{"id": str(i), "description": f"Rule number {i} " + "word " * 20, "heading": "Style"} for i in range(200)]
+        batches = []
+
+        def review(batch, keep):
+            batches.append(len(batch))
+            # Prefer the highest numbered rules
+            return sorted(batch, key=lambda rule: -int(rule["id"]))[:keep]
+
+        mock_review.side_effect = review
+        with patch('builtins.print'):
+            curated = curate_rules(rules, target=5, batch_tokens=400, concurrency=3)
+        self.assertEqual([rule["id"] for rule in curated], ["199", "198", "197", "196", "195"])
+        self.assertEqual(curated[0]["heading"], "Style")
+        self.assertGreater(len(batches), 2)
+        self.assertTrue(all(size * 35 <= 400 for size in batches))
+
+    @patch('source.create_rules_utils.complete_structured')
+    def test_review_rules_ignores_unknown_ids_and_keeps_fields(self, mock_complete):
+        rules = [{"id": "1", "description": "Use snake_case.", "source": "README.md"},
+                 {"id": "2", "description": "Avoid globals."}]
+        mock_complete.return_value = [{"id": "2", "description": "Avoid global state."}, {"id": "9", "description": "Made up."},
+                                      {"id": "1", "description": "Use snake_case."}]
+        self.assertEqual(review_rules(rules, keep=1), [rules[1]])
+        self.assertEqual(review_rules(rules, keep=5), [rules[1], rules[0]])
+
+    ### Tests for aggregate_rules ###
+
+    def test_aggregate_rules_keeps_previous_ids(self):
+        rules = [[{"description": "New rule"}, {"description": "Old rule"}], [{"description": "Old rule"}]]
+        aggregated = aggregate_rules(rules, previous_ids={"Old rule": "1", "Removed rule": "2"})
+        self.assertEqual(aggregated, [{"id": "3", "description": "New rule"}, {"id": "1", "description": "Old rule"}])
+
+    def test_aggregate_rules_merges_paraphrases(self):
+        rules = [[{"description": "Use meaningful variable names."}],
+                 [{"description": "Variable names should be meaningful."}, {"description": "Avoid global state."}]]
+        self.assertEqual(aggregate_rules(rules), [{"id": "1", "description": "Use meaningful variable names."},
+                                                  {"id": "2", "description": "Avoid global state."}])
+        self.assertEqual(len(aggregate_rules(rules, similarity_threshold=None)), 3)
+
+    def test_aggregate_rules_prefers_known_description_in_cluster(self):
+        rules = [[{"description": "Use meaningful variable names."}, {"description": "Variable names should be meaningful."}]]
+        aggregated = aggregate_rules(rules, previous_ids={"Variable names should be meaningful.": "7"})
+        self.assertEqual(aggregated, [{"id": "7", "description": "Variable names should be meaningful."}])
+
+
+if __name__ == '__main__':
+    unittest.main()
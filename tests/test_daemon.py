@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from source import llm
+from source.daemon import ReviewDaemon, ReviewService
+from source.daemon_client import DaemonUnavailable, is_running, send_request
+from source.llm import configure_llm
+
+diff_text = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,1 +1,2 @@\n x = 1\n+# TODO: remove\n"
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = patch.multiple(llm, _backend=None, _models=dict(llm.DEFAULT_MODELS))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        configure_llm(backend="fake")
+
+        self.rules_path = os.path.join(self.tmp_dir.name, 'rules.json')
+        with open(self.rules_path, 'w') as f:
+            json.dump({"rules": [{"id": "1", "description": "Remove unused code."}]}, f)
+        self.socket_path = os.path.join(self.tmp_dir.name, 'daemon.sock')
+        self.server = ReviewDaemon(self.socket_path)
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def review(self, **options):
+        request = {"command": "review", "diff": diff_text, "rules": self.rules_path, **options}
+        return list(send_request(request, self.socket_path, timeout=10))
+
+    def test_ping(self):
+        self.assertTrue(is_running(self.socket_path))
+        self.assertFalse(is_running(os.path.join(self.tmp_dir.name, 'missing.sock')))
+
+    def test_review_returns_issues(self):
+        events = self.review()
+        self.assertEqual(events[-1]["event"], "done")
+        self.assertEqual(events[-1]["issues"][0]["Line Number(s)"], "2")
+        self.assertEqual(events[-1]["backend"], "fake")
+
+    def test_review_streams_issues(self):
+        events = self.review(stream=True)
+        self.assertEqual([event["event"] for event in events], ["issue", "done"])
+
+    def test_bad_rules_file_reports_error(self):
+        events = list(send_request({"command": "review", "diff": diff_text, "rules": "/missing/rules.json"},
+                                   self.socket_path, timeout=10))
+        self.assertEqual(events[-1]["event"], "error")
+        self.assertTrue(is_running(self.socket_path))
+
+    def test_unavailable_daemon(self):
+        with self.assertRaises(DaemonUnavailable):
+            list(send_request({"command": "ping"}, os.path.join(self.tmp_dir.name, 'missing.sock')))
+
+    def test_identical_concurrent_reviews_are_coalesced(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_review(diff, rules, **kwargs):
+            calls.append(diff)
+            release.wait(5)
+            return [{"Message": "No issues found."}]
+
+        results = []
+        with patch('source.daemon.check_diff_sharded', side_effect=slow_review):
+            threads = [threading.Thread(target=lambda: results.append(self.review())) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            deadline = time.time() + 5
+            while self.server.service.stats()["reviews"] < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(10)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([events[-1]["event"] for events in results], ["done"] * 3)
+        self.assertEqual(self.server.service.stats()["coalesced"], 2)
+
+    def test_rules_are_reloaded_when_the_file_changes(self):
+        service = ReviewService()
+        rules, _ = service.load_rules(self.rules_path)
+        self.assertIn("Remove unused code.", rules)
+        with open(self.rules_path, 'w') as f:
+            json.dump({"rules": [{"id": "1", "description": "Use snake_case."}]}, f)
+        os.utime(self.rules_path, (time.time() + 10, time.time() + 10))
+        rules, _ = service.load_rules(self.rules_path)
+        self.assertIn("Use snake_case.", rules)
+
+
+if __name__ == '__main__':
+    unittest.main()
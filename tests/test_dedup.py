@@ -0,0 +1,57 @@
+import random
+import time
+import unittest
+
+from source.create_rules_utils import aggregate_rules
+from source.dedup import cluster_near_duplicates, is_negative, jaccard, shingles
+
+
+class TestDedup(unittest.TestCase):
+
+    def test_shingles_drop_stopwords_and_plurals(self):
+        self.assertEqual(shingles("Variable names should be meaningful."),
+                         frozenset({"variable", "name", "meaningful"}))
+
+    def test_jaccard(self):
+        self.assertEqual(jaccard(frozenset({"a", "b"}), frozenset({"b", "c"})), 1 / 3)
+        self.assertEqual(jaccard(frozenset(), frozenset({"a"})), 0.0)
+
+    def test_cluster_near_duplicates_groups_paraphrases(self):
+        texts = [
+            "Use meaningful variable names.",
+            "Use 4 spaces for indentation.",
+            "Variable names should be meaningful.",
+            "Use tabs for indentation.",
+            "Use meaningful names for variables.",
+        ]
+        self.assertEqual(cluster_near_duplicates(texts), [[0, 2, 4], [1], [3]])
+
+    def test_rules_are_not_merged_with_their_negation(self):
+        texts = [
+            "Use print statements for debugging output.",
+            "Do not use print statements for debugging output.",
+            "Functions must have type annotations.",
+            "Functions should not have type annotations.",
+            "Don't use print statements for debugging output.",
+        ]
+        self.assertEqual([is_negative(text) for text in texts], [False, True, False, True, True])
+        self.assertEqual(cluster_near_duplicates(texts), [[0], [1, 4], [2], [3]])
+        rules = [{"id": str(index), "description": text} for index, text in enumerate(texts[:4])]
+        self.assertEqual([rule["description"] for rule in aggregate_rules([rules])], texts[:4])
+
+    def test_cluster_near_duplicates_scales_to_thousands_of_rules(self):
+        rng = random.Random(0)
+        vocabulary = [f"word{i}" for i in range(2000)]
+        texts = [' '.join(rng.sample(vocabulary, 8)) for _ in range(3000)]
+        texts += [text + " always" for text in texts[:100]]
+
+        start = time.perf_counter()
+        clusters = cluster_near_duplicates(texts)
+        self.assertLess(time.perf_counter() - start, 10)
+
+        self.assertEqual(len(clusters), 3000)
+        self.assertIn([0, 3000], clusters)
+
+
+if __name__ == '__main__':
+    unittest.main()
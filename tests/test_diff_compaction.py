@@ -0,0 +1,101 @@
+import unittest
+
+from source.diff_compaction import compact_diff
+from source.diff_utils import parse_diff
+from source.local_checks import added_lines
+
+CONTEXT_DIFF = """diff --git a/app.js b/app.js
+--- a/app.js
++++ b/app.js
+@@ -1,13 +1,13 @@ function main() {
+ a = 1
+ b = 2
+ c = 3
+-d = 4
++d = 5
+ e = 5
+ f = 6
+ g = 7
+ h = 8
+ i = 9
+-  j = 10
++  j  =  10 
+ k = 11
+-l = 12
++l = 13
+ m = 13"""
+
+MOVE_DIFF = """diff --git a/a.py b/a.py
+--- a/a.py
++++ b/a.py
+@@ -1,5 +1,2 @@
+ x = 1
+-def helper():
+-    value = 1
+-    return value
+ y = 2
+diff --git a/b.py b/b.py
+--- a/b.py
++++ b/b.py
+@@ -3,2 +3,5 @@
+ z = 1
++def helper():
++    value = 1
++    return value
+ w = 2"""
+
+
+def added_by_file(diff_text):
+    return {file_diff.path: added_lines(file_diff) for file_diff in parse_diff(diff_text)}
+
+
+class TestDiffCompaction(unittest.TestCase):
+
+    def test_context_is_trimmed_around_changes(self):
+        compacted = compact_diff(CONTEXT_DIFF, context_radius=1)
+        hunks = parse_diff(compacted)[0].hunks
+        self.assertEqual([hunk.header for hunk in hunks], ["@@ -3,3 +3,3 @@ function main() {", "@@ -11,3 +11,3 @@"])
+        self.assertNotIn("a = 1", compacted)
+        # The whitespace-only change to j became context
+        self.assertNotIn("-  j = 10", compacted)
+
+    def test_added_lines_keep_their_new_file_line_numbers(self):
+        for radius in (0, 1, 2):
+            self.assertEqual(added_by_file(compact_diff(CONTEXT_DIFF, radius)),
+                             {"app.js": {4: "d = 5", 12: "l = 13"}})
+
+    def test_moved_blocks_are_collapsed(self):
+        compacted = compact_diff(MOVE_DIFF)
+        self.assertIn("\\ 3 lines moved to b.py lines 4-6 without changes", compacted)
+        self.assertIn("\\ 3 lines moved here from a.py lines 2-4 without changes", compacted)
+        self.assertNotIn("helper", compacted)
+
+    def test_whitespace_only_and_deletion_hunks_are_summarised(self):
+        diff = ("diff --git a/a.js b/a.js\n--- a/a.js\n+++ b/a.js\n@@ -1,3 +1,3 @@\n x\n-  y = 1;\n+  y=1;  \n z\n"
+                "@@ -10,3 +10,2 @@\n p\n-q\n r")
+        self.assertEqual(parse_diff(compact_diff(diff))[0].hunks[0].lines, ["\\ Whitespace-only changes"])
+        self.assertEqual(parse_diff(compact_diff(diff))[0].hunks[1].lines, ["\\ 1 line removed"])
+
+    def test_indentation_changes_are_kept(self):
+        diff = ("diff --git a/{name} b/{name}\n--- a/{name}\n+++ b/{name}\n@@ -1,3 +1,3 @@\n if user.is_admin:\n"
+                "-    delete_everything()\n+delete_everything()\n log()")
+        for name in ("app.py", "app.js"):
+            compacted = compact_diff(diff.format(name=name))
+            self.assertNotIn("Whitespace-only", compacted)
+            self.assertIn("-    delete_everything()\n+delete_everything()", compacted)
+
+    def test_whitespace_changes_are_kept_in_indentation_sensitive_files(self):
+        diff = ("diff --git a/{name} b/{name}\n--- a/{name}\n+++ b/{name}\n@@ -1,3 +1,3 @@\n x\n-y: [1, 2]\n+y: [1,2]\n z")
+        for name in ("config.yaml", "app.py", "Makefile"):
+            self.assertIn("-y: [1, 2]\n+y: [1,2]", compact_diff(diff.format(name=name)))
+        self.assertIn("Whitespace-only", compact_diff(diff.format(name="config.json")))
+
+    def test_deleted_files_keep_only_their_header(self):
+        diff = ("diff --git a/old.py b/old.py\ndeleted file mode 100644\n--- a/old.py\n+++ /dev/null\n"
+                "@@ -1,2 +0,0 @@\n-a\n-b")
+        self.assertEqual(compact_diff(diff),
+                         "diff --git a/old.py b/old.py\ndeleted file mode 100644\n\\ File deleted (2 lines)")
+
+
+if __name__ == '__main__':
+    unittest.main()
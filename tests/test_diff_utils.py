@@ -0,0 +1,78 @@
+import unittest
+
+from source.diff_utils import parse_diff, iter_file_diffs, pack_diff_shards
+
+SAMPLE_DIFF = """diff --git a/app.py b/app.py
+index 1111111..2222222 100644
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ import os
++import sys
+ x = 1
+@@ -10,2 +11,2 @@ def main():
+-    return 1
++    return 2
+diff --git a/new.py b/new.py
+new file mode 100644
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1 @@
++print('hi')
+diff --git a/logo.png b/logo.png
+Binary files a/logo.png and b/logo.png differ"""
+
+
+class TestDiffUtils(unittest.TestCase):
+
+    ### Tests for parse_diff ###
+
+    def test_parse_diff_files_and_hunks(self):
+        files = parse_diff(SAMPLE_DIFF)
+        self.assertEqual([f.path for f in files], ["app.py", "new.py", "logo.png"])
+        self.assertEqual(len(files[0].hunks), 2)
+        self.assertEqual(files[0].hunks[1].lines, ["-    return 1", "+    return 2"])
+        self.assertEqual(files[2].hunks, [])
+
+    def test_parse_diff_round_trips_text(self):
+        files = parse_diff(SAMPLE_DIFF)
+        self.assertEqual('\n'.join(f.text() for f in files), SAMPLE_DIFF)
+
+    def test_parse_diff_marks_binary_files(self):
+        files = parse_diff(SAMPLE_DIFF)
+        self.assertEqual([f.binary for f in files], [False, False, True])
+        self.assertIn("Binary files a/logo.png and b/logo.png differ", files[2].header())
+
+    def test_iter_file_diffs_truncates_large_files(self):
+        lines = SAMPLE_DIFF.splitlines()
+        files = list(iter_file_diffs(lines, max_file_bytes=120))
+        self.assertTrue(files[0].truncated)
+        self.assertNotIn("+    return 2", files[0].text())
+        self.assertFalse(files[1].truncated)
+        self.assertIn("+print('hi')", files[1].text())
+
+    def test_iter_file_diffs_is_lazy(self):
+        def lines():
+            yield from SAMPLE_DIFF.splitlines()[:13]
+            raise AssertionError("read past the first file")
+
+        files = iter_file_diffs(lines())
+        self.assertEqual(next(files).path, "app.py")
+
+    ### Tests for pack_diff_shards ###
+
+    def test_pack_diff_shards_single_shard_when_within_budget(self):
+        self.assertEqual(pack_diff_shards(SAMPLE_DIFF, max_tokens=10000), [SAMPLE_DIFF])
+
+    def test_pack_diff_shards_splits_at_hunk_boundaries(self):
+        shards = pack_diff_shards(SAMPLE_DIFF, max_tokens=40)
+        self.assertGreater(len(shards), 1)
+        for shard in shards:
+            self.assertTrue(shard.startswith("diff --git "))
+        # Every changed line ends up in exactly one shard
+        for line in ["+import sys", "+    return 2", "+print('hi')"]:
+            self.assertEqual(sum(line in shard for shard in shards), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
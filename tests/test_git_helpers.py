@@ -0,0 +1,69 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from source.git_helpers import git_show_file, iter_git_diff
+
+
+class TestGitHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        for command in (['git', 'init', '-q'], ['git', 'config', 'user.email', 'test@example.com'],
+                        ['git', 'config', 'user.name', 'Test']):
+            subprocess.run(command, check=True)
+        self._write('base.py', 'x = 1\n')
+        subprocess.run(['git', 'add', '.'], check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', 'base'], check=True)
+        subprocess.run(['git', 'branch', '-q', 'base'], check=True)
+
+    def tearDown(self):
+        os.chdir(self.previous_cwd)
+        self.tmp_dir.cleanup()
+
+    def _write(self, path, content, mode='w'):
+        with open(path, mode) as f:
+            f.write(content)
+
+    ### Tests for iter_git_diff ###
+
+    def test_iter_git_diff_streams_staged_files(self):
+        self._write('base.py', 'x = 2\n')
+        self._write('package.lock', 'lock\n' * 10)
+        self._write('image.bin', b'\x00\x01\x02', mode='wb')
+        self._write('big.py', 'y = 1\n' * 1000)
+        subprocess.run(['git', 'add', '.'], check=True)
+
+        files = {f.path: f for f in iter_git_diff('base', excludes=['*.lock'], max_file_bytes=2000)}
+
+        self.assertEqual(sorted(files), ['base.py', 'big.py', 'image.bin'])
+        self.assertIn('+x = 2', files['base.py'].text())
+        self.assertTrue(files['image.bin'].binary)
+        self.assertTrue(files['big.py'].truncated)
+        self.assertLess(len(files['big.py'].text()), 2000)
+
+    def test_iter_git_diff_covers_the_whole_repository_from_a_subdirectory(self):
+        os.mkdir('sub')
+        self._write('sub/s.txt', 's\n')
+        self._write('top.txt', 't\n')
+        self._write('sub/skip.lock', 'lock\n')
+        subprocess.run(['git', 'add', '.'], check=True)
+        os.chdir('sub')
+        self.assertEqual(sorted(f.path for f in iter_git_diff('base', excludes=['*.lock'])), ['sub/s.txt', 'top.txt'])
+
+    ### Tests for git_show_file ###
+
+    def test_git_show_file_reads_index_and_revisions(self):
+        self._write('base.py', 'x = 2\n')
+        subprocess.run(['git', 'add', 'base.py'], check=True)
+        self._write('base.py', 'x = 3\n')
+        self.assertEqual(git_show_file('base.py'), 'x = 2\n')
+        self.assertEqual(git_show_file('base.py', rev='base'), 'x = 1\n')
+        self.assertIsNone(git_show_file('missing.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
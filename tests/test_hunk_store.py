@@ -0,0 +1,123 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from source.diff_utils import parse_diff
+from source.hunk_store import (
+    HUNK_STORE_DIR,
+    HunkReviewStore,
+    default_hunk_store_path,
+    hunk_key,
+    rules_hash,
+    shift_line_numbers,
+)
+from source.llm import get_model
+from source.review_utils import check_diff_incremental
+
+DIFF_V1 = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ import os
++import sys
+ x = 1
+@@ -20,2 +21,2 @@ def main():
+-    return 1
++    return 2"""
+
+# The first hunk changed, the second hunk only moved down by one line
+DIFF_V2 = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,4 @@
+ import os
++import sys
++import re
+ x = 1
+@@ -20,2 +22,2 @@ def main():
+-    return 1
++    return 2"""
+
+
+class TestHunkStore(unittest.TestCase):
+
+    def test_hunk_key_ignores_header_and_trailing_whitespace(self):
+        first = parse_diff(DIFF_V1)[0]
+        second = parse_diff(DIFF_V2.replace("+    return 2", "+    return 2   "))[0]
+        self.assertEqual(hunk_key(first, first.hunks[1], "rules", "gpt-4"),
+                         hunk_key(second, second.hunks[1], "rules", "gpt-4"))
+        self.assertNotEqual(hunk_key(first, first.hunks[0], "rules", "gpt-4"),
+                            hunk_key(second, second.hunks[0], "rules", "gpt-4"))
+        self.assertNotEqual(hunk_key(first, first.hunks[1], "rules", "gpt-4"),
+                            hunk_key(first, first.hunks[1], "other rules", "gpt-4"))
+
+    def test_default_path_is_per_repository(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first, second = os.path.join(tmp_dir, 'first'), os.path.join(tmp_dir, 'second')
+            for root in (first, second):
+                subprocess.run(['git', 'init', '-q', root], check=True)
+            os.makedirs(os.path.join(first, 'src'))
+            path = default_hunk_store_path(first)
+            self.assertEqual(os.path.dirname(path), HUNK_STORE_DIR)
+            self.assertEqual(default_hunk_store_path(os.path.join(first, 'src')), path)
+            self.assertNotEqual(default_hunk_store_path(second), path)
+
+    def test_shift_line_numbers(self):
+        issues = [{"Rule Violated": "R1", "Line Number(s)": "Lines 21-23"}]
+        self.assertEqual(shift_line_numbers(issues, 1), [{"Rule Violated": "R1", "Line Number(s)": "Lines 22-24"}])
+
+    def test_store_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "store", "hunks.json")
+            store = HunkReviewStore(path)
+            store.set("key", 10, [{"Rule Violated": "R1", "Line Number(s)": "12"}])
+            store.save()
+            reloaded = HunkReviewStore(path)
+            self.assertEqual(reloaded.get("key", 12), [{"Rule Violated": "R1", "Line Number(s)": "14"}])
+            self.assertIsNone(reloaded.get("missing", 1))
+            self.assertEqual((reloaded.hits, reloaded.misses), (1, 1))
+
+    @patch('source.review_utils.check_diff_with_gpt')
+    def test_check_diff_incremental_only_reviews_changed_hunks(self, mock_check):
+        def review(piece, rules):
+            if "return 2" in piece:
+                return [{"Rule Violated": "R1", "Line Number(s)": "21", "Issue Description": "Magic number"}]
+            return [{"Message": "No issues found."}]
+
+        mock_check.side_effect = review
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "hunks.json")
+            with patch('builtins.print'):
+                check_diff_incremental(DIFF_V1, "1. R1", HunkReviewStore(path))
+                self.assertEqual(mock_check.call_count, 1)
+                issues = check_diff_incremental(DIFF_V2, "1. R1", HunkReviewStore(path))
+        self.assertEqual(mock_check.call_count, 2)
+        self.assertNotIn("return 2", mock_check.call_args[0][0])
+        self.assertEqual(issues, [{"Rule Violated": "R1", "Line Number(s)": "22", "Issue Description": "Magic number"}])
+
+    @patch('source.review_utils.check_diff_with_gpt')
+    def test_check_diff_incremental_packs_hunks_and_stores_issues_per_hunk(self, mock_check):
+        diff = DIFF_V1 + "\ndiff --git a/lib.py b/lib.py\n--- a/lib.py\n+++ b/lib.py\n@@ -5,1 +5,1 @@\n-y = 1\n+y = 2"
+        mock_check.return_value = [
+            {"Rule Violated": "R1", "Line Number(s)": "5", "Issue Description": "Magic number in lib.py"},
+            {"Rule Violated": "R1", "Line Number(s)": "Lines 21-22", "Issue Description": "Magic number"},
+            {"Rule Violated": "R2", "Line Number(s)": "2", "Issue Description": "Unused import in app.py"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "hunks.json")
+            with patch('builtins.print'):
+                check_diff_incremental(diff, "1. R1", HunkReviewStore(path), max_shard_tokens=10 ** 6,
+                                       context_radius=None)
+            self.assertEqual(mock_check.call_count, 1)
+            store = HunkReviewStore(path)
+            file_diffs = parse_diff(diff)
+            stored = [store.get(hunk_key(file_diff, hunk, rules_hash("1. R1"), get_model("review")), hunk.new_start())
+                      for file_diff in file_diffs for hunk in file_diff.hunks]
+        self.assertEqual([[issue["Rule Violated"] for issue in issues] for issues in stored], [["R2"], ["R1"], ["R1"]])
+        self.assertEqual(stored[2][0]["Issue Description"], "Magic number in lib.py")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from source import llm
+from source.create_rules_utils import generate_rules
+from source.fake_llm import FakeBackend
+from source.llm import OpenAIBackend, configure_llm, create_backend, get_model
+from source.review_utils import check_diff_with_gpt
+
+
+class TestLLM(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.multiple(llm, _backend=None, _models=dict(llm.DEFAULT_MODELS))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend("openai"), OpenAIBackend)
+        self.assertIsInstance(create_backend("fake"), FakeBackend)
+        with self.assertRaises(ValueError):
+            create_backend("unknown")
+
+    def test_configure_llm_overrides_models(self):
+        self.assertEqual(get_model("extract"), "gpt-4o")
+        configure_llm(backend="fake", model="local-model")
+        self.assertEqual({get_model(kind) for kind in llm.DEFAULT_MODELS}, {"local-model"})
+
+    def test_openai_backend_shares_one_client(self):
+        backend = OpenAIBackend(pool_size=4, timeout=5)
+        with patch.dict('os.environ', {"OPENAI_API_KEY": "test"}):
+            self.assertIs(backend.client, backend.client)
+        self.assertEqual(backend.client.timeout, 5)
+
+    ### Tests for FakeBackend ###
+
+    def test_fake_backend_extracts_rules_offline(self):
+        backend = configure_llm(backend="fake")
+        markdown = "# Style\n- Use snake_case for names.\n- The project started in 2020.\n"
+        with patch('builtins.print'):
+            rules = generate_rules(markdown)
+        self.assertEqual(rules, {"rules": [{"id": "1", "description": "Use snake_case for names.", "heading": "Style"}]})
+        self.assertEqual(backend.calls, 2)  # Extraction and curation
+
+    def test_fake_backend_reviews_diff_offline(self):
+        configure_llm(backend="fake")
+        diff_text = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,1 +1,2 @@\n x = 1\n+# TODO: remove\n"
+        issues = check_diff_with_gpt(diff_text, "1. Remove unused code.")
+        self.assertEqual(len(issues), 1)
+        self.assertEqual(issues[0]["Line Number(s)"], "2")
+
+    def test_fake_backend_is_deterministic(self):
+        backend = FakeBackend()
+        messages = [{"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": "Git diff:\n+ok = True\n"}]
+        self.assertEqual(backend.complete("m", messages), "No issues found.")
+        self.assertEqual(backend.complete("m", messages), backend.complete("other", messages))
+        curated = backend.complete("m", [{"role": "system", "content": "reviewing coding guidelines"},
+                                         {"role": "user", "content": "Coding Guidelines:\n[{'id': '1', 'description': 'x'}]"}])
+        self.assertEqual(json.loads(curated), {"rules": [{"id": "1", "description": "x"}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import patch
+
+from source.diff_utils import parse_diff
+from source.local_checks import PythonFile, added_lines, is_local_rule, run_local_checks
+from source.review_utils import check_diff_sharded
+
+indentation_rule = {"id": "R2", "description": "Indent with 4 spaces.", "check": "indentation"}
+pep8_rule = {"id": "R7", "description": "Follow PEP 8.", "check": "pep8"}
+imports_rule = {"id": "R9", "description": "Remove unused code.", "check": "unused_imports"}
+
+new_source = (
+    "import os\n"
+    "import sys\n"
+    "from typing import Optional\n"
+    "\n"
+    "def run(path: 'Optional[str]'):\n"
+    "    value = os.path.join(path,\n"
+    "                         'x')\n"
+    "    \n"
+    "    if value == None: return\n"
+    "    try:\n"
+    "        pass\n"
+    "    except:\n"
+    "        pass\n"
+    "    doc = '''\n"
+    "  free text\n"
+    "'''\n"
+    "if os:\n"
+    "   run(None)\n"
+)
+
+
+def diff_for(source, path='a.py'):
+    """
+    Diff adding every line of `source` to a new file.
+    """
+    lines = source.splitlines()
+    return '\n'.join([f"diff --git a/{path} b/{path}", "new file mode 100644", "--- /dev/null", f"+++ b/{path}",
+                      f"@@ -0,0 +1,{len(lines)} @@"] + ['+' + line for line in lines])
+
+
+def issues_by_line(issues):
+    return {issue["Issue Description"]: issue["Line Number(s)"] for issue in issues}
+
+
+class TestLocalChecks(unittest.TestCase):
+
+    def test_added_lines_use_new_file_numbers(self):
+        diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -10,3 +10,3 @@\n x = 1\n-y = 2\n+y = 3\n z = 4"
+        self.assertEqual(added_lines(parse_diff(diff)[0]), {11: "y = 3"})
+
+    def test_indentation_skips_continuation_lines_and_strings(self):
+        issues = run_local_checks(parse_diff(diff_for(new_source)), [indentation_rule], lambda path: new_source)
+        self.assertEqual(issues_by_line(issues), {"a.py: Indentation is not a multiple of 4 spaces (E111)": "18"})
+        self.assertEqual(issues[0]["Rule Violated"], "R2. Indent with 4 spaces.")
+
+    def test_pep8(self):
+        issues = run_local_checks(parse_diff(diff_for(new_source)), [pep8_rule], lambda path: new_source)
+        self.assertEqual(issues_by_line(issues), {
+            "a.py: Trailing whitespace (W291)": "8",
+            "a.py: Comparison to None with == or != (E711)": "9",
+            "a.py: Multiple statements on one line (colon) (E701)": "9",
+            "a.py: Bare except clause (E722)": "12",
+        })
+
+    def test_line_length_option(self):
+        diff = diff_for("x = 'long enough'\n")
+        rule = dict(pep8_rule, check_options={"max_line_length": 10})
+        self.assertEqual(issues_by_line(run_local_checks(parse_diff(diff), [rule])),
+                         {"a.py: Line longer than 10 characters (E501)": "1"})
+
+    def test_unused_imports_need_the_source(self):
+        issues = run_local_checks(parse_diff(diff_for(new_source)), [imports_rule], lambda path: new_source)
+        self.assertEqual(issues_by_line(issues), {"a.py: 'sys' imported but unused (F401)": "2"})
+        self.assertEqual(run_local_checks(parse_diff(diff_for(new_source)), [imports_rule]), [])
+
+    def test_source_that_disagrees_with_the_diff_is_ignored(self):
+        python_file = PythonFile('a.py', {1: "import sys"}, "import os\n")
+        self.assertIsNone(python_file.source)
+
+    def test_only_python_files_and_local_rules(self):
+        diff = diff_for("\tx = 1\n", path='notes.txt')
+        self.assertEqual(run_local_checks(parse_diff(diff), [indentation_rule]), [])
+        self.assertFalse(is_local_rule({"id": "R1", "description": "Names.", "check": "unknown"}))
+
+    def test_scoped_rules_only_check_their_paths(self):
+        rule = dict(pep8_rule, paths=["backend/"], check_options={"max_line_length": 10})
+        diff = diff_for("x = 'long enough'\n", path='tools/a.py') + '\n' + diff_for("x = 'long enough'\n", path='backend/a.py')
+        self.assertEqual(issues_by_line(run_local_checks(parse_diff(diff), [rule])),
+                         {"backend/a.py: Line longer than 10 characters (E501)": "1"})
+
+    @patch('source.review_utils.check_diff_with_gpt')
+    def test_llm_is_skipped_when_every_rule_is_local(self, mock_check):
+        issues = check_diff_sharded(diff_for("import sys\n"), "", local_rules=[imports_rule],
+                                    read_source=lambda path: "import sys\n")
+        mock_check.assert_not_called()
+        self.assertEqual(issues_by_line(issues), {"a.py: 'sys' imported but unused (F401)": "1"})
+
+    @patch('source.review_utils.check_diff_with_gpt')
+    def test_local_issues_are_merged_with_the_review(self, mock_check):
+        mock_check.return_value = [{"Rule Violated": "R1", "Line Number(s)": "1", "Issue Description": "Bad name"}]
+        issues = check_diff_sharded(diff_for("import sys\n"), "R1. Names.", local_rules=[imports_rule],
+                                    read_source=lambda path: "import sys\n")
+        self.assertEqual([issue["Issue Description"] for issue in issues],
+                         ["a.py: 'sys' imported but unused (F401)", "Bad name"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from source import llm, profiling
+from source.llm import chat_completion, configure_llm
+from source.cache import CompletionCache
+from source.profiling import Tracer, estimate_cost, span, annotate
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+        patcher = patch.object(profiling, '_tracer', self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_tracer_records_nothing(self):
+        with span("stage") as record:
+            annotate(prompt_tokens=10)
+        self.assertIsNone(record)
+        self.assertEqual(self.tracer.spans, [])
+
+    def test_nested_spans_and_annotate(self):
+        self.tracer.enable()
+        with span("outer", model="gpt-4"):
+            with span("inner"):
+                annotate(prompt_tokens=5)
+            annotate(completion_tokens=7)
+        inner, outer = self.tracer.spans
+        self.assertEqual(inner["name"], "inner")
+        self.assertEqual(inner["prompt_tokens"], 5)
+        self.assertEqual(outer["completion_tokens"], 7)
+        self.assertEqual(outer["model"], "gpt-4")
+        self.assertGreaterEqual(outer["duration"], inner["duration"])
+
+    def test_summary_sums_attributes_per_stage(self):
+        self.tracer.enable()
+        for tokens in (3, 4):
+            with span("llm_call"):
+                annotate(prompt_tokens=tokens, cache_hit=0)
+        with span("git_diff"):
+            pass
+        summary = self.tracer.summary()
+        self.assertEqual(summary["llm_call"]["count"], 2)
+        self.assertEqual(summary["llm_call"]["prompt_tokens"], 7)
+        self.assertNotIn("prompt_tokens", summary["git_diff"])
+        self.assertIn("llm_call", self.tracer.summary_table())
+
+    def test_write_json(self):
+        self.tracer.enable()
+        with span("stage"):
+            pass
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'profile.json')
+            self.tracer.write_json(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                trace = json.load(f)
+        self.assertEqual([record["name"] for record in trace["spans"]], ["stage"])
+        self.assertEqual(trace["summary"]["stage"]["count"], 1)
+
+    def test_estimate_cost(self):
+        self.assertAlmostEqual(estimate_cost("gpt-4", 1_000_000, 0), 30.0)
+        self.assertIsNone(estimate_cost("unknown-model", 10, 10))
+
+    def test_llm_call_span_records_tokens_and_cache_hits(self):
+        self.tracer.enable()
+        messages = [{"role": "system", "content": "You review diffs."}, {"role": "user", "content": "Git diff:\n+x = 1"}]
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch.multiple(llm, _backend=None, _models=dict(llm.DEFAULT_MODELS)), \
+                patch('source.llm.get_cache', return_value=CompletionCache(tmp_dir)):
+            configure_llm(backend="fake")
+            chat_completion("gpt-4", messages)
+            chat_completion("gpt-4", messages)
+        miss, hit = self.tracer.spans
+        self.assertEqual(miss["cache_hit"], 0)
+        self.assertGreater(miss["prompt_tokens"], 0)
+        self.assertGreater(miss["cost_usd"], 0)
+        self.assertEqual(hit["cache_hit"], 1)
+        self.assertNotIn("prompt_tokens", hit)
+
+
+if __name__ == '__main__':
+    unittest.main()
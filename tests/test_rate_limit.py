@@ -0,0 +1,136 @@
+import random
+import unittest
+from unittest.mock import patch, MagicMock
+
+from source.llm import TransientLLMError, _retry_after, chat_completion
+from source.rate_limit import AdaptiveConcurrency, RetryableError, Scheduler, TokenBucket
+
+
+class FakeClock:
+    """
+    Clock whose sleep advances time instantly.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def scheduler(self, **options):
+        return Scheduler(clock=self.clock, sleep=self.clock.sleep, rng=random.Random(0), **options)
+
+    ### Tests for TokenBucket ###
+
+    def test_token_bucket_waits_for_refill(self):
+        bucket = TokenBucket(60, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(bucket.acquire(60), 0)
+        self.assertAlmostEqual(bucket.acquire(3), 3.0)
+        self.assertAlmostEqual(self.clock.now, 3.0)
+
+    def test_token_bucket_caps_oversized_requests(self):
+        bucket = TokenBucket(60, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(bucket.acquire(1000), 0)
+        self.assertAlmostEqual(bucket.acquire(1), 1.0)
+
+    ### Tests for AdaptiveConcurrency ###
+
+    def test_concurrency_halves_once_per_burst_and_recovers(self):
+        limiter = AdaptiveConcurrency(8, clock=self.clock)
+        started = [limiter.acquire() for _ in range(3)]
+        self.clock.now = 1.0
+        for start in started:
+            limiter.on_throttle(start)
+            limiter.release()
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(4):
+            limiter.on_success()
+        self.assertEqual(limiter.limit, 5)
+
+    ### Tests for Scheduler ###
+
+    def test_scheduler_retries_with_backoff(self):
+        scheduler = self.scheduler(max_retries=3, base_delay=1.0)
+        fn = MagicMock(side_effect=[RetryableError("503"), RetryableError("503"), "ok"])
+        self.assertEqual(scheduler.call(fn), "ok")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(scheduler.retries, 2)
+        self.assertLessEqual(self.clock.sleeps[0], 1.0)
+        self.assertLessEqual(self.clock.sleeps[1], 2.0)
+
+    def test_scheduler_honours_retry_after_and_throttles(self):
+        scheduler = self.scheduler(max_concurrency=8)
+        fn = MagicMock(side_effect=[RetryableError("429", throttled=True, retry_after=7), "ok"])
+        self.assertEqual(scheduler.call(fn), "ok")
+        self.assertEqual(self.clock.sleeps, [7])
+        self.assertEqual(scheduler.concurrency.limit, 4)
+        self.assertEqual(scheduler.concurrency.in_flight, 0)
+
+    def test_scheduler_gives_up_after_max_retries(self):
+        scheduler = self.scheduler(max_retries=2)
+        fn = MagicMock(side_effect=RetryableError("503"))
+        with self.assertRaises(RetryableError):
+            scheduler.call(fn)
+        self.assertEqual(fn.call_count, 3)
+
+    def test_scheduler_does_not_retry_other_errors(self):
+        scheduler = self.scheduler()
+        fn = MagicMock(side_effect=KeyError("bad"))
+        with self.assertRaises(KeyError):
+            scheduler.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(scheduler.concurrency.in_flight, 0)
+
+    def test_scheduler_applies_requests_per_minute(self):
+        scheduler = self.scheduler(requests_per_minute=2)
+        for _ in range(3):
+            scheduler.call(lambda: None)
+        self.assertAlmostEqual(self.clock.now, 30.0)
+
+    def test_scheduler_stream_retries_only_before_first_piece(self):
+        scheduler = self.scheduler()
+        attempts = []
+
+        def stream():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RetryableError("connection reset")
+            yield "a"
+            raise RetryableError("connection reset")
+
+        pieces = []
+        with self.assertRaises(RetryableError):
+            for piece in scheduler.stream(stream):
+                pieces.append(piece)
+        self.assertEqual(pieces, ["a"])
+        self.assertEqual(len(attempts), 2)
+
+    ### Tests for the LLM integration ###
+
+    def test_retry_after_headers(self):
+        self.assertEqual(_retry_after(MagicMock(headers={"retry-after": "3"})), 3.0)
+        self.assertEqual(_retry_after(MagicMock(headers={"retry-after-ms": "250"})), 0.25)
+        self.assertIsNone(_retry_after(MagicMock(headers={})))
+
+    def test_chat_completion_retries_transient_errors(self):
+        backend = MagicMock()
+        backend.complete.side_effect = [TransientLLMError("429", throttled=True, retry_after=0), "answer"]
+        with patch('source.llm._backend', backend), \
+                patch('source.llm.get_scheduler', return_value=self.scheduler()):
+            self.assertEqual(chat_completion("gpt-4", [{"role": "user", "content": "hi"}]), "answer")
+        self.assertEqual(backend.complete.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from source.result_store import ReviewResultStore, issue_path, issue_rule_id, record_from_issues, settings_key
+
+ISSUES = [
+    {"Rule Violated": "R2. Indent with 4 spaces.", "Line Number(s)": "3", "Issue Description": "app/a.py: Tabs (W191)"},
+    {"Rule Violated": "R1", "Line Number(s)": "7", "Issue Description": "Unclear name in web/b.ts"},
+    {"Rule Violated": "Use meaningful names", "Line Number(s)": "9", "Issue Description": "Name x"},
+]
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'results', 'reviews.sqlite')
+        self.settings = settings_key(rules="digest", model="gpt-4")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _store_reviews(self):
+        store = ReviewResultStore(self.path)
+        store.add(record_from_issues("feature", ["app/a.py", "web/b.ts"], ISSUES), self.settings,
+                  commit="abc123", base="000111", author="Ada <ada@example.com>")
+        store.add(record_from_issues("staged", ["app/a.py"], ISSUES[:1]), self.settings, diff="hash", author="Bob <bob@example.com>")
+        store.add(record_from_issues("clean", ["app/c.py"], [{"Message": "No issues found."}]), self.settings,
+                  commit="def456", base="000111")
+        self.assertEqual(len(store.pending), 3)
+        store.close()
+
+    def test_rule_ids_and_paths_are_taken_from_issues(self):
+        self.assertEqual([issue_rule_id(issue) for issue in ISSUES], ["R2", "R1", None])
+        paths = ["app/a.py", "web/b.ts"]
+        self.assertEqual([issue_path(issue, paths) for issue in ISSUES], ["app/a.py", "web/b.ts", None])
+        self.assertEqual(issue_path(ISSUES[2], ["only.py"]), "only.py")
+
+    def test_reviews_are_found_by_commit_or_diff_under_the_same_settings(self):
+        self._store_reviews()
+        store = ReviewResultStore(self.path)
+        found = store.find(self.settings, commit="abc123", base="000111")
+        self.assertEqual(found["status"], "issues")
+        self.assertEqual(found["issues"], ISSUES)
+        self.assertEqual(store.find(self.settings, commit="def456", base="000111")["status"], "clean")
+        self.assertEqual(store.find(self.settings, diff="hash")["issues"], ISSUES[:1])
+        self.assertIsNone(store.find(self.settings, commit="abc123", base="999999"))
+        self.assertIsNone(store.find(settings_key(rules="digest", model="gpt-4o"), commit="abc123", base="000111"))
+        self.assertEqual(store.hits, 3)
+        store.close()
+
+    def test_counts_and_issues_can_be_filtered(self):
+        self._store_reviews()
+        store = ReviewResultStore(self.path)
+        self.assertEqual(store.query_counts("rule"), [
+            {"value": "R2", "issues": 2, "reviews": 2},
+            {"value": None, "issues": 1, "reviews": 1},
+            {"value": "R1", "issues": 1, "reviews": 1},
+        ])
+        self.assertEqual([row["value"] for row in store.query_counts("path", path="app/*")], ["app/a.py"])
+        self.assertEqual(store.query_counts("author", rule="R2"), [
+            {"value": "Ada <ada@example.com>", "issues": 1, "reviews": 1},
+            {"value": "Bob <bob@example.com>", "issues": 1, "reviews": 1},
+        ])
+        issues = store.query_issues(commit="abc", author="ada")
+        self.assertEqual([row["issue"] for row in issues], ISSUES)
+        self.assertEqual(issues[0]["path"], "app/a.py")
+        self.assertEqual(store.query_issues(ref="staged", limit=5)[0]["commit_sha"], None)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,15 @@ from source.review_utils import (
     load_rules_from_json,
     format_response,
     check_diff_with_gpt,
+    check_diff_sharded,
+    merge_issues,
+    select_rules,
+    IssueStreamParser,
+    check_diff_streaming,
     display_issues
 )
+from source.rule_index import RuleIndex
+from source.rule_scope import RuleScope
 
 # Sample test data for the rules JSON file
 sample_rules_json = {
@@ -243,6 +250,97 @@ Suggestion: Refactor to avoid using global variables."""
         
         self.assertIn("API Error", str(context.exception))
     
+    ### Tests for merge_issues and check_diff_sharded ###
+
+    def test_merge_issues_deduplicates(self):
+        issue = {"Rule Violated": "Avoid globals", "Line Number(s)": "12", "Issue Description": "Global x"}
+        duplicate = {"Rule Violated": "avoid  globals", "Line Number(s)": "12", "Issue Description": "global x"}
+        merged = merge_issues([[issue], [{"Message": "No issues found."}], [duplicate]])
+        self.assertEqual(merged, [issue])
+
+    def test_merge_issues_no_issues(self):
+        merged = merge_issues([[{"Message": "No issues found."}], [{"Message": "No issues found."}]])
+        self.assertEqual(merged, [{"Message": "No issues found."}])
+
+    @patch('source.review_utils.check_diff_with_gpt')
+    def test_check_diff_sharded_reviews_each_shard(self, mock_check):
+        diff_text = "\n".join(
+            f"diff --git a/f{i}.py b/f{i}.py\n--- a/f{i}.py\n+++ b/f{i}.py\n@@ -1 +1 @@\n+x = {i}" for i in range(3)
+        )
+        mock_check.side_effect = lambda shard, rules: [
+            {"Rule Violated": "R1", "Line Number(s)": "1", "Issue Description": shard.splitlines()[0]}
+        ]
+        with patch('builtins.print'):
+            issues = check_diff_sharded(diff_text, "1. R1", max_shard_tokens=20, concurrency=2)
+        self.assertEqual(mock_check.call_count, 3)
+        self.assertEqual([issue["Issue Description"] for issue in issues],
+                         [f"diff --git a/f{i}.py b/f{i}.py" for i in range(3)])
+
+    def test_select_rules_with_index(self):
+        rules = [{"id": "1", "description": "Avoid global variables."},
+                 {"id": "2", "description": "Write docstrings for every function."}]
+        index = RuleIndex(rules)
+        texts = ["+global counter_variable", "+def f():  # missing docstring"]
+        self.assertEqual(select_rules(texts, "all rules", index, top_k=1),
+                         ["1. Avoid global variables.", "2. Write docstrings for every function."])
+        self.assertEqual(select_rules(texts, "all rules"), ["all rules", "all rules"])
+
+    def test_select_rules_with_scope(self):
+        rules = [{"id": "1", "description": "Avoid global variables."},
+                 {"id": "2", "description": "Use hooks in components.", "paths": ["frontend/"]},
+                 {"id": "3", "description": "Use type hints.", "languages": ["python"]}]
+        texts = ["diff --git a/frontend/App.tsx b/frontend/App.tsx\n+const hooks = useHooks()", "diff --git a/a.py b/a.py\n+global x"]
+        self.assertEqual(select_rules(texts, "all rules", rule_scope=RuleScope(rules)),
+                         ["1. Avoid global variables.\n2. Use hooks in components.",
+                          "1. Avoid global variables.\n3. Use type hints."])
+        self.assertEqual(select_rules(texts, "all rules", RuleIndex(rules), top_k=1, rule_scope=RuleScope(rules)),
+                         ["2. Use hooks in components.", "1. Avoid global variables."])
+
+    @patch('source.review_utils.complete_structured')
+    def test_shards_without_applicable_rules_are_not_reviewed(self, mock_complete):
+        rules = [{"id": "1", "description": "Use type hints.", "languages": ["python"]}]
+        diff_text = "diff --git a/app.ts b/app.ts\n--- a/app.ts\n+++ b/app.ts\n@@ -1 +1 @@\n+let x = 1"
+        self.assertEqual(check_diff_sharded(diff_text, "1. Use type hints.", rule_scope=RuleScope(rules)),
+                         [{"Message": "No issues found."}])
+        mock_complete.assert_not_called()
+
+    ### Tests for IssueStreamParser and check_diff_streaming ###
+
+    def test_issue_stream_parser_emits_complete_issues(self):
+        response = ("Rule Violated: Avoid globals\nLine Number(s): 12\nIssue Description: Global x\n"
+                    "Suggestion: Pass x in\nRule Violated: Docstrings\nLine Number(s): 45")
+        parser = IssueStreamParser()
+        emitted = []
+        for start in range(0, len(response), 7):
+            emitted.append(parser.feed(response[start:start + 7]))
+        first = {"Rule Violated": "Avoid globals", "Line Number(s)": "12",
+                 "Issue Description": "Global x", "Suggestion": "Pass x in"}
+        self.assertEqual([issue for issues in emitted for issue in issues], [first])
+        # The first issue is emitted before the stream ends
+        self.assertNotEqual(emitted[-1], [first])
+        self.assertEqual(parser.close(), [{"Rule Violated": "Docstrings", "Line Number(s)": "45"}])
+
+    @patch('source.review_utils.stream_chat_completion')
+    def test_check_diff_streaming_fail_fast(self, mock_stream):
+        consumed = []
+
+        def stream(model, messages):
+            for piece in ["Rule Violated: R1\nSuggestion: fix\n", "Rule Violated: R2\nSuggestion: fix\n"]:
+                consumed.append(piece)
+                yield piece
+
+        mock_stream.side_effect = stream
+        seen = []
+        issues = check_diff_streaming("diff --git a/a.py b/a.py\n+x", "1. R1", on_issue=seen.append, fail_fast=True)
+        self.assertEqual(issues, [{"Rule Violated": "R1", "Suggestion": "fix"}])
+        self.assertEqual(seen, issues)
+        self.assertEqual(len(consumed), 1)
+
+    @patch('source.review_utils.stream_chat_completion')
+    def test_check_diff_streaming_no_issues(self, mock_stream):
+        mock_stream.side_effect = lambda model, messages: (piece for piece in ["No issues ", "found."])
+        self.assertEqual(check_diff_streaming("diff --git a/a.py b/a.py\n+x", "1. R1"), [{"Message": "No issues found."}])
+
     ### Tests for display_issues ###
     
     def test_display_issues_with_issues(self):
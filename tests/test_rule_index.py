@@ -0,0 +1,34 @@
+import unittest
+
+from source.rule_index import RuleIndex, tokenize
+
+RULES = [
+    {"id": "R1", "description": "Use meaningful variable and function names."},
+    {"id": "R2", "description": "Ensure consistent indentation using 4 spaces."},
+    {"id": "R3", "description": "Handle exceptions gracefully with meaningful error messages."},
+    {"id": "R4", "description": "Never commit secrets.", "always": True},
+]
+
+
+class TestRuleIndex(unittest.TestCase):
+
+    def test_tokenize_splits_identifiers(self):
+        self.assertEqual(tokenize("raiseError in parse_exceptions"), ["raise", "error", "in", "parse", "exception"])
+
+    def test_select_returns_relevant_and_pinned_rules_in_order(self):
+        index = RuleIndex(RULES)
+        selected = index.select("+    except ValueError as error:\n+        raise RuntimeError('error message')", top_k=1)
+        self.assertEqual([rule["id"] for rule in selected], ["R3", "R4"])
+
+    def test_select_batch_scores_each_text(self):
+        index = RuleIndex(RULES)
+        selections = index.select_batch(["+def f(x):  # bad variable names", "+\tindentation with tabs"], top_k=1)
+        self.assertEqual([[rule["id"] for rule in selected] for selected in selections], [["R1", "R4"], ["R2", "R4"]])
+
+    def test_select_without_matches_keeps_all_rules(self):
+        index = RuleIndex(RULES)
+        self.assertEqual(index.select("+zzz = 1", top_k=1), RULES)
+
+
+if __name__ == '__main__':
+    unittest.main()
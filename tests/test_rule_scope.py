@@ -0,0 +1,56 @@
+import unittest
+
+from source.rule_scope import RuleScope, rule_applies
+
+RULES = [
+    {"id": "R1", "description": "Use meaningful names."},
+    {"id": "R2", "description": "Use type hints.", "languages": ["python"]},
+    {"id": "R3", "description": "Use hooks, not classes.", "paths": ["frontend/**/*.tsx"]},
+    {"id": "R4", "description": "Keep migrations reversible.", "paths": ["backend/*/migrations/"]},
+    {"id": "R5", "description": "Pin base images.", "paths": ["Dockerfile"]},
+    {"id": "R6", "description": "No print in services.", "paths": ["services/"], "languages": "python"},
+    {"id": "R7", "description": "Name tests after behaviour.", "paths": ["test_*.py"]},
+]
+
+
+def ids(rules):
+    return [rule["id"] for rule in rules]
+
+
+class TestRuleScope(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = RuleScope(RULES)
+
+    def test_rules_are_selected_by_language_and_path(self):
+        self.assertEqual(ids(self.scope.select(["backend/app/models.py"])), ["R1", "R2"])
+        self.assertEqual(ids(self.scope.select(["frontend/src/App.tsx"])), ["R1", "R3"])
+        self.assertEqual(ids(self.scope.select(["frontend/src/index.ts"])), ["R1"])
+
+    def test_directory_globs_match_everything_below(self):
+        self.assertEqual(ids(self.scope.select(["backend/users/migrations/0002_email.py"])), ["R1", "R2", "R4"])
+        self.assertEqual(ids(self.scope.select(["backend/migrations/0001.py"])), ["R1", "R2"])
+
+    def test_unanchored_globs_match_names_at_any_depth(self):
+        self.assertEqual(ids(self.scope.select(["deploy/api/Dockerfile"])), ["R1", "R5"])
+        self.assertEqual(ids(self.scope.select(["pkg/tests/test_api.py"])), ["R1", "R2", "R7"])
+
+    def test_paths_and_languages_must_both_match(self):
+        self.assertEqual(ids(self.scope.select(["services/mail/send.py"])), ["R1", "R2", "R6"])
+        self.assertEqual(ids(self.scope.select(["services/mail/send.go"])), ["R1"])
+        self.assertTrue(rule_applies(RULES[5], "services/mail/send.py"))
+        self.assertFalse(rule_applies(RULES[5], "scripts/send.py"))
+
+    def test_selection_covers_every_path_and_defaults_to_all_rules(self):
+        self.assertEqual(ids(self.scope.select(["a.py", "frontend/App.tsx"])), ["R1", "R2", "R3"])
+        self.assertEqual(self.scope.select([]), RULES)
+        self.assertTrue(self.scope.scoped)
+        self.assertFalse(RuleScope(RULES[:1]).scoped)
+
+    def test_unknown_languages_are_rejected(self):
+        with self.assertRaises(ValueError):
+            RuleScope([{"id": "R1", "description": "Names.", "languages": ["klingon"]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
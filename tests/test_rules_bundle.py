@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from source.rule_index import RuleIndex
+from source.rules_bundle import (
+    RulesBundle,
+    RulesBundleError,
+    compile_rules,
+    load_rules,
+    rules_digest,
+)
+
+sample_rules = [
+    {"id": "1", "description": "Avoid using global variables."},
+    {"id": "2", "description": "Use snake_case for variable names."},
+    {"id": "3", "description": "Every public function needs a docstring.", "always": True},
+    {"id": "4", "description": "Préférer les f-strings."},
+]
+
+
+class TestRulesBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.json_path = os.path.join(self.tmp_dir.name, 'rules.json')
+        self.bundle_path = os.path.join(self.tmp_dir.name, 'rules.bundle')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"rules": sample_rules}, f)
+
+    def test_round_trip(self):
+        compiled = compile_rules(self.json_path, self.bundle_path)
+        for use_mmap in (False, True):
+            bundle = load_rules(self.bundle_path, use_mmap=use_mmap)
+            self.assertEqual(bundle.records, sample_rules)
+            self.assertEqual(bundle.digest, compiled.digest)
+            self.assertEqual(bundle.text.splitlines()[0], "1. Avoid using global variables.")
+
+    def test_precomputed_index_matches_built_index(self):
+        compile_rules(self.json_path, self.bundle_path)
+        loaded = load_rules(self.bundle_path).rule_index()
+        built = RuleIndex(sample_rules)
+        np.testing.assert_array_equal(loaded.indptr, built.indptr)
+        np.testing.assert_array_equal(loaded.indices, built.indices)
+        np.testing.assert_allclose(loaded.values, built.values, rtol=1e-6)
+        texts = ["+global_counter = 0", "+def fetchUserName(): pass"]
+        self.assertEqual(loaded.select_batch(texts, 1), built.select_batch(texts, 1))
+
+    def test_bundle_without_index_builds_it_on_demand(self):
+        compile_rules(self.json_path, self.bundle_path, with_index=False)
+        bundle = load_rules(self.bundle_path)
+        self.assertNotIn("index", bundle.header)
+        self.assertEqual(len(bundle.rule_index().rules), len(sample_rules))
+
+    def test_local_rules_are_left_out_of_the_prompt_where_checked(self):
+        python_rule = {"id": "5", "description": "Follow PEP 8.", "check": "pep8", "languages": ["python"]}
+        any_rule = {"id": "6", "description": "Indent with 4 spaces.", "check": "indentation"}
+        partial_rule = {"id": "7", "description": "Remove unused code.", "check": "unused_imports", "review": True}
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"rules": sample_rules + [python_rule, any_rule, partial_rule]}, f)
+        compile_rules(self.json_path, self.bundle_path)
+        bundle = load_rules(self.bundle_path)
+        self.assertEqual(bundle.local_rules, [python_rule, any_rule, partial_rule])
+        self.assertNotIn("PEP 8", bundle.text)
+        self.assertEqual([rule["id"] for rule in bundle.rule_index().rules], [rule["id"] for rule in sample_rules] + ["6", "7"])
+        scope = bundle.rule_scope()
+        self.assertEqual([rule["id"] for rule in scope.select(["app.ts"])][-2:], ["6", "7"])
+        self.assertEqual([rule["id"] for rule in scope.select(["app.py"])][-1:], ["7"])
+
+    def test_example_rules_all_reach_the_prompt(self):
+        example_path = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'example_rules.json')
+        bundle = load_rules(example_path)
+        self.assertEqual([line.split('.')[0] for line in bundle.text.splitlines()],
+                         [rule["id"] for rule in bundle.records])
+
+    def test_load_rules_accepts_json(self):
+        bundle = load_rules(self.json_path)
+        self.assertEqual(bundle.records, sample_rules)
+        self.assertEqual(bundle.digest, rules_digest(sample_rules))
+
+    def test_digest_ignores_json_formatting(self):
+        reordered = [dict(reversed(list(rule.items()))) for rule in sample_rules]
+        self.assertEqual(rules_digest(reordered), rules_digest(sample_rules))
+        self.assertNotEqual(rules_digest(sample_rules[:2]), rules_digest(sample_rules))
+
+    def test_rejects_other_files_and_versions(self):
+        with self.assertRaises(RulesBundleError):
+            RulesBundle.open(self.json_path)
+        compile_rules(self.json_path, self.bundle_path)
+        with open(self.bundle_path, 'r+b') as f:
+            f.seek(8)
+            f.write((99).to_bytes(4, 'little'))
+        with self.assertRaisesRegex(RulesBundleError, "version 99"):
+            RulesBundle.open(self.bundle_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REVIEW_SCRIPT = os.path.join(REPO_ROOT, 'scripts', 'review.py')
+
+# Import time allowed for review.py when there is nothing to review; loading openai alone takes
+# several times this
+IMPORT_BUDGET_SECONDS = 0.15
+# Modules that must only be loaded once an LLM call is needed
+HEAVY_MODULES = ('openai', 'httpx', 'numpy', 'sqlite3', 'source.llm', 'source.review_utils', 'source.result_store')
+
+
+def _imported_modules(stderr):
+    """
+    (name, cumulative seconds, nested) of every import in `python -X importtime` output.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(cumulative) / 1e6, name.startswith('  ')))
+    return modules
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        for command in (['git', 'init', '-q'], ['git', 'config', 'user.email', 'test@example.com'],
+                        ['git', 'config', 'user.name', 'Test'], ['git', 'commit', '-q', '--allow-empty', '-m', 'base']):
+            subprocess.run(command, cwd=self.tmp_dir.name, check=True)
+
+    def _run(self, *args):
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        return subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=self.tmp_dir.name, env=env,
+                              capture_output=True, text=True, check=False)
+
+    def test_review_without_changes_skips_heavy_imports(self):
+        result = self._run(REVIEW_SCRIPT, '--branch', 'HEAD')
+        self.assertIn("No staged changes to check.", result.stdout)
+        names = {name for name, _, _ in _imported_modules(result.stderr)}
+        self.assertEqual(names & set(HEAVY_MODULES), set())
+
+    def test_review_import_time_budget(self):
+        baseline = {name for name, _, _ in _imported_modules(self._run('-c', 'pass').stderr)}
+        result = self._run(REVIEW_SCRIPT, '--branch', 'HEAD')
+        # Top-level imports that the interpreter does not load on its own
+        elapsed = sum(cumulative for name, cumulative, nested in _imported_modules(result.stderr)
+                      if not nested and name not in baseline)
+        self.assertLess(elapsed, IMPORT_BUDGET_SECONDS, f"review.py imports took {elapsed:.3f}s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from source.review_utils import check_diff_with_gpt
+from source.structured_output import (
+    REVIEW_SCHEMA,
+    StructuredOutputError,
+    parse_json,
+    parse_review_issues,
+    parse_rules,
+    supports_json_schema,
+)
+from source import llm
+from source.cache import configure_cache
+
+review_json = json.dumps({"issues": [{
+    "rule": "Avoid using global variables",
+    "line_numbers": "12",
+    "description": "Global variable 'x' is used",
+    "suggestion": "Refactor to avoid using global variables.",
+}]})
+
+
+class TestStructuredOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MagicMock()
+        patcher = patch('source.llm._backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    ### Tests for parsing ###
+
+    def test_parse_review_issues(self):
+        self.assertEqual(parse_review_issues(review_json), [{
+            "Rule Violated": "Avoid using global variables",
+            "Line Number(s)": "12",
+            "Issue Description": "Global variable 'x' is used",
+            "Suggestion": "Refactor to avoid using global variables.",
+        }])
+        self.assertEqual(parse_review_issues('{"issues": []}'), [{"Message": "No issues found."}])
+
+    def test_parse_json_reports_location_of_error(self):
+        bad = json.dumps({"issues": [{"rule": "r", "line_numbers": 12, "description": "d", "suggestion": ""}]})
+        with self.assertRaisesRegex(StructuredOutputError, r"\$\.issues\[0\]\.line_numbers: expected string"):
+            parse_json(bad, REVIEW_SCHEMA)
+        with self.assertRaisesRegex(StructuredOutputError, "missing required property 'issues'"):
+            parse_json('{}', REVIEW_SCHEMA)
+        with self.assertRaisesRegex(StructuredOutputError, "invalid JSON"):
+            parse_json('Rule Violated: x', REVIEW_SCHEMA)
+
+    def test_parse_rules(self):
+        content = json.dumps({"rules": [{"id": "1", "description": " Use snake_case. "}]})
+        self.assertEqual(parse_rules(content), [{"id": "1", "description": "Use snake_case."}])
+        with self.assertRaises(StructuredOutputError):
+            parse_rules('{"rules": [{"id": "1"}]}')
+
+    ### Tests for check_diff_with_gpt ###
+
+    def test_check_diff_with_gpt_requests_json_schema(self):
+        self.backend.complete.return_value = review_json
+        issues = check_diff_with_gpt("diff --git a/a.py b/a.py\n+x = 1\n", "1. Avoid globals")
+        self.assertEqual(issues[0]["Line Number(s)"], "12")
+        response_format = self.backend.complete.call_args.kwargs["response_format"]
+        self.assertEqual(response_format["json_schema"]["schema"], REVIEW_SCHEMA)
+
+    def test_default_models_support_json_schema(self):
+        for kind, model in llm.DEFAULT_MODELS.items():
+            self.assertTrue(supports_json_schema(model), kind)
+        self.assertFalse(supports_json_schema("gpt-4"))
+        self.backend.complete.return_value = review_json
+        with patch.multiple(llm, _models=dict(llm.DEFAULT_MODELS)):
+            check_diff_with_gpt("diff --git a/a.py b/a.py\n+x = 1\n", "1. Avoid globals")
+        self.assertEqual(self.backend.complete.call_args.args[0], llm.DEFAULT_MODELS["review"])
+        self.assertEqual(self.backend.complete.call_args.kwargs["response_format"]["type"], "json_schema")
+
+    def test_models_without_json_schema_get_the_schema_in_the_prompt(self):
+        self.backend.complete.return_value = f"```json\n{review_json}\n```"
+        with patch.dict(llm._models, review="gpt-4"):
+            issues = check_diff_with_gpt("diff --git a/a.py b/a.py\n+x = 1\n", "1. Avoid globals")
+        self.assertEqual(issues[0]["Line Number(s)"], "12")
+        self.assertNotIn("response_format", self.backend.complete.call_args.kwargs)
+        self.assertIn(json.dumps(REVIEW_SCHEMA), self.backend.complete.call_args.args[1][0]["content"])
+
+    def test_check_diff_with_gpt_repairs_malformed_response(self):
+        self.backend.complete.side_effect = ['{"issues": [', review_json]
+        issues = check_diff_with_gpt("diff --git a/a.py b/a.py\n+x = 1\n", "1. Avoid globals")
+        self.assertEqual(issues[0]["Rule Violated"], "Avoid using global variables")
+        repair_messages = self.backend.complete.call_args.args[1]
+        self.assertEqual(repair_messages[-2], {"role": "assistant", "content": '{"issues": ['})
+        self.assertIn("invalid JSON", repair_messages[-1]["content"])
+
+    def test_check_diff_with_gpt_raises_when_repair_fails(self):
+        self.backend.complete.return_value = "No issues found."
+        with self.assertRaises(StructuredOutputError):
+            check_diff_with_gpt("diff --git a/a.py b/a.py\n+x = 1\n", "1. Avoid globals")
+        self.assertEqual(self.backend.complete.call_count, 2)
+
+    def test_only_valid_responses_are_cached(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        configure_cache(enabled=True, cache_dir=tmp_dir.name)
+        self.addCleanup(configure_cache, enabled=False)
+        diff_text = "diff --git a/a.py b/a.py\n+x = 1\n"
+
+        self.backend.complete.return_value = "No issues found."
+        with self.assertRaises(StructuredOutputError):
+            check_diff_with_gpt(diff_text, "1. Avoid globals")
+        # The rerun asks the model again instead of replaying the invalid responses
+        self.backend.complete.return_value = review_json
+        self.assertEqual(check_diff_with_gpt(diff_text, "1. Avoid globals")[0]["Line Number(s)"], "12")
+        self.assertEqual(self.backend.complete.call_count, 3)
+        # A valid response is cached
+        self.assertEqual(check_diff_with_gpt(diff_text, "1. Avoid globals")[0]["Line Number(s)"], "12")
+        self.assertEqual(self.backend.complete.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()